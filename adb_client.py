@@ -0,0 +1,597 @@
+# -*- coding: utf-8 -*-
+"""ADB 服务器协议客户端
+
+直接通过 TCP（默认 127.0.0.1:5037）与本机 adb 服务器通信，代替每次操作都启动一个
+adb 子进程。支持 host:devices / host:track-devices / host:connect / host:transport:<serial> / shell: / exec: / sync:。
+
+- 每台设备保留一个已完成 host:transport 握手的备用连接，发送 shell 命令时只需一次往返；
+- sync: 连接在多次 STAT/LIST/RECV 之间复用，按设备放入连接池；
+- 命令往返时间按命令类型记录到 metrics 的 adb_command_seconds。
+"""
+import os
+import select
+import socket
+import stat
+import struct
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import ADB_COMMAND_SECONDS, ADB_COMMAND_ERRORS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5037
+
+# sync 协议单个 DATA 块的最大长度
+SYNC_DATA_MAX = 64 * 1024
+
+# shell v2 协议的包类型
+SHELL_V2_STDOUT = 1
+SHELL_V2_STDERR = 2
+SHELL_V2_EXIT = 3
+
+
+class AdbError(RuntimeError):
+    """adb 服务器返回 FAIL 或协议错误"""
+
+
+class AdbTimeoutError(AdbError):
+    """与 adb 服务器通信超时"""
+
+
+class AdbConnectionError(AdbError):
+    """连接被关闭或断开"""
+
+
+def command_verb(service):
+    """指标中的命令类型，如 host:connect、shell:input、exec:screenrecord、sync"""
+    if service.startswith("host"):
+        return ":".join(service.split(":")[:2])
+    kind, _, command = service.partition(":")
+    kind = kind.split(",")[0]  # shell,v2,raw -> shell
+    words = command.split()
+    if not words:
+        return kind
+    return f"{kind}:{words[0].rsplit('/', 1)[-1][:32]}"
+
+
+@contextmanager
+def measure_command(service):
+    """记录一次命令的往返时间（失败时只计数）"""
+    verb = command_verb(service)
+    start = time.perf_counter()
+    try:
+        yield
+    except AdbError:
+        ADB_COMMAND_ERRORS.inc(verb=verb)
+        raise
+    ADB_COMMAND_SECONDS.observe(time.perf_counter() - start, verb=verb)
+
+
+class AdbConnection:
+    """与 adb 服务器的一条 TCP 连接"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.closed = False
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def send_request(self, payload):
+        """发送 4 位十六进制长度前缀的请求"""
+        data = payload.encode("utf-8")
+        self._sendall(b"%04x" % len(data) + data)
+
+    def _sendall(self, data):
+        try:
+            self.sock.sendall(data)
+        except socket.timeout:
+            raise AdbTimeoutError("发送请求超时")
+        except OSError as e:
+            raise AdbConnectionError(f"连接已断开: {e}")
+
+    def read_exact(self, size):
+        """读取恰好 size 字节，连接提前关闭时抛出 AdbError"""
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            try:
+                chunk = self.sock.recv(min(remaining, 256 * 1024))
+            except socket.timeout:
+                raise AdbTimeoutError("读取响应超时")
+            except OSError as e:
+                raise AdbConnectionError(f"连接已断开: {e}")
+            if not chunk:
+                raise AdbConnectionError("连接被adb服务器关闭")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def read_hex_string(self):
+        """读取 4 位十六进制长度前缀的字符串"""
+        length = int(self.read_exact(4), 16)
+        return self.read_exact(length).decode("utf-8", errors="replace")
+
+    def read_status(self):
+        """读取 OKAY/FAIL 状态，FAIL 时抛出 AdbError"""
+        status = self.read_exact(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(self.read_hex_string())
+        raise AdbError(f"未知的协议响应: {status!r}")
+
+    def recv(self, size=64 * 1024):
+        """读取流数据，连接关闭时返回 b''"""
+        try:
+            return self.sock.recv(size)
+        except socket.timeout:
+            raise AdbTimeoutError("读取数据超时")
+        except OSError:
+            return b""
+
+    def read(self, size=-1):
+        """文件对象接口（供 tarfile 等流式读取），连接关闭时返回 b''"""
+        return self.recv(size if size and size > 0 else 64 * 1024)
+
+    def read_all(self):
+        """读取直到连接关闭"""
+        chunks = []
+        while True:
+            chunk = self.recv()
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def sendall(self, data):
+        self._sendall(data)
+
+    def is_stale(self):
+        """空闲连接是否已被服务器关闭（可读即代表EOF或意外数据）"""
+        if self.closed:
+            return True
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                # 先 shutdown：仅 close 不会唤醒其他线程中阻塞的 recv（如屏幕录制的读取线程）
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+
+
+class SyncConnection:
+    """sync: 服务连接，可在多次文件操作之间复用"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _send(self, command_id, path):
+        data = path.encode("utf-8")
+        self.conn.sendall(command_id + struct.pack("<I", len(data)) + data)
+
+    def stat(self, path):
+        """返回 (mode, size, mtime)，文件不存在时 mode 为 0"""
+        self._send(b"STAT", path)
+        response = self.conn.read_exact(16)
+        if response[:4] != b"STAT":
+            raise AdbError(f"STAT 响应异常: {response[:4]!r}")
+        return struct.unpack("<III", response[4:])
+
+    def list(self, path):
+        """列出目录，返回 [(name, mode, size, mtime)]（不含 . 和 ..）"""
+        self._send(b"LIST", path)
+        entries = []
+        while True:
+            header = self.conn.read_exact(20)
+            command_id = header[:4]
+            if command_id == b"DONE":
+                return entries
+            if command_id != b"DENT":
+                raise AdbError(f"LIST 响应异常: {command_id!r}")
+            mode, size, mtime, name_length = struct.unpack("<IIII", header[4:])
+            name = self.conn.read_exact(name_length).decode("utf-8", errors="replace")
+            if name not in (".", ".."):
+                entries.append((name, mode, size, mtime))
+
+    def recv_to(self, remote_path, fileobj, progress=None):
+        """把远程文件写入 fileobj，返回字节数"""
+        self._send(b"RECV", remote_path)
+        total = 0
+        while True:
+            header = self.conn.read_exact(8)
+            command_id = header[:4]
+            if command_id == b"DATA":
+                length = struct.unpack("<I", header[4:])[0]
+                fileobj.write(self.conn.read_exact(length))
+                total += length
+                if progress:
+                    progress(length)
+            elif command_id == b"DONE":
+                return total
+            elif command_id == b"FAIL":
+                length = struct.unpack("<I", header[4:])[0]
+                raise AdbError(self.conn.read_exact(length).decode("utf-8", errors="replace"))
+            else:
+                raise AdbError(f"RECV 响应异常: {command_id!r}")
+
+    def pull(self, remote_path, local_path, progress=None, mtime=None):
+        """下载单个文件（先写临时文件再原子替换），返回字节数"""
+        tmp_path = local_path + ".part"
+        try:
+            with open(tmp_path, "wb") as f:
+                total = self.recv_to(remote_path, f, progress)
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        if mtime:
+            os.utime(local_path, (mtime, mtime))
+        return total
+
+    def quit(self):
+        try:
+            self.conn.sendall(b"QUIT" + struct.pack("<I", 0))
+        except AdbError:
+            pass
+        self.conn.close()
+
+
+class AdbClient:
+    """adb 服务器协议客户端（线程安全）"""
+
+    def __init__(self, host=None, port=None, adb_path=None, timeout=10):
+        self.host = host or DEFAULT_HOST
+        self.port = int(port or os.environ.get("ANDROID_ADB_SERVER_PORT") or DEFAULT_PORT)
+        self.adb_path = adb_path  # 服务器未启动时用于 start-server
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._spare_transports = {}  # serial -> 已完成 transport 握手的备用连接
+        self._sync_pool = {}  # serial -> [SyncConnection]
+        self._features = {}  # serial -> set(features)
+        self._server_started = False
+        self._refilling = set()  # 正在后台预建备用连接的设备
+
+    # --- 基础连接 ---
+
+    def _open(self, timeout=None):
+        """建立到 adb 服务器的 TCP 连接，必要时自动启动服务器"""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=timeout)
+            except ConnectionRefusedError:
+                if not self.adb_path or self._server_started:
+                    raise AdbConnectionError(f"无法连接到adb服务器 {self.host}:{self.port}")
+                self.start_server()
+                sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        except socket.timeout:
+            raise AdbTimeoutError("连接adb服务器超时")
+        except OSError as e:
+            # 调用方只处理 AdbError：连接被重置、主机不可达、启动服务器后仍被拒绝等都统一转换
+            raise AdbConnectionError(f"无法连接到adb服务器 {self.host}:{self.port}: {e}")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return AdbConnection(sock)
+
+    def start_server(self):
+        """通过 adb 可执行文件启动服务器（仅在连接被拒绝时调用一次）"""
+        self._server_started = True
+        try:
+            subprocess.run([self.adb_path, "start-server"], capture_output=True, timeout=15)
+        except (OSError, subprocess.SubprocessError) as e:
+            # 超时（TimeoutExpired）或找不到 adb 可执行文件时同样按连接失败处理
+            raise AdbConnectionError(f"启动adb服务器失败: {e}")
+
+    def host_query(self, service, timeout=None):
+        """执行 host: 服务并读取长度前缀的响应"""
+        with measure_command(service):
+            conn = self._open(timeout)
+            try:
+                conn.send_request(service)
+                conn.read_status()
+                return conn.read_hex_string()
+            finally:
+                conn.close()
+
+    def host_command(self, service, timeout=None):
+        """执行只返回 OKAY/FAIL 的 host: 服务"""
+        with measure_command(service):
+            conn = self._open(timeout)
+            try:
+                conn.send_request(service)
+                conn.read_status()
+            finally:
+                conn.close()
+
+    # --- host 服务 ---
+
+    def version(self):
+        return int(self.host_query("host:version"), 16)
+
+    def devices(self, timeout=None):
+        """返回 [(serial, state)]，state 如 device / offline / unauthorized"""
+        output = self.host_query("host:devices", timeout)
+        return parse_devices(output)
+
+    def track_devices(self, timeout=None):
+        """打开 host:track-devices 长连接，之后每次设备列表变化服务器推送一条长度前缀的完整列表
+
+        返回的连接没有读取超时，用 read_hex_string() 读取并交给 parse_devices 解析。
+        """
+        conn = self._open(timeout)
+        try:
+            conn.send_request("host:track-devices")
+            conn.read_status()
+        except Exception:
+            conn.close()
+            raise
+        conn.settimeout(None)
+        return conn
+
+    def connect(self, address, timeout=None):
+        """连接网络设备，返回服务器消息（如 'connected to x:5555'）"""
+        return self.host_query(f"host:connect:{address}", timeout)
+
+    def disconnect(self, address=None, timeout=None):
+        """断开网络设备，address 为空时断开全部"""
+        message = self.host_query(f"host:disconnect:{address or ''}", timeout)
+        self.forget(address)
+        return message
+
+    def kill_server(self):
+        try:
+            self.host_command("host:kill")
+        except AdbError:
+            pass
+        self.close()
+
+    def features(self, serial=None):
+        """设备支持的特性集合（结果缓存）"""
+        key = serial or ""
+        if key not in self._features:
+            service = f"host-serial:{serial}:features" if serial else "host:features"
+            try:
+                self._features[key] = set(self.host_query(service).split(","))
+            except AdbError:
+                self._features[key] = set()
+        return self._features[key]
+
+    # --- transport 服务 ---
+
+    def _new_transport(self, serial, timeout=None):
+        conn = self._open(timeout)
+        try:
+            conn.send_request(f"host:transport:{serial}" if serial else "host:transport-any")
+            conn.read_status()
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _take_transport(self, serial, timeout=None):
+        """取出备用 transport 连接，没有或已失效时新建；返回 (连接, 是否为备用连接)"""
+        with self._lock:
+            conn = self._spare_transports.pop(serial, None)
+        if conn is not None and not conn.is_stale():
+            conn.settimeout(self.timeout if timeout is None else timeout)
+            return conn, True
+        if conn is not None:
+            conn.close()
+        return self._new_transport(serial, timeout), False
+
+    def prewarm(self, serial=None):
+        """为设备预先建立一个 transport 连接，下一条命令可省去一次握手"""
+        with self._lock:
+            existing = self._spare_transports.get(serial)
+        if existing is not None and not existing.is_stale():
+            return
+        conn = self._new_transport(serial)
+        with self._lock:
+            old = self._spare_transports.get(serial)
+            self._spare_transports[serial] = conn
+        if old is not None:
+            old.close()
+
+    def _refill(self, serial):
+        try:
+            self.prewarm(serial)
+        except AdbError:
+            pass
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._refilling.discard(serial)
+
+    def _schedule_refill(self, serial):
+        """在后台补充备用连接（同一设备同时只有一个补充线程）"""
+        with self._lock:
+            if serial in self._refilling:
+                return
+            self._refilling.add(serial)
+        threading.Thread(target=self._refill, args=(serial,), daemon=True).start()
+
+    def open_service(self, serial, service, timeout=None):
+        """在设备上打开一个服务（shell:/exec:/sync: 等），返回流式连接"""
+        conn, reused = self._take_transport(serial, timeout)
+        try:
+            conn.send_request(service)
+            conn.read_status()
+        except AdbConnectionError:
+            conn.close()
+            # 备用连接可能在设备重连后失效，用新连接重试一次
+            if not reused:
+                raise
+            conn = self._new_transport(serial, timeout)
+            try:
+                conn.send_request(service)
+                conn.read_status()
+            except AdbError:
+                conn.close()
+                raise
+        except AdbError:
+            conn.close()
+            raise
+        # 只在打开成功后补充备用连接（设备离线时不为每次失败的命令启动线程）
+        self._schedule_refill(serial)
+        return conn
+
+    def shell(self, serial, command, timeout=None):
+        """执行 shell 命令，返回 subprocess.CompletedProcess（文本输出）"""
+        shell_v2 = "shell_v2" in self.features(serial)
+        with measure_command(f"shell:{command}"):
+            if shell_v2:
+                conn = self.open_service(serial, f"shell,v2,raw:{command}", timeout)
+                try:
+                    returncode, stdout, stderr = read_shell_v2(conn)
+                finally:
+                    conn.close()
+            else:
+                conn = self.open_service(serial, f"shell:{command}", timeout)
+                try:
+                    stdout = conn.read_all()
+                finally:
+                    conn.close()
+                returncode, stderr = 0, b""
+        return subprocess.CompletedProcess(
+            command, returncode,
+            stdout.decode("utf-8", errors="replace"),
+            stderr.decode("utf-8", errors="replace"))
+
+    def exec_out(self, serial, command, timeout=None):
+        """打开 exec: 服务（等同 adb exec-out），返回原始二进制流连接（只记录打开服务的时间）"""
+        with measure_command(f"exec:{command}"):
+            return self.open_service(serial, f"exec:{command}", timeout)
+
+    # --- sync 服务 ---
+
+    @contextmanager
+    def sync(self, serial=None, timeout=None):
+        """从连接池取出 sync 连接，用完后放回"""
+        with self._lock:
+            pool = self._sync_pool.setdefault(serial, [])
+            connection = None
+            while pool:
+                candidate = pool.pop()
+                if candidate.conn.is_stale():
+                    candidate.conn.close()
+                    continue
+                connection = candidate
+                break
+        if connection is None:
+            connection = SyncConnection(self.open_service(serial, "sync:", timeout))
+        connection.conn.settimeout(self.timeout if timeout is None else timeout)
+        try:
+            yield connection
+        except BaseException:
+            # 出错后协议状态未知，直接丢弃连接
+            connection.conn.close()
+            raise
+        with self._lock:
+            self._sync_pool.setdefault(serial, []).append(connection)
+
+    def stat(self, serial, remote_path):
+        with self.sync(serial) as sync:
+            return sync.stat(remote_path)
+
+    def list_dir(self, serial, remote_path):
+        with self.sync(serial) as sync:
+            return sync.list(remote_path)
+
+    def pull(self, serial, remote_path, local_path, progress=None, timeout=None):
+        """下载单个文件，返回字节数"""
+        with self.sync(serial, timeout) as sync:
+            return sync.pull(remote_path, local_path, progress)
+
+    def pull_dir(self, serial, remote_dir, local_dir, progress=None, timeout=None):
+        """递归下载目录到 local_dir/<目录名>（与 adb pull 行为一致），返回 (文件数, 字节数)"""
+        remote_dir = remote_dir.rstrip("/")
+        target_root = os.path.join(local_dir, os.path.basename(remote_dir))
+        files = 0
+        total = 0
+        with self.sync(serial, timeout) as sync:
+            pending = [(remote_dir, target_root)]
+            while pending:
+                remote, local = pending.pop()
+                os.makedirs(local, exist_ok=True)
+                for name, mode, size, mtime in sync.list(remote):
+                    remote_path = f"{remote}/{name}"
+                    local_path = os.path.join(local, name)
+                    if stat.S_ISDIR(mode):
+                        pending.append((remote_path, local_path))
+                    elif stat.S_ISREG(mode) or stat.S_ISLNK(mode):
+                        total += sync.pull(remote_path, local_path, progress, mtime)
+                        files += 1
+        return files, total
+
+    # --- 生命周期 ---
+
+    def forget(self, serial=None):
+        """丢弃指定设备（为空时为全部设备）的池化连接"""
+        with self._lock:
+            if serial:
+                transports = [self._spare_transports.pop(serial, None)]
+                syncs = self._sync_pool.pop(serial, [])
+                self._features.pop(serial, None)
+            else:
+                transports = list(self._spare_transports.values())
+                syncs = [s for pool in self._sync_pool.values() for s in pool]
+                self._spare_transports.clear()
+                self._sync_pool.clear()
+                self._features.clear()
+        for conn in transports:
+            if conn is not None:
+                conn.close()
+        for sync in syncs:
+            sync.quit()
+
+    def close(self):
+        self.forget()
+
+
+def parse_devices(output):
+    """解析 host:devices 输出为 [(serial, state)]"""
+    devices = []
+    for line in output.splitlines():
+        parts = line.strip().split()
+        if len(parts) >= 2:
+            devices.append((parts[0], parts[1]))
+    return devices
+
+
+def read_shell_v2(conn):
+    """读取 shell v2 协议流，返回 (returncode, stdout, stderr)"""
+    stdout = []
+    stderr = []
+    returncode = None
+    while returncode is None:
+        try:
+            header = conn.read_exact(5)
+        except AdbConnectionError:
+            break  # 未收到退出包就被关闭
+        packet_id, length = struct.unpack("<BI", header)
+        data = conn.read_exact(length) if length else b""
+        if packet_id == SHELL_V2_STDOUT:
+            stdout.append(data)
+        elif packet_id == SHELL_V2_STDERR:
+            stderr.append(data)
+        elif packet_id == SHELL_V2_EXIT:
+            returncode = data[0] if data else 0
+    return (returncode if returncode is not None else -1), b"".join(stdout), b"".join(stderr)
+
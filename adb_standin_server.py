@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""本地 adb 服务器替身
+
+实现与真实 adb 服务器相同的线路协议（host:*、host:track-devices、host:transport、shell:、shell,v2、exec:、sync:），
+设备文件系统映射到本地目录，用于在没有真机的情况下调试 adb_client 和做传输基准测试。
+
+用法:
+    python adb_standin_server.py --port 15037 --root ./standin_device
+    ANDROID_ADB_SERVER_PORT=15037 python sync_measure_and_record.py
+"""
+import argparse
+import os
+import re
+import socket
+import socketserver
+import struct
+import subprocess
+import threading
+import time
+
+from adb_client import SYNC_DATA_MAX, SHELL_V2_STDOUT, SHELL_V2_STDERR, SHELL_V2_EXIT
+
+# 命令中的设备绝对路径（前面是空白、引号或等号）
+DEVICE_PATH_PATTERN = re.compile(r"(?<=[\s'\"=])/(?=[A-Za-z])")
+
+
+class StandinDevice:
+    """模拟设备：文件系统映射到本地目录，shell 命令在本机 sh 中执行"""
+
+    def __init__(self, serial, root, features=("shell_v2", "cmd", "stat_v2"), input_delay=0.0):
+        self.serial = serial
+        self.root = os.path.abspath(root)
+        self.state = "device"
+        self.features = list(features)
+        self.input_delay = input_delay  # 模拟 input 命令启动 app_process 的耗时（秒）
+        self.commands = []  # 收到的 shell/exec 命令记录
+
+    def prelude(self):
+        """用 shell 函数模拟设备专有命令（input/sendevent/getevent）"""
+        return (
+            f"input() {{ sleep {self.input_delay:.3f}; }}\n"
+            "sendevent() { :; }\n"
+            "getevent() { printf 'add device 1: /dev/input/event9\\n  name:     \"standin-kbd\"\\n"
+            "  events:\\n    KEY (0001): 001e  001f  0020\\n  input props:\\n    <none>\\n'; }\n"
+        )
+
+    def local_path(self, remote_path):
+        return os.path.join(self.root, remote_path.lstrip("/"))
+
+    def translate(self, command):
+        """把命令中的设备绝对路径改写为本地目录下的路径"""
+        return DEVICE_PATH_PATTERN.sub(self.root.replace("\\", "/") + "/", " " + command)[1:]
+
+    def run(self, command):
+        """执行 shell 命令，返回 (returncode, stdout, stderr)"""
+        self.commands.append(command)
+        result = subprocess.run(["sh", "-c", self.prelude() + self.translate(command)], capture_output=True)
+        return result.returncode, result.stdout, result.stderr
+
+    def open_stream(self, command):
+        """以流方式执行命令（exec:），返回 Popen"""
+        self.commands.append(command)
+        return subprocess.Popen(["sh", "-c", self.prelude() + self.translate(command)],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def open_interactive(self):
+        """启动交互式 sh（shell:sh），返回 Popen"""
+        process = subprocess.Popen(["sh"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, bufsize=0)
+        process.stdin.write(self.prelude().encode("utf-8"))
+        return process
+
+
+class StandinAdbServer(socketserver.ThreadingTCPServer):
+    """adb 服务器替身"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency=0.0):
+        super().__init__(address, StandinHandler)
+        self.devices = {}
+        self.latency = latency  # 每个请求额外的模拟延迟（秒），用于模拟 Wi-Fi 链路
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)  # 设备列表变化时通知 track-devices 连接
+
+    def add_device(self, device):
+        with self.lock:
+            self.devices[device.serial] = device
+            self.changed.notify_all()
+        return device
+
+    def device_list(self):
+        """host:devices 格式的设备列表（调用方持有 lock）"""
+        return "".join(f"{d.serial}\t{d.state}\n" for d in self.devices.values())
+
+    def start_background(self):
+        """在后台线程中运行，返回实际监听端口"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.server_address[1]
+
+
+class StandinHandler(socketserver.BaseRequestHandler):
+    """处理一条客户端连接"""
+
+    def setup(self):
+        self.device = None
+        # 与真实 adb 服务器一样关闭 Nagle，否则分开发送的 DATA/DONE 会被延迟确认拖慢约 40ms
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def read_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("客户端已关闭连接")
+            data += chunk
+        return data
+
+    def read_request(self):
+        length = int(self.read_exact(4), 16)
+        return self.read_exact(length).decode("utf-8")
+
+    def okay(self, payload=None):
+        data = b"OKAY"
+        if payload is not None:
+            encoded = payload.encode("utf-8")
+            data += b"%04x" % len(encoded) + encoded
+        self.request.sendall(data)
+
+    def fail(self, message):
+        encoded = message.encode("utf-8")
+        self.request.sendall(b"FAIL" + b"%04x" % len(encoded) + encoded)
+
+    def handle(self):
+        try:
+            while True:
+                request = self.read_request()
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                if not self.dispatch(request):
+                    break
+        except (ConnectionError, OSError, ValueError):
+            pass
+
+    def dispatch(self, request):
+        """处理一个请求，返回 True 表示连接上还会有后续请求"""
+        server = self.server
+        if request == "host:version":
+            self.okay("0029")
+        elif request in ("host:devices", "host:devices-l"):
+            with server.lock:
+                listing = server.device_list()
+            self.okay(listing)
+        elif request == "host:track-devices":
+            self.track_devices()
+        elif request.startswith("host:connect:"):
+            address = request[len("host:connect:"):]
+            if address in server.devices:
+                self.okay(f"already connected to {address}")
+            else:
+                server.add_device(StandinDevice(address, os.path.join(os.getcwd(), "standin_device")))
+                self.okay(f"connected to {address}")
+        elif request.startswith("host:disconnect:"):
+            address = request[len("host:disconnect:"):]
+            with server.lock:
+                if address:
+                    server.devices.pop(address, None)
+                else:
+                    server.devices.clear()
+                server.changed.notify_all()
+            self.okay(f"disconnected {address or 'everything'}")
+        elif request.endswith(":features"):
+            device = self.find_device(request.split(":")[1] if request.startswith("host-serial:") else None)
+            if device is None:
+                self.fail("device not found")
+            else:
+                self.okay(",".join(device.features))
+        elif request == "host:kill":
+            self.okay()
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        elif request.startswith("host:transport"):
+            serial = request[len("host:transport:"):] if request.startswith("host:transport:") else None
+            self.device = self.find_device(serial)
+            if self.device is None:
+                self.fail(f"device '{serial}' not found" if serial else "no devices/emulators found")
+                return False
+            self.okay()
+            return True
+        elif self.device is not None:
+            self.device_service(request)
+        else:
+            self.fail(f"unknown host service: {request}")
+        return False
+
+    def track_devices(self):
+        """先推送当前列表，之后每次变化推送完整列表，直到客户端关闭连接
+
+        直接修改 StandinDevice.state 不会发出通知，因此每 0.5 秒也比较一次。
+        """
+        self.request.sendall(b"OKAY")
+        server = self.server
+        last = None
+        while True:
+            with server.lock:
+                listing = server.device_list()
+                if listing == last:
+                    server.changed.wait(0.5)
+                    continue
+            encoded = listing.encode("utf-8")
+            self.request.sendall(b"%04x" % len(encoded) + encoded)
+            last = listing
+
+    def find_device(self, serial):
+        with self.server.lock:
+            ready = [d for d in self.server.devices.values() if d.state == "device"]
+            if serial:
+                return self.server.devices.get(serial)
+            return ready[0] if len(ready) == 1 else None
+
+    def device_service(self, request):
+        device = self.device
+        if request.startswith("shell,v2,raw:"):
+            returncode, stdout, stderr = device.run(request[len("shell,v2,raw:"):])
+            self.okay()
+            packets = b""
+            if stdout:
+                packets += struct.pack("<BI", SHELL_V2_STDOUT, len(stdout)) + stdout
+            if stderr:
+                packets += struct.pack("<BI", SHELL_V2_STDERR, len(stderr)) + stderr
+            packets += struct.pack("<BI", SHELL_V2_EXIT, 1) + bytes([returncode & 0xFF])
+            self.request.sendall(packets)
+        elif request in ("shell:", "shell:sh"):
+            self.okay()
+            self.interactive_shell(device)
+        elif request.startswith("shell:"):
+            _, stdout, stderr = device.run(request[len("shell:"):])
+            self.okay()
+            self.request.sendall(stdout + stderr)
+        elif request.startswith("exec:"):
+            process = device.open_stream(request[len("exec:"):])
+            self.okay()
+            # read1 有数据即返回，持续输出的命令（如 inotifyd）才能实时转发
+            for chunk in iter(lambda: process.stdout.read1(SYNC_DATA_MAX), b""):
+                try:
+                    self.request.sendall(chunk)
+                except OSError:
+                    break
+            process.kill()
+            process.wait()
+        elif request == "sync:":
+            self.okay()
+            self.sync_loop(device)
+        else:
+            self.fail(f"unknown service: {request}")
+
+    def interactive_shell(self, device):
+        """把连接上的输入逐行转发给交互式 sh，输出原样返回"""
+        process = device.open_interactive()
+
+        def pump_output():
+            for chunk in iter(lambda: process.stdout.read(SYNC_DATA_MAX), b""):
+                try:
+                    self.request.sendall(chunk)
+                except OSError:
+                    break
+            try:
+                self.request.shutdown(2)
+            except OSError:
+                pass
+
+        output_thread = threading.Thread(target=pump_output, daemon=True)
+        output_thread.start()
+        pending = b""
+        try:
+            while process.poll() is None:
+                chunk = self.request.recv(SYNC_DATA_MAX)
+                if not chunk:
+                    break
+                pending += chunk
+                while b"\n" in pending:
+                    line, pending = pending.split(b"\n", 1)
+                    command = line.decode("utf-8", errors="replace")
+                    device.commands.append(command)
+                    process.stdin.write((device.translate(command) + "\n").encode("utf-8"))
+        except OSError:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            process.wait()
+            output_thread.join(timeout=1)
+
+    def sync_loop(self, device):
+        """处理 sync 协议请求直到 QUIT"""
+        while True:
+            header = self.read_exact(8)
+            command_id = header[:4]
+            length = struct.unpack("<I", header[4:])[0]
+            path = self.read_exact(length).decode("utf-8") if length else ""
+            local_path = device.local_path(path)
+            if command_id == b"QUIT":
+                return
+            if self.server.latency:
+                time.sleep(self.server.latency)  # 每条 sync 命令都是一次链路往返
+            if command_id == b"STAT":
+                try:
+                    st = os.stat(local_path)
+                    payload = struct.pack("<III", st.st_mode, st.st_size & 0xFFFFFFFF, int(st.st_mtime))
+                except OSError:
+                    payload = struct.pack("<III", 0, 0, 0)
+                self.request.sendall(b"STAT" + payload)
+            elif command_id == b"LIST":
+                data = b""
+                try:
+                    names = [".", ".."] + sorted(os.listdir(local_path))
+                except OSError:
+                    names = []
+                for name in names:
+                    st = os.stat(os.path.join(local_path, name))
+                    encoded = name.encode("utf-8")
+                    data += b"DENT" + struct.pack("<IIII", st.st_mode, st.st_size & 0xFFFFFFFF,
+                                                  int(st.st_mtime), len(encoded)) + encoded
+                self.request.sendall(data + b"DONE" + struct.pack("<IIII", 0, 0, 0, 0))
+            elif command_id == b"RECV":
+                if not os.path.isfile(local_path):
+                    message = b"No such file or directory"
+                    self.request.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                    continue
+                with open(local_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(SYNC_DATA_MAX), b""):
+                        self.request.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                self.request.sendall(b"DONE" + struct.pack("<I", int(os.stat(local_path).st_mtime)))
+            else:
+                message = f"unsupported sync command {command_id!r}".encode("utf-8")
+                self.request.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 adb 服务器替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=15037)
+    parser.add_argument("--root", default="standin_device", help="映射为设备文件系统的本地目录")
+    parser.add_argument("--serial", default="standin-0001")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个请求的模拟链路延迟")
+    parser.add_argument("--input-delay-ms", type=float, default=0.0, help="模拟设备端 input 命令的启动耗时")
+    args = parser.parse_args()
+
+    os.makedirs(args.root, exist_ok=True)
+    server = StandinAdbServer((args.host, args.port), latency=args.latency_ms / 1000.0)
+    server.add_device(StandinDevice(args.serial, args.root, input_delay=args.input_delay_ms / 1000.0))
+    print(f"adb 服务器替身已启动: {args.host}:{args.port}，设备 {args.serial} -> {os.path.abspath(args.root)}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""无人值守批量测量
+
+不打开图形界面，按顺序完成：连接设备 → 启动并预热摄像头 → 执行 N 次测量（每次触发、等待视频
+保存、增量同步 Payload）。每次测量的耗时和结果逐行写入 CSV，中途中断也不会丢失已完成的记录。
+文件名前缀/编号/后缀、触发方式等设置读取图形界面的配置文件，编号在每次测量后递增并写回配置。
+
+用法:
+    python batch_runner.py --ip 192.168.1.100 --camera 0 --cycles 50 --interval 90
+    python batch_runner.py --serial R58M123ABC --cycles 10 --results results/night.csv
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+
+from adb_client import AdbClient, AdbError
+from device_tracker import DeviceTracker
+from metrics import start_metrics_server, DEFAULT_METRICS_PORT
+from measurement_session import (MeasurementSession, MeasurementError, format_take_name, next_take_number,
+                                 open_catalog, CAMERA_READY_TIMEOUT, TAKE_TIMEOUT)
+from payload_sync import format_bytes
+from session_catalog import app_config_dir
+
+PLATFORM_TOOLS_DIR = "platform-tools"
+DEFAULT_FILENAME_PARTS = ["AnuraMMA-5-MMA0V7230924002", "0000027", "1"]
+ADB_PORT = 5555
+
+RESULT_FIELDS = (
+    "cycle", "started_at", "name", "status", "error",
+    "wait_s", "trigger_s", "record_s", "payload_s", "cycle_s",
+    "trigger_method", "device_latency_ms", "skew_ms",
+    "payload_files", "payload_bytes", "payload_failed",
+    "session_id", "video_path",
+)
+
+_log_lock = threading.Lock()
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    with _log_lock:
+        print(f"[{timestamp}] {message}", flush=True)
+
+
+def config_path():
+    return os.path.join(app_config_dir(), "config.json")
+
+
+def load_config():
+    try:
+        with open(config_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_filename_parts(filename_parts):
+    """只更新配置文件中的文件名编号，其余设置保持不变"""
+    config = load_config()
+    config['filename_parts'] = filename_parts
+    config['last_updated'] = datetime.now().isoformat()
+    with open(config_path(), 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def find_adb(adb_path=None):
+    """adb 可执行文件：命令行指定 > 程序目录下的 platform-tools > PATH"""
+    if adb_path:
+        return adb_path
+    executable = "adb.exe" if platform.system() == "Windows" else "adb"
+    bundled = os.path.abspath(os.path.join(PLATFORM_TOOLS_DIR, executable))
+    if os.path.exists(bundled):
+        return bundled
+    return shutil.which("adb")
+
+
+def resolve_device(session, args, config):
+    """连接并返回要测量的设备序列号"""
+    if args.ip:
+        address = args.ip if ":" in args.ip else f"{args.ip}:{ADB_PORT}"
+        log(f"正在连接设备 {address}...")
+        session.connect(address)
+        log("✓ ADB设备连接成功")
+        return address
+    devices = session.list_devices()
+    if args.serial:
+        if args.serial not in devices:
+            raise AdbError(f"设备 {args.serial} 未连接（已连接: {', '.join(devices) or '无'}）")
+        return args.serial
+    if len(devices) == 1:
+        return devices[0]
+    if not devices and config.get('device_ip'):
+        # 没有已连接的设备时连接配置中保存的IP
+        address = f"{config['device_ip']}:{ADB_PORT}"
+        log(f"正在连接配置中的设备 {address}...")
+        session.connect(address)
+        return address
+    raise AdbError(f"找到 {len(devices)} 个设备，请用 --serial 或 --ip 指定" if devices else "未找到已连接的设备")
+
+
+def run_cycle(session, cycle, take_timeout=TAKE_TIMEOUT, sync_payload=True, slot=None):
+    """执行一次测量，返回结果行
+
+    slot 为上下文管理器，从触发到视频保存完成期间持有（rig_scheduler 用它限制同时录制的设备数）。
+    """
+    row = {"cycle": cycle, "started_at": datetime.now().isoformat(timespec="seconds"), "status": "ok"}
+    start = time.perf_counter()
+    try:
+        with slot or contextlib.nullcontext():
+            triggering = time.perf_counter()
+            row["wait_s"] = round(triggering - start, 3)
+            take = session.measure()
+            triggered = time.perf_counter()
+            row["trigger_s"] = round(triggered - triggering, 3)
+            if take.device_error is None:
+                row["trigger_method"], latency = take.device_result
+                row["device_latency_ms"] = round(latency, 1)
+            else:
+                row["status"] = "device_error"
+                row["error"] = take.device_error
+
+            video_path = session.wait_take_saved(take_timeout)
+            saved = time.perf_counter()
+        row["record_s"] = round(saved - triggered, 3)
+        if video_path is None:
+            row["status"] = "failed"
+            row["error"] = "等待视频保存超时或录制进程已退出"
+            return row
+        row["name"] = os.path.splitext(os.path.basename(video_path))[0]
+        row["video_path"] = os.path.abspath(video_path)
+        row["session_id"] = session.last_session_id
+        if take.skew_ms is not None:
+            row["skew_ms"] = round(take.skew_ms, 3)
+
+        if sync_payload:
+            _, result = session.sync_payloads()
+            row["payload_s"] = round(time.perf_counter() - saved, 3)
+            if result is not None:
+                row["payload_files"] = len(result.pulled)
+                row["payload_bytes"] = result.bytes
+                row["payload_failed"] = len(result.failed)
+                if result.failed and row["status"] == "ok":
+                    row["status"] = "payload_error"
+                    row["error"] = "; ".join(f"{path}: {error}" for path, error in result.failed[:3])
+    except (MeasurementError, AdbError) as e:
+        row["status"] = "failed"
+        row["error"] = str(e)
+    finally:
+        row["cycle_s"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def print_summary(rows, elapsed):
+    completed = [row for row in rows if row.get("video_path")]
+    log(f"共 {len(rows)} 次测量，成功保存 {len(completed)} 次，用时 {elapsed / 60:.1f} 分钟"
+        + (f"（{len(rows) * 3600 / elapsed:.1f} 次/小时）" if elapsed > 0 else ""))
+    cycle_times = [row["cycle_s"] for row in completed]
+    if cycle_times:
+        log(f"单次耗时: 平均 {sum(cycle_times) / len(cycle_times):.1f} s, "
+            f"最短 {min(cycle_times):.1f} s, 最长 {max(cycle_times):.1f} s")
+    skews = [row["skew_ms"] for row in completed if row.get("skew_ms") is not None]
+    if skews:
+        log(f"触发偏差: 平均 {sum(skews) / len(skews):+.1f} ms, 范围 {min(skews):+.1f} ~ {max(skews):+.1f} ms")
+    payload_bytes = sum(row.get("payload_bytes") or 0 for row in rows)
+    if payload_bytes:
+        log(f"Payload: 共 {sum(row.get('payload_files') or 0 for row in rows)} 个文件, {format_bytes(payload_bytes)}")
+    for row in rows:
+        if row["status"] != "ok":
+            label = f"{row['rig']} " if row.get("rig") else ""
+            log(f"✗ {label}第 {row['cycle']} 次: {row['status']}: {row.get('error')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无人值守批量测量（不打开图形界面）")
+    device = parser.add_mutually_exclusive_group()
+    device.add_argument("--ip", help="通过IP连接设备（默认端口 5555）")
+    device.add_argument("--serial", help="使用已连接设备的序列号")
+    parser.add_argument("--camera", type=int, default=None, help="摄像头索引（默认使用配置中的索引）")
+    parser.add_argument("--cycles", type=int, default=1, help="测量次数")
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="相邻两次测量开始的最短间隔（秒），0 表示上一次完成后立即开始")
+    parser.add_argument("--results", default=None, help="结果 CSV 路径（默认 results/batch_<时间>.csv）")
+    parser.add_argument("--no-payload", action="store_true", help="每次测量后不同步 Payload")
+    parser.add_argument("--no-catalog", action="store_true", help="不登记到录制会话目录")
+    parser.add_argument("--stop-on-error", action="store_true", help="任一次测量失败即停止")
+    parser.add_argument("--camera-timeout", type=float, default=CAMERA_READY_TIMEOUT * 2,
+                        help="摄像头初始化超时（秒）")
+    parser.add_argument("--take-timeout", type=float, default=TAKE_TIMEOUT, help="单次录制保存超时（秒）")
+    parser.add_argument("--adb", default=None, help="adb 可执行文件路径（服务器未启动时用于启动）")
+    args = parser.parse_args()
+
+    config = load_config()
+    filename_parts = list(config.get('filename_parts', DEFAULT_FILENAME_PARTS))
+    camera_index = args.camera if args.camera is not None else config.get('camera_index', 0)
+    results_path = args.results or os.path.join(
+        "results", f"batch_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv")
+
+    def on_take_saved(video_path, take):
+        # 与图形界面一致：每次测量后编号加一并写回配置
+        try:
+            filename_parts[1] = next_take_number(filename_parts[1])
+            save_filename_parts(filename_parts)
+        except (ValueError, OSError) as e:
+            log(f"⚠ 文件名编号递增失败: {e}")
+
+    client = AdbClient(adb_path=find_adb(args.adb))
+    # 设备列表和状态从 track-devices 长连接读取，设备掉线时立即记录
+    tracker = DeviceTracker(client, log=log).start()
+    tracker.wait_synced()
+    metrics_server = start_metrics_server(config.get('metrics_port', DEFAULT_METRICS_PORT), log=log)
+    catalog = None if args.no_catalog else open_catalog(app_config_dir(), log)
+    session = MeasurementSession(
+        lambda: client, log=log,
+        name_provider=lambda: format_take_name(filename_parts),
+        on_take_saved=on_take_saved,
+        trigger_method=config.get('trigger_method', 'auto'),
+        trigger_compensation=config.get('trigger_compensation', False),
+        payload_transfer_method=config.get('payload_transfer_method', 'auto'),
+        payload_watch=config.get('payload_watch', True),
+        video_handoff=config.get('video_handoff', 'auto'),
+        link_monitoring=config.get('link_monitoring', True),
+        screen_recording=config.get('screen_recording', False),
+        catalog=catalog,
+        device_tracker=tracker)
+    tracker.add_listener(session.handle_device_state)
+
+    rows = []
+    batch_start = time.perf_counter()
+    exit_code = 0
+    try:
+        serial = resolve_device(session, args, config)
+        log(f"使用设备: {serial}")
+        session.open_device(serial)
+
+        # 启动摄像头并等待初始化完成（预热），之后每次测量都复用同一个录制子进程
+        if not session.start_camera(camera_index) or not session.wait_camera_ready(args.camera_timeout):
+            log("✗ 摄像头启动失败，批量测量中止")
+            return 1
+
+        os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+        with open(results_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            log(f"开始批量测量: {args.cycles} 次, 间隔 {args.interval:.0f} s, 结果写入 {results_path}")
+            batch_start = time.perf_counter()
+            for cycle in range(1, args.cycles + 1):
+                cycle_start = time.perf_counter()
+                log(f"=== 第 {cycle}/{args.cycles} 次测量: {format_take_name(filename_parts)} ===")
+                row = run_cycle(session, cycle, args.take_timeout, sync_payload=not args.no_payload)
+                rows.append(row)
+                writer.writerow(row)
+                f.flush()
+
+                if row["status"] != "ok":
+                    exit_code = 1
+                    if args.stop_on_error:
+                        log("✗ 测量失败，按 --stop-on-error 停止")
+                        break
+                if not session.check_camera():
+                    log("✗ 录制进程已退出，批量测量中止")
+                    exit_code = 1
+                    break
+                if cycle < args.cycles:
+                    remaining = args.interval - (time.perf_counter() - cycle_start)
+                    if remaining > 0:
+                        log(f"等待 {remaining:.1f} s 后开始下一次测量...")
+                        time.sleep(remaining)
+    except KeyboardInterrupt:
+        log("收到中断信号，停止批量测量")
+        exit_code = 130
+    except AdbError as e:
+        log(f"✗ 设备错误: {e}")
+        exit_code = 1
+    finally:
+        session.close()
+        tracker.stop()
+        if metrics_server:
+            metrics_server.stop()
+        if catalog:
+            catalog.close()
+        client.close()
+    if rows:
+        print_summary(rows, time.perf_counter() - batch_start)
+        log(f"结果已写入: {os.path.abspath(results_path)}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""导入耗时基准测试
+
+基于 `python -X importtime` 统计主程序和录制脚本的模块导入耗时，
+并检查重量级模块（OpenCV、Pillow、numpy）没有在导入阶段被加载。
+超出预算或出现重量级模块时以非零状态码退出，便于发现冷启动回归。
+
+用法:
+    python bench_import_time.py [--runs 5] [--budget-ms 150]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# 需要检查的模块（均不应在导入阶段加载重量级依赖）
+TARGET_MODULES = ["sync_measure_and_record", "record_script"]
+
+# 导入阶段禁止出现的重量级模块
+HEAVY_MODULES = ["cv2", "PIL", "numpy"]
+
+
+def parse_importtime(stderr_text):
+    """解析 -X importtime 输出，返回 [(模块名, 自身耗时us, 累计耗时us)]"""
+    entries = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            continue  # 表头行
+        entries.append((parts[2].strip(), self_us, cumulative_us))
+    return entries
+
+
+def measure_module(module_name, runs):
+    """多次导入指定模块，返回耗时最短的一次的解析结果"""
+    best = None
+    best_total = None
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+            capture_output=True, text=True, cwd=script_dir
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"导入 {module_name} 失败:\n{result.stderr}")
+        entries = parse_importtime(result.stderr)
+        total = sum(cumulative for name, _, cumulative in entries if name == module_name)
+        if best_total is None or total < best_total:
+            best_total = total
+            best = entries
+    return best_total, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模块导入耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每个模块的导入次数（取最小值）")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="单个模块的导入耗时预算（毫秒）")
+    parser.add_argument("--top", type=int, default=10, help="显示自身耗时最高的前N个模块")
+    args = parser.parse_args()
+
+    failed = False
+    for module_name in TARGET_MODULES:
+        total_us, entries = measure_module(module_name, args.runs)
+        total_ms = total_us / 1000.0
+        print(f"== {module_name}: {total_ms:.1f} ms (预算 {args.budget_ms:.0f} ms, {args.runs} 次取最小)")
+
+        for name, self_us, cumulative_us in sorted(entries, key=lambda e: e[1], reverse=True)[:args.top]:
+            print(f"   {self_us / 1000.0:8.2f} ms  (累计 {cumulative_us / 1000.0:8.2f} ms)  {name}")
+
+        heavy = sorted({name for name, _, _ in entries if name.split(".")[0] in HEAVY_MODULES})
+        if heavy:
+            print(f"✗ 导入阶段加载了重量级模块: {', '.join(heavy)}")
+            failed = True
+        if total_ms > args.budget_ms:
+            print(f"✗ 导入耗时超出预算: {total_ms:.1f} ms > {args.budget_ms:.0f} ms")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+    print("✓ 导入耗时检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Payload 传输基准测试
+
+在本地 adb 服务器替身上生成一批小文件，分别用逐个文件 sync 拉取和 tar 流批量传输
+同步到临时目录，比较耗时和吞吐量。--latency-ms 可模拟 Wi-Fi adb 的每请求往返延迟。
+
+用法:
+    python bench_payload_transfer.py [--files 2000] [--size-kb 4] [--latency-ms 2] [--runs 3]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from adb_client import AdbClient
+from adb_standin_server import StandinAdbServer, StandinDevice
+from payload_sync import PayloadSync, REMOTE_PAYLOAD_DIR, format_bytes
+
+SERIAL = "standin-bench"
+
+
+def populate(device_root, files, size, subdirs):
+    """在替身设备的 Payload 目录下生成测试文件，返回总字节数"""
+    remote_root = os.path.join(device_root, REMOTE_PAYLOAD_DIR.lstrip("/"))
+    for index in range(files):
+        directory = os.path.join(remote_root, f"take_{index % subdirs:03d}") if subdirs else remote_root
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"sample_{index:05d}.bin"), "wb") as f:
+            f.write(os.urandom(size))
+    return files * size
+
+
+def run_once(client, method, work_dir):
+    local_root = os.path.join(work_dir, f"local_{method}")
+    shutil.rmtree(local_root, ignore_errors=True)
+    payload_sync = PayloadSync(client, SERIAL, local_root=local_root, log=lambda message: None,
+                               method=method)
+    start = time.perf_counter()
+    result = payload_sync.sync()
+    elapsed = time.perf_counter() - start
+    if result.failed:
+        raise RuntimeError(f"{method} 传输失败: {result.failed[:3]}")
+    return elapsed, len(result.pulled), result.bytes, result.method
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payload 传输基准测试（逐个文件 vs tar 流）")
+    parser.add_argument("--files", type=int, default=2000, help="测试文件数")
+    parser.add_argument("--size-kb", type=float, default=4.0, help="单个文件大小（KB）")
+    parser.add_argument("--subdirs", type=int, default=20, help="分布到多少个子目录（0 表示不分子目录）")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="替身服务器每请求的模拟延迟")
+    parser.add_argument("--runs", type=int, default=3, help="每种方式运行次数（取最小值）")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_payload_")
+    server = None
+    try:
+        device_root = os.path.join(work_dir, "device")
+        total_bytes = populate(device_root, args.files, int(args.size_kb * 1024), args.subdirs)
+        print(f"测试数据: {args.files} 个文件, {format_bytes(total_bytes)}, 模拟延迟 {args.latency_ms:.1f} ms")
+
+        server = StandinAdbServer(("127.0.0.1", 0), latency=args.latency_ms / 1000.0)
+        server.add_device(StandinDevice(SERIAL, device_root))
+        client = AdbClient(port=server.start_background())
+
+        results = {}
+        for method in ("pull", "tar"):
+            best = None
+            for _ in range(args.runs):
+                elapsed, files, byte_count, used = run_once(client, method, work_dir)
+                if files != args.files:
+                    raise RuntimeError(f"{method} 只收到 {files}/{args.files} 个文件")
+                best = elapsed if best is None else min(best, elapsed)
+            results[method] = best
+            print(f"== {method:4s} ({used}): {best:8.3f} s  {format_bytes(byte_count / best)}/s  "
+                  f"{args.files / best:8.0f} 文件/s")
+
+        print(f"tar 流相对逐个拉取的加速比: {results['pull'] / results['tar']:.1f}x")
+        client.close()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
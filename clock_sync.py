@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""设备/主机时钟偏移估计
+
+get_payload 拉取的设备数据和 record_script 录制的视频使用互不相关的时钟。
+ClockOffsetEstimator 通过常驻 shell 会话反复读取设备时间（NTP 式采样）：
+每个样本记录主机发出/收到的时刻，以往返时间最短的样本估计偏移，
+多轮采样之间做线性拟合得到漂移，最后把设备时间戳映射到录制子进程的逐帧单调时间基准上。
+
+主机时间统一使用 trigger_coordinator.clock（time.perf_counter）。
+"""
+import bisect
+import time
+
+from adb_client import AdbError
+from shell_session import ShellSession
+from trigger_coordinator import clock
+
+# 设备时钟来源：命令 -> 解析为秒
+CLOCK_SOURCES = {
+    # 墙上时钟（纳秒），toybox date 支持 %N
+    'realtime': "date +%s%N",
+    # 开机时长（/proc/uptime，10ms 精度），与 SystemClock.elapsedRealtime 同源
+    'uptime': "cat /proc/uptime",
+}
+
+# 每轮采样中参与估计的最短往返样本比例
+BEST_SAMPLE_FRACTION = 0.25
+
+# 保留的采样轮数（用于漂移拟合）
+MAX_BURSTS = 64
+
+
+class ClockSample:
+    """一次设备时间采样"""
+
+    def __init__(self, host_send, host_receive, device_time):
+        self.host_send = host_send
+        self.host_receive = host_receive
+        self.device_time = device_time
+
+    @property
+    def rtt(self):
+        return self.host_receive - self.host_send
+
+    @property
+    def host_time(self):
+        """假设设备在往返中点读取时间"""
+        return (self.host_send + self.host_receive) / 2.0
+
+    @property
+    def offset(self):
+        """设备时间 - 主机时间（秒）"""
+        return self.device_time - self.host_time
+
+
+class ClockEstimate:
+    """时钟映射：device = host + offset + drift * (host - reference)"""
+
+    def __init__(self, offset, drift, reference, uncertainty, source, samples):
+        self.offset = offset
+        self.drift = drift
+        self.reference = reference
+        self.uncertainty = uncertainty
+        self.source = source
+        self.samples = samples
+
+    def host_to_device(self, host_time):
+        return host_time + self.offset + self.drift * (host_time - self.reference)
+
+    def device_to_host(self, device_time):
+        """把设备时间戳（秒）映射为主机共享时钟时刻"""
+        return (device_time - self.offset + self.drift * self.reference) / (1.0 + self.drift)
+
+    def device_to_frame(self, device_time, frame_times):
+        """把设备时间戳映射为录制视频的帧号（按逐帧时间戳线性插值，返回浮点帧号）"""
+        if not frame_times:
+            return None
+        host_time = self.device_to_host(device_time)
+        index = bisect.bisect_left(frame_times, host_time)
+        if index <= 0:
+            return (host_time - frame_times[0]) / _frame_interval(frame_times)
+        if index >= len(frame_times):
+            return len(frame_times) - 1 + (host_time - frame_times[-1]) / _frame_interval(frame_times)
+        before, after = frame_times[index - 1], frame_times[index]
+        return index - 1 + (host_time - before) / (after - before)
+
+    def to_dict(self):
+        return {
+            'clock': 'perf_counter',
+            'device_clock': self.source,
+            'offset_s': self.offset,
+            'drift_ppm': self.drift * 1e6,
+            'reference_host_time': self.reference,
+            'uncertainty_ms': self.uncertainty * 1000.0,
+            'samples': self.samples,
+            'formula': 'device = host + offset_s + drift_ppm*1e-6 * (host - reference_host_time)',
+        }
+
+
+def _frame_interval(frame_times):
+    if len(frame_times) < 2:
+        return 1.0
+    return (frame_times[-1] - frame_times[0]) / (len(frame_times) - 1)
+
+
+def parse_device_time(source, output):
+    """解析设备时间命令的输出为秒，无法解析时返回 None"""
+    text = output.strip().split()[0] if output.strip() else ""
+    try:
+        if source == 'realtime':
+            if not text.isdigit() or len(text) < 16:
+                return None  # 不支持 %N 的 date 会原样输出
+            return int(text) / 1e9
+        return float(text)
+    except ValueError:
+        return None
+
+
+class ClockOffsetEstimator:
+    """NTP 式设备时钟偏移/漂移估计器"""
+
+    def __init__(self, client, serial=None, source='realtime'):
+        self.session = ShellSession(client, serial)
+        self.source = source
+        self.bursts = []  # 每轮采样中的最佳样本 (host_time, offset, rtt)
+        self.total_samples = 0
+
+    def open(self):
+        self.session.open()
+        return self
+
+    def close(self):
+        self.session.close()
+
+    def sample(self):
+        """采样一次设备时间，返回 ClockSample"""
+        command = CLOCK_SOURCES[self.source]
+        host_send = clock()
+        returncode, output = self.session.run(command, timeout=5)
+        host_receive = clock()
+        device_time = parse_device_time(self.source, output) if returncode == 0 else None
+        if device_time is None:
+            raise ValueError(f"无法解析设备时间: {output.strip()!r}")
+        return ClockSample(host_send, host_receive, device_time)
+
+    def burst(self, count=16, interval=0.005):
+        """一轮连续采样，取往返最短的样本，返回本轮的最佳样本"""
+        if not self.session.alive:
+            self.session.open()
+        samples = []
+        for _ in range(count):
+            try:
+                samples.append(self.sample())
+            except ValueError:
+                if self.source == 'realtime' and not samples:
+                    # 设备的 date 不支持纳秒，退回开机时钟
+                    self.source = 'uptime'
+                    continue
+                raise AdbError("设备时间输出无法解析")
+            time.sleep(interval)
+        if not samples:
+            raise AdbError("没有有效的时钟样本")
+        samples.sort(key=lambda s: s.rtt)
+        best = samples[:max(1, int(len(samples) * BEST_SAMPLE_FRACTION))]
+        # 最短往返样本的偏移取中位数，减小单个样本的抖动
+        offsets = sorted(s.offset for s in best)
+        offset = offsets[len(offsets) // 2]
+        host_time = sum(s.host_time for s in best) / len(best)
+        self.bursts.append((host_time, offset, best[0].rtt))
+        del self.bursts[:-MAX_BURSTS]
+        self.total_samples += len(samples)
+        return host_time, offset, best[0].rtt
+
+    def estimate(self):
+        """根据全部轮次估计偏移和漂移，返回 ClockEstimate（没有样本时返回 None）"""
+        if not self.bursts:
+            return None
+        if len(self.bursts) == 1 or self.bursts[-1][0] - self.bursts[0][0] < 1.0:
+            host_time, offset, rtt = min(self.bursts, key=lambda b: b[2])
+            return ClockEstimate(offset, 0.0, host_time, rtt / 2.0, self.source, self.total_samples)
+        # 以往返时间的倒数平方为权重做加权最小二乘拟合 offset = a + b * (t - t_ref)
+        reference = self.bursts[-1][0]
+        weights = [1.0 / max(rtt, 1e-6) ** 2 for _, _, rtt in self.bursts]
+        xs = [host_time - reference for host_time, _, _ in self.bursts]
+        ys = [offset for _, offset, _ in self.bursts]
+        total = sum(weights)
+        mean_x = sum(w * x for w, x in zip(weights, xs)) / total
+        mean_y = sum(w * y for w, y in zip(weights, ys)) / total
+        variance = sum(w * (x - mean_x) ** 2 for w, x in zip(weights, xs))
+        drift = (sum(w * (x - mean_x) * (y - mean_y) for w, x, y in zip(weights, xs, ys)) / variance
+                 if variance > 0 else 0.0)
+        offset = mean_y - drift * mean_x
+        uncertainty = min(rtt for _, _, rtt in self.bursts) / 2.0
+        return ClockEstimate(offset, drift, reference, uncertainty, self.source, self.total_samples)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""设备状态跟踪（host:track-devices）
+
+检查设备、连接后验证和断开等操作原来每次都执行一次 host:devices 再解析输出，既要轮询，
+也无法及时发现设备掉线或未授权。DeviceTracker 与 adb 服务器保持一条 host:track-devices
+长连接：服务器在设备列表变化时主动推送完整列表，跟踪器据此维护内存中的 序列号 → 状态 表，
+查询直接读内存，状态变化时立即通知监听者。
+
+长连接断开（如 adb 服务器重启）后自动重连；重连成功并收到第一份列表之前 synced 为 False，
+调用方此时应退回到 host:devices 查询。
+"""
+import threading
+import time
+
+from adb_client import AdbError, parse_devices
+
+# 长连接断开后重连的间隔（秒）
+RETRY_INTERVAL = 1.0
+
+# 设备状态
+STATE_DEVICE = "device"
+STATE_OFFLINE = "offline"
+STATE_UNAUTHORIZED = "unauthorized"
+STATE_GONE = None  # 不在设备列表中
+
+
+def describe_state(state):
+    """设备状态的中文说明"""
+    return {
+        STATE_DEVICE: "在线",
+        STATE_OFFLINE: "离线",
+        STATE_UNAUTHORIZED: "未授权（请在设备上允许USB调试）",
+        "authorizing": "等待授权",
+        "connecting": "连接中",
+        STATE_GONE: "已断开",
+    }.get(state, state)
+
+
+class DeviceTracker:
+    """维护 adb 服务器推送的设备状态表"""
+
+    def __init__(self, client, log=print, retry_interval=RETRY_INTERVAL):
+        self.client = client
+        self.log = log
+        self.retry_interval = retry_interval
+        self.synced = False  # 长连接正常且已收到最新列表
+        self._states = {}
+        self._listeners = []
+        self._condition = threading.Condition()
+        self._conn = None
+        self._running = False
+        self._thread = None
+
+    # --- 生命周期 ---
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="device-tracker", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        conn = self._conn
+        if conn is not None:
+            conn.close()
+        with self._condition:
+            self.synced = False
+            self._condition.notify_all()
+        self._thread = None
+
+    def _run(self):
+        warned = False
+        while self._running:
+            try:
+                self._conn = self.client.track_devices()
+                if warned:
+                    self.log("✓ 设备状态跟踪已恢复")
+                    warned = False
+                while self._running:
+                    self._update(parse_devices(self._conn.read_hex_string()))
+            except (AdbError, OSError, ValueError) as e:
+                if self._running and not warned:
+                    self.log(f"⚠ 设备状态跟踪中断: {e}，将自动重连")
+                    warned = True
+            finally:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                with self._condition:
+                    self.synced = False
+                    self._condition.notify_all()
+            if self._running:
+                time.sleep(self.retry_interval)
+
+    def _update(self, devices):
+        new_states = dict(devices)
+        with self._condition:
+            old_states = self._states
+            self._states = new_states
+            self.synced = True
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+        for serial in sorted(set(old_states) | set(new_states)):
+            old, new = old_states.get(serial), new_states.get(serial)
+            if old == new:
+                continue
+            for listener in listeners:
+                try:
+                    listener(serial, old, new)
+                except Exception as e:
+                    self.log(f"✗ 设备状态回调失败: {e}")
+
+    # --- 查询 ---
+
+    def add_listener(self, callback):
+        """callback(序列号, 旧状态, 新状态) 在跟踪线程中调用，状态为 None 表示不在列表中"""
+        with self._condition:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._condition:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def state(self, serial):
+        with self._condition:
+            return self._states.get(serial)
+
+    def snapshot(self):
+        """返回 {序列号: 状态} 副本"""
+        with self._condition:
+            return dict(self._states)
+
+    def devices(self, state=STATE_DEVICE):
+        """返回处于指定状态的序列号列表"""
+        with self._condition:
+            return [serial for serial, current in self._states.items() if current == state]
+
+    def wait_for(self, serial, states=(STATE_DEVICE,), timeout=5.0):
+        """等待设备进入 states 之一，返回最后看到的状态（超时或跟踪中断时可能不在 states 中）"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._states.get(serial) not in states:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    break
+                self._condition.wait(remaining)
+            return self._states.get(serial)
+
+    def wait_synced(self, timeout=2.0):
+        """等待收到第一份设备列表，返回 synced"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self.synced and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self.synced
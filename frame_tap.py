@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""录制画面共享内存分流（frame tap）
+
+录制子进程占用摄像头后，界面预览无法再用自己的 VideoCapture 打开同一个摄像头，操作员只能盲录。
+FrameTapWriter 在录制子进程中创建一块共享内存环形缓冲区，每隔若干帧把缩小后的画面写入下一个槽位；
+界面中的 FrameTapReader 按名称附加到同一块共享内存，只读取最新完成的一帧，画面数据不经过管道。
+
+- 录制热循环中只做计数和保存帧引用（offer），缩放和写入在单独的线程中进行；
+- 每个槽位带序号：写入前把序号置 0，写完再写入新序号并更新最新序号，读取方复制数据前后
+  比较槽位序号，被覆盖的帧直接丢弃（与 seqlock 相同的方式，不需要跨进程锁）。
+
+共享内存布局：头部（HEADER）+ 最新序号（uint64）+ slots 个槽位，每个槽位为槽位头（SLOT_HEADER）
+加 max_width × max_height × 3 字节 BGR 画面。
+"""
+import os
+import struct
+import threading
+
+from lazy_import import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+shared_memory = lazy_module('multiprocessing.shared_memory')
+
+# 录制子进程输出中公布共享内存名称的信号
+FRAME_TAP_SIGNAL = "预览共享内存:"
+
+# 默认每 8 帧分流一帧（240 fps 时为 30 fps），缩小到 320x200 以内
+DEFAULT_DECIMATION = 8
+DEFAULT_MAX_SIZE = (320, 200)
+DEFAULT_SLOTS = 4
+
+MAGIC = b"FTAP"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIII")  # magic, version, slots, max_width, max_height, decimation
+LATEST = struct.Struct("<Q")
+LATEST_OFFSET = HEADER.size
+SLOT_HEADER = struct.Struct("<QdQII")  # seq, 共享时钟时间, 录制帧号, width, height
+SLOTS_OFFSET = 64
+
+
+def _slot_stride(max_width, max_height):
+    # 槽位按 64 字节对齐
+    size = SLOT_HEADER.size + max_width * max_height * 3
+    return (size + 63) // 64 * 64
+
+
+def _attach(name):
+    """附加到已有的共享内存，不交给本进程的 resource_tracker（否则退出时会删除录制进程的共享内存）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13 之前没有 track 参数
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameTapWriter:
+    """录制子进程中的写入端：每 decimation 帧把缩小的画面写入共享内存环形缓冲区"""
+
+    def __init__(self, name=None, max_size=DEFAULT_MAX_SIZE, slots=DEFAULT_SLOTS, decimation=DEFAULT_DECIMATION):
+        self.max_width, self.max_height = max_size
+        self.slots = slots
+        self.decimation = max(1, int(decimation))
+        self.stride = _slot_stride(self.max_width, self.max_height)
+        size = SLOTS_OFFSET + self.stride * slots
+        self.shm = shared_memory.SharedMemory(name=name or f"frametap_{os.getpid()}", create=True, size=size)
+        self.name = self.shm.name
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, slots, self.max_width, self.max_height, self.decimation)
+        LATEST.pack_into(self.shm.buf, LATEST_OFFSET, 0)
+        self.sequence = 0  # 已写入的帧数
+        self.dropped = 0  # 写入线程来不及处理而跳过的帧数
+        self._counter = 0
+        self._pending = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-tap", daemon=True)
+        self._thread.start()
+
+    def offer(self, frame, frame_time, frame_index):
+        """录制热循环中调用：只保存帧引用，不复制、不缩放"""
+        self._counter += 1
+        if self._counter % self.decimation:
+            return
+        if self._pending is not None:
+            self.dropped += 1
+        self._pending = (frame, frame_time, frame_index)
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            pending = self._pending
+            self._pending = None
+            if pending is None or self._stop.is_set():
+                continue
+            try:
+                self.write(*pending)
+            except Exception as e:
+                print(f"警告: 预览共享内存写入失败: {e}", flush=True)
+                return
+
+    def write(self, frame, frame_time, frame_index):
+        """把一帧缩小后写入下一个槽位"""
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.max_width / width, self.max_height / height)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        seq = self.sequence + 1
+        offset = SLOTS_OFFSET + ((seq - 1) % self.slots) * self.stride
+        buf = self.shm.buf
+        # 写入期间序号为 0，读取方据此丢弃写了一半的槽位
+        SLOT_HEADER.pack_into(buf, offset, 0, 0.0, 0, 0, 0)
+        target = np.ndarray((size[1], size[0], 3), dtype=np.uint8, buffer=buf,
+                            offset=offset + SLOT_HEADER.size)
+        if size == (width, height):
+            target[...] = frame
+        else:
+            cv2.resize(frame, size, dst=target, interpolation=cv2.INTER_AREA)
+        del target
+        SLOT_HEADER.pack_into(buf, offset, seq, frame_time, frame_index, size[0], size[1])
+        LATEST.pack_into(buf, LATEST_OFFSET, seq)
+        self.sequence = seq
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(1.0)
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except (OSError, BufferError):
+            pass
+
+
+class FrameTapReader:
+    """界面中的读取端：按名称附加到录制子进程的共享内存，读取最新一帧"""
+
+    def __init__(self, name):
+        self.shm = _attach(name)
+        self.name = name
+        magic, version, slots, max_width, max_height, decimation = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f"共享内存 {name} 不是预览分流缓冲区")
+        self.slots = slots
+        self.decimation = decimation
+        self.stride = _slot_stride(max_width, max_height)
+        self.last_sequence = 0
+        self.frame_time = None  # 最近读取的帧的共享时钟时间
+        self.frame_index = None  # 最近读取的帧在录制中的帧号
+
+    @property
+    def latest(self):
+        return LATEST.unpack_from(self.shm.buf, LATEST_OFFSET)[0]
+
+    def read(self):
+        """返回最新完成的一帧（BGR 数组的副本），没有新帧或该帧正被覆盖时返回 None"""
+        seq = self.latest
+        if seq == 0 or seq == self.last_sequence:
+            return None
+        buf = self.shm.buf
+        offset = SLOTS_OFFSET + ((seq - 1) % self.slots) * self.stride
+        slot_seq, frame_time, frame_index, width, height = SLOT_HEADER.unpack_from(buf, offset)
+        if slot_seq != seq:
+            return None
+        frame = np.ndarray((height, width, 3), dtype=np.uint8, buffer=buf,
+                           offset=offset + SLOT_HEADER.size).copy()
+        if SLOT_HEADER.unpack_from(buf, offset)[0] != seq:
+            # 复制期间槽位已被写入端覆盖
+            return None
+        self.last_sequence = seq
+        self.frame_time = frame_time
+        self.frame_index = frame_index
+        return frame
+
+    def close(self):
+        try:
+            self.shm.close()
+        except (OSError, BufferError):
+            pass
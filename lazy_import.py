@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""延迟导入工具
+
+OpenCV、Pillow 等重量级模块的导入占据了冷启动的大部分时间（PyInstaller 打包后尤为明显）。
+这里提供一个模块代理，首次访问属性时才真正导入，调用方式与普通模块完全一致。
+"""
+import importlib
+import sys
+import threading
+
+
+class LazyModule:
+    """模块代理：首次访问属性时才导入真实模块"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """导入并缓存真实模块"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "已加载" if self._module is not None else "未加载"
+        return f"<LazyModule {self._name} ({state})>"
+
+    @property
+    def loaded(self):
+        """真实模块是否已导入"""
+        return self._module is not None
+
+
+def lazy_module(name):
+    """返回模块代理；如果模块已被导入则直接返回模块本身"""
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
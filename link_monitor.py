@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""Wi-Fi adb 链路健康监测
+
+连接设备时只执行一次 host:connect，链路断开后要等到下一次触发或 Payload 下载用完 10–30 秒的
+超时才会发现。LinkMonitor 在后台线程中定期发送轻量的探测命令（一次 shell 往返），统计往返
+时间和最近若干次探测的丢包率，据此把链路评为 良好 / 较差 / 断开：
+
+- 链路断开时，网络设备（序列号为 ip:port）在后台按指数退避重新执行 host:disconnect +
+  host:connect，通常在下一次测量之前就已恢复；
+- require_healthy() 在链路断开时立即抛出 LinkDownError，触发和 Payload 下载不必等待超时；
+- DeviceTracker 报告设备掉线时通过 notify_state() 立即把链路标记为断开。
+
+测量触发期间用 hold()/release() 暂停探测，避免与按键触发争用链路。
+"""
+import collections
+import threading
+import time
+
+from adb_client import AdbError
+
+# 探测间隔和单次探测超时（秒）
+PROBE_INTERVAL = 2.0
+PROBE_TIMEOUT = 2.0
+
+# 统计丢包率的探测次数
+PROBE_WINDOW = 20
+
+# 往返时间平滑系数
+RTT_SMOOTHING = 0.3
+
+# 判定为较差的往返时间（秒）和丢包率
+DEGRADED_RTT = 0.15
+DEGRADED_LOSS = 0.1
+
+# 连续失败多少次判定为断开
+DOWN_FAILURES = 2
+
+# 重连退避（秒）
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+# 暂停探测的最长时间（秒），防止调用方忘记 release
+MAX_HOLD_TIME = 10.0
+
+LINK_UNKNOWN = "unknown"
+LINK_GOOD = "good"
+LINK_DEGRADED = "degraded"
+LINK_DOWN = "down"
+
+LINK_LABELS = {
+    LINK_UNKNOWN: "检测中",
+    LINK_GOOD: "良好",
+    LINK_DEGRADED: "较差",
+    LINK_DOWN: "断开",
+}
+
+
+class LinkDownError(AdbError):
+    """设备链路已判定为断开，操作被立即拒绝"""
+
+
+class LinkMonitor:
+    """定期探测一台设备的 adb 链路并在断开时后台重连"""
+
+    def __init__(self, client, serial, log=print, on_change=None, interval=PROBE_INTERVAL,
+                 probe_timeout=PROBE_TIMEOUT, reconnect=None):
+        if not serial:
+            # 不指定设备时探测会落到 transport-any，多台设备时结果不可预期
+            raise ValueError("链路监测需要指定设备序列号")
+        self.client = client
+        self.serial = serial
+        self.log = log
+        self.on_change = on_change  # on_change(LinkMonitor)：链路等级变化时在监测线程中调用
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        # 只有网络设备可以重新 host:connect
+        self.reconnect_enabled = (":" in serial) if reconnect is None else reconnect
+
+        self.quality = LINK_UNKNOWN
+        self.reason = None  # 断开或较差的原因
+        self.rtt = None  # 平滑后的往返时间（秒）
+        self.last_rtt = None
+        self.failures = 0  # 连续失败次数
+        self.reconnects = 0  # 成功重连次数
+        self._results = collections.deque(maxlen=PROBE_WINDOW)
+        self._backoff = RECONNECT_MIN_DELAY
+        self._next_reconnect = 0.0
+        self._hold_until = 0.0
+        self._device_online = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- 生命周期 ---
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"link-monitor-{self.serial}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """停止监测并等待监测线程退出（进行中的重连最多再执行一条 adb 命令）"""
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            if thread.is_alive():
+                self.log(f"⚠ 链路监测线程 {timeout} s 内未退出 ({self.serial})")
+        self._thread = None
+
+    def hold(self, timeout=MAX_HOLD_TIME):
+        """暂停探测（测量触发前调用）"""
+        with self._lock:
+            self._hold_until = time.perf_counter() + timeout
+
+    def release(self):
+        with self._lock:
+            self._hold_until = 0.0
+
+    @property
+    def held(self):
+        return time.perf_counter() < self._hold_until
+
+    # --- 状态 ---
+
+    @property
+    def loss(self):
+        """最近 PROBE_WINDOW 次探测的丢包率"""
+        with self._lock:
+            if not self._results:
+                return 0.0
+            return self._results.count(False) / len(self._results)
+
+    @property
+    def healthy(self):
+        return self.quality != LINK_DOWN
+
+    def require_healthy(self):
+        """链路断开时立即抛出 LinkDownError"""
+        if self.quality == LINK_DOWN:
+            retry = max(0.0, self._next_reconnect - time.monotonic())
+            message = f"设备 {self.serial} 链路断开（{self.reason}）"
+            if self.reconnect_enabled:
+                message += f"，正在后台重连（{retry:.0f} s 后重试）" if retry >= 1 else "，正在后台重连"
+            raise LinkDownError(message)
+
+    def describe(self):
+        """状态栏显示的链路质量，如 “链路良好 RTT 12 ms 丢包 0%”"""
+        text = f"链路{LINK_LABELS[self.quality]}"
+        if self.quality == LINK_DOWN:
+            return text + ("，重连中" if self.reconnect_enabled else "")
+        if self.rtt is not None:
+            text += f" RTT {self.rtt * 1000:.0f} ms 丢包 {self.loss * 100:.0f}%"
+        return text
+
+    def notify_state(self, state):
+        """DeviceTracker 报告的设备状态：不在线时立即判定为断开，恢复在线时立即探测"""
+        if state == "device":
+            self._device_online = True
+            self._wake.set()
+            return
+        self.failures = max(self.failures, DOWN_FAILURES)
+        self._set_quality(LINK_DOWN, f"设备状态: {state or '已断开'}")
+        self._wake.set()
+
+    def _set_quality(self, quality, reason=None):
+        previous = self.quality
+        self.quality = quality
+        self.reason = reason
+        if quality == previous:
+            return
+        if quality == LINK_DOWN:
+            self.log(f"✗ 设备 {self.serial} 链路断开: {reason}")
+            self._backoff = RECONNECT_MIN_DELAY
+            self._next_reconnect = time.monotonic()
+        elif quality == LINK_DEGRADED:
+            self.log(f"⚠ 设备 {self.serial} 链路较差: {reason}")
+        elif previous in (LINK_DOWN, LINK_DEGRADED):
+            self.log(f"✓ 设备 {self.serial} 链路已恢复 ({self.describe()})")
+        if self.on_change:
+            try:
+                self.on_change(self)
+            except Exception as e:
+                self.log(f"✗ 链路状态回调失败: {e}")
+
+    # --- 探测和重连 ---
+
+    def probe(self):
+        """发送一次探测，返回往返时间（秒），失败时抛出 AdbError"""
+        start = time.perf_counter()
+        result = self.client.shell(self.serial, "echo ok", timeout=self.probe_timeout)
+        if "ok" not in result.stdout:
+            raise AdbError(f"探测响应异常: {result.stdout.strip()!r}")
+        return time.perf_counter() - start
+
+    def _record(self, rtt, error=None):
+        with self._lock:
+            self._results.append(error is None)
+        if error is not None:
+            self.failures += 1
+            if self.failures >= DOWN_FAILURES:
+                self._set_quality(LINK_DOWN, f"连续 {self.failures} 次探测失败: {error}")
+            return
+        self.failures = 0
+        self.last_rtt = rtt
+        self.rtt = rtt if self.rtt is None else self.rtt + RTT_SMOOTHING * (rtt - self.rtt)
+        loss = self.loss
+        if loss > DEGRADED_LOSS:
+            self._set_quality(LINK_DEGRADED, f"丢包 {loss * 100:.0f}%")
+        elif self.rtt > DEGRADED_RTT:
+            self._set_quality(LINK_DEGRADED, f"往返时间 {self.rtt * 1000:.0f} ms")
+        else:
+            self._set_quality(LINK_GOOD)
+
+    def _reconnect(self):
+        """重新连接网络设备，返回是否成功（失败时按指数退避推迟下一次重连）"""
+        self.log(f"正在重新连接设备 {self.serial}...")
+        try:
+            # 服务器可能仍认为旧连接有效，先断开再连接
+            try:
+                self.client.disconnect(self.serial, timeout=self.probe_timeout)
+            except AdbError:
+                pass
+            if self._stop.is_set():
+                return False
+            message = self.client.connect(self.serial, timeout=self.probe_timeout * 2).strip()
+            if "connected" not in message.lower():
+                raise AdbError(message or "未知错误")
+            self.probe()
+        except (AdbError, OSError) as e:
+            self.log(f"⚠ 重连设备 {self.serial} 失败: {e}，{self._backoff:.1f} s 后重试")
+            self._next_reconnect = time.monotonic() + self._backoff
+            self._backoff = min(self._backoff * 2, RECONNECT_MAX_DELAY)
+            return False
+        self.reconnects += 1
+        self._backoff = RECONNECT_MIN_DELAY
+        with self._lock:
+            self._results.clear()
+        self.rtt = None
+        return True
+
+    def _run(self):
+        delay = 0.0  # 启动后立即探测一次
+        while not self._stop.is_set():
+            if delay > 0:
+                self._wake.wait(delay)
+                self._wake.clear()
+            if self._stop.is_set():
+                break
+            delay = self.interval
+            if self.held:
+                delay = min(self.interval, self._hold_until - time.perf_counter())
+                continue
+            if self.quality == LINK_DOWN and self.reconnect_enabled:
+                if self._device_online:
+                    # adb 服务器已报告设备重新上线，先探测，失败再重连
+                    self._device_online = False
+                else:
+                    wait = self._next_reconnect - time.monotonic()
+                    if wait > 0:
+                        delay = wait
+                        continue
+                    if not self._reconnect():
+                        delay = self._next_reconnect - time.monotonic()
+                        continue
+            try:
+                rtt = self.probe()
+            except (AdbError, OSError) as e:
+                self._record(None, e)
+            else:
+                self._record(rtt)
+            if self.quality == LINK_DOWN and self.reconnect_enabled:
+                delay = self._next_reconnect - time.monotonic()
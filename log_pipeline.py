@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""日志流水线
+
+原来每条日志都同步 print，并放入无界队列；界面每 100 ms 逐条 insert 到 ScrolledText，每条之后
+都调用 see(END)。录制子进程的输出逐行转发后，日志控件无限增长，Tk 主线程忙于重新排版。现在：
+
+- LogPipeline.log() 只做分类和入队：控制台输出和滚动日志文件由后台线程（logging 的 QueueListener）
+  写入，文件始终记录全部消息；
+- 每个来源（app / recorder / scrcpy）有单独的显示级别，低于该级别的消息只写入文件；
+- 待显示的消息放在有界缓冲区中，界面来不及显示时丢弃最旧的消息并计数；
+- TextLogView 每次刷新把积累的消息合并为一次 insert，超出行数上限时一次 delete 删除最旧的行。
+"""
+import collections
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+from lazy_import import lazy_module
+
+log_handlers = lazy_module('logging.handlers')
+
+# 日志控件保留的行数和两次刷新之间最多积累的消息数
+DEFAULT_MAX_LINES = 2000
+DEFAULT_MAX_PENDING = 5000
+
+# 滚动日志文件：单个文件上限和保留的旧文件个数
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+LOGGER_NAME = "AndroidControlApp"
+
+SOURCE_APP = "app"
+SOURCE_RECORDER = "recorder"
+SOURCE_SCRCPY = "scrcpy"
+
+# 消息前缀 -> 来源（未显式指定来源时按前缀判断）
+SOURCE_PREFIXES = (
+    ("[录制]", SOURCE_RECORDER),
+    ("scrcpy", SOURCE_SCRCPY),
+)
+
+# 消息开头的标记 -> 级别
+LEVEL_MARKERS = (
+    (("✗", "错误", "ERROR"), logging.ERROR),
+    (("⚠", "警告", "注意", "WARN"), logging.WARNING),
+)
+
+FILE_FORMAT = "%(asctime)s %(levelname)-7s [%(source)s] %(message)s"
+CONSOLE_FORMAT = "[%(asctime)s] %(message)s"
+
+
+def parse_level(value, default=logging.INFO):
+    """配置中的级别（"info"、"WARNING" 或数字）转换为 logging 级别"""
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).upper())
+    return level if isinstance(level, int) else default
+
+
+def classify(message):
+    """按消息内容判断来源和级别"""
+    source = SOURCE_APP
+    for prefix, prefix_source in SOURCE_PREFIXES:
+        if message.startswith(prefix):
+            source = prefix_source
+            message = message[len(prefix):].lstrip(" :")
+            break
+    for markers, level in LEVEL_MARKERS:
+        if message.startswith(markers):
+            return source, level
+    return source, logging.INFO
+
+
+class LogPipeline:
+    """日志入口：分类、后台写入控制台和滚动文件、为界面缓存待显示的消息"""
+
+    def __init__(self, log_path=None, levels=None, max_pending=DEFAULT_MAX_PENDING,
+                 max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT, console=True):
+        self.log_path = log_path
+        self.levels = {}  # 来源 -> 显示级别
+        self.set_levels(levels or {})
+        self.dropped = 0  # 界面来不及显示而丢弃的消息数
+        self._pending = collections.deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+
+        self._logger = logging.getLogger(LOGGER_NAME)
+        self._logger.setLevel(logging.DEBUG)
+        self._logger.propagate = False
+        self._queue = queue.SimpleQueue()
+        self._handler = log_handlers.QueueHandler(self._queue)
+        self._logger.addHandler(self._handler)
+
+        handlers = []
+        if console:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter(CONSOLE_FORMAT, "%H:%M:%S"))
+            handlers.append(handler)
+        self.file_error = None
+        if log_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+                handler = log_handlers.RotatingFileHandler(log_path, maxBytes=max_bytes,
+                                                           backupCount=backup_count, encoding="utf-8")
+                handler.setFormatter(logging.Formatter(FILE_FORMAT))
+                handlers.append(handler)
+            except OSError as e:
+                self.file_error = str(e)
+        self._listener = log_handlers.QueueListener(self._queue, *handlers)
+        self._started = False
+
+    def start(self):
+        if not self._started:
+            self._listener.start()
+            self._started = True
+        return self
+
+    def stop(self):
+        """写完已入队的消息后停止后台线程"""
+        if self._started:
+            self._listener.stop()
+            self._started = False
+        self._logger.removeHandler(self._handler)
+        for handler in self._listener.handlers:
+            handler.close()
+
+    def set_levels(self, levels):
+        """设置各来源的显示级别，如 {"recorder": "warning"}"""
+        for source, level in levels.items():
+            self.levels[source] = parse_level(level)
+
+    def level_names(self):
+        """各来源的显示级别名称（保存到配置文件）"""
+        return {source: logging.getLevelName(level) for source, level in self.levels.items()}
+
+    def log(self, message, source=None, level=None):
+        """记录一条消息（任意线程），返回界面显示的文本（低于显示级别时返回 None）"""
+        detected_source, detected_level = classify(message)
+        source = source or detected_source
+        level = detected_level if level is None else level
+        self._logger.log(level, message, extra={"source": source})
+
+        if level < self.levels.get(source, logging.INFO):
+            return None
+        formatted_message = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(formatted_message)
+        return formatted_message
+
+    def drain(self):
+        """取出所有待显示的消息，返回 (消息列表, 期间丢弃的消息数)"""
+        with self._lock:
+            messages = list(self._pending)
+            self._pending.clear()
+            dropped = self.dropped
+            self.dropped = 0
+        return messages, dropped
+
+
+class TextLogView:
+    """把 LogPipeline 的消息批量显示到 Text 控件（只能在 Tk 主线程中调用 update）"""
+
+    def __init__(self, widget, pipeline, max_lines=DEFAULT_MAX_LINES):
+        self.widget = widget
+        self.pipeline = pipeline
+        self.max_lines = max_lines
+
+    def update(self):
+        messages, dropped = self.pipeline.drain()
+        if not messages:
+            return
+        if dropped:
+            messages.insert(0, f"... 日志过多，已跳过 {dropped} 条（完整日志见日志文件）")
+        # 一次插入所有消息，超出上限时一次删除最旧的行
+        self.widget.insert("end", "\n".join(messages[-self.max_lines:]) + "\n")
+        lines = int(self.widget.index("end-1c").split(".")[0]) - 1
+        if lines > self.max_lines:
+            self.widget.delete("1.0", f"{lines - self.max_lines + 1}.0")
+        self.widget.see("end")
@@ -0,0 +1,805 @@
+# -*- coding: utf-8 -*-
+"""测量会话编排（与界面无关）
+
+连接设备、启动摄像头子进程、同时触发设备和摄像头、交接视频、写入元数据、登记会话目录、
+同步 Payload 等步骤原来都写在 AndroidControlApp 的按钮回调里，只能在 Tk 界面中逐步点击。
+MeasurementSession 把这些步骤整理成可在任意线程中阻塞调用的方法：图形界面在后台线程中
+调用它们并只负责更新控件，无人值守的 batch_runner.py 直接按顺序调用。
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from adb_client import AdbError
+from clock_sync import ClockOffsetEstimator
+from device_tracker import STATE_DEVICE, describe_state
+from frame_tap import FRAME_TAP_SIGNAL
+from link_monitor import LinkMonitor, LinkDownError
+from metrics import (REGISTRY, METRICS_SIGNAL, TAKES, TRIGGER_SKEW_MS, TRIGGER_LATENCY_SECONDS,
+                     VIDEO_HANDOFF_SECONDS, VIDEO_HANDOFF_BYTES, PAYLOAD_SYNC_SECONDS, PAYLOAD_SYNC_BYTES,
+                     PAYLOAD_SYNC_FILES)
+from payload_sync import PayloadSync, REMOTE_PAYLOAD_DIR, LOCAL_PAYLOAD_ROOT
+from payload_watcher import PayloadWatcher
+from screen_recorder import ScreenRecorder, SCREEN_VIDEO_SUFFIX, FIRST_FRAME_TIMEOUT
+from session_catalog import SessionCatalog
+from shell_session import DeviceTrigger
+from take_metadata import (update_take_metadata, load_take_metadata, take_metadata_path, frame_times_path,
+                           metrics_snapshot_path, trace_path)
+from tracing import Tracer, TRACE_SIGNAL, clock
+from trigger_coordinator import TriggerCoordinator
+from video_handoff import handoff_file
+
+RECORD_SCRIPT = "record_script.py"
+VENV_PYTHON = "venv/bin/python"
+
+# 摄像头初始化超时（秒）
+CAMERA_READY_TIMEOUT = 10.0
+
+# 从触发到视频保存完成的超时（秒）：录制 31 秒，加上编码和写盘
+TAKE_TIMEOUT = 120.0
+
+# host:connect 成功后等待设备在列表中变为 device 的时间（秒）
+DEVICE_ONLINE_TIMEOUT = 5.0
+
+# 录制子进程输出中的信号
+CAMERA_READY_SIGNAL = "等待从标准输入接收's'命令"
+SAVING_SIGNAL = "正在保存文件到:"
+SAVED_SIGNAL = "文件保存成功。"
+
+# 延迟追踪中本进程的名称（录制子进程的事件并入后显示为另一个进程）
+TRACE_PROCESS_NAME = "测量主程序"
+
+
+class MeasurementError(RuntimeError):
+    """测量流程无法继续（摄像头未就绪、录制命令发送失败等）"""
+
+
+def format_take_name(filename_parts):
+    """文件名：前缀_编号-后缀"""
+    if len(filename_parts) >= 3:
+        # 前缀后面用下划线，其他地方用破折号
+        return f"{filename_parts[0]}_{filename_parts[1]}-{filename_parts[2]}"
+    # 兼容旧格式
+    return "-".join(filename_parts)
+
+
+def next_take_number(number):
+    """编号加一并保持原有位数（至少7位），编号不是数字时抛出 ValueError"""
+    return f"{int(number) + 1:0{max(7, len(number))}d}"
+
+
+def find_python_executable():
+    """优先使用虚拟环境中的 Python 启动录制子进程"""
+    if os.path.exists(VENV_PYTHON):
+        return VENV_PYTHON
+    return sys.executable
+
+
+class MeasurementSession:
+    """一台设备加一个摄像头的测量流程
+
+    get_client 返回 AdbClient（ADB 工具在界面中可能稍后才就绪，因此传入函数）；
+    name_provider() 返回下一次测量的文件名（不含扩展名）；
+    on_take_saved(视频路径, TakeTrigger) 在视频交接和元数据写入完成后于读取线程中调用。
+    video_dir 为录制子进程的输出目录（None 时使用 record_script 的默认目录），payload_root 为本地
+    Payload 根目录，录制的视频也交接到其中；多台设备并行时各用一套目录（见 rig_scheduler）。
+    device_tracker 为 DeviceTracker 时设备列表和状态直接从内存读取，不再每次查询 adb 服务器。
+    link_monitoring 为 True 时打开设备后在后台监测链路（见 link_monitor），链路断开时测量和
+    Payload 同步立即失败；on_link_change(LinkMonitor) 在链路等级变化时调用。
+    screen_recording 为 True 时每次测量同时录制设备屏幕（见 screen_recorder），屏幕第一帧
+    相对摄像头首帧的偏移写入测量元数据的 screen_recording 分节。
+    每次测量的各环节耗时（含录制子进程上报的区间）记录在 trace 中，视频保存后写入
+    视频旁的 trace_<视频名>.json（见 tracing）。
+    """
+
+    def __init__(self, get_client, log=print, name_provider=None, on_take_saved=None,
+                 trigger_method="auto", trigger_compensation=False, payload_transfer_method="auto",
+                 payload_watch=True, video_handoff="auto", catalog=None, record_script=RECORD_SCRIPT,
+                 video_dir=None, payload_root=LOCAL_PAYLOAD_ROOT, device_tracker=None,
+                 link_monitoring=True, on_link_change=None, screen_recording=False):
+        self.get_client = get_client
+        self.log = log
+        self.name_provider = name_provider
+        self.on_take_saved = on_take_saved
+        self.trigger_method = trigger_method  # auto / sendevent / session-input / spawn
+        self.payload_transfer_method = payload_transfer_method  # auto / tar / pull
+        self.payload_watch = payload_watch
+        self.link_monitoring = link_monitoring
+        self.on_link_change = on_link_change
+        self.screen_recording = screen_recording
+        self.video_handoff = video_handoff  # auto / rename / hardlink / reflink / copy
+        self.catalog = catalog
+        self.record_script = record_script
+        self.video_dir = video_dir
+        self.payload_root = payload_root
+        self.video_target_dir = os.path.join(payload_root, os.path.basename(REMOTE_PAYLOAD_DIR))
+
+        # 设备
+        self.device_tracker = device_tracker
+        self.serial = None
+        self.device_trigger = None
+        self.clock_estimator = None  # 设备/主机时钟偏移估计器
+        self.payload_watcher = None
+        self.link_monitor = None  # 链路健康监测
+        self.screen_recorder = None  # 设备屏幕录制
+
+        # 摄像头录制子进程
+        self.record_process = None
+        self.camera_index = None
+        self.camera_ready = False
+        self.frame_tap_name = None  # 录制子进程公布的预览共享内存名称（见 frame_tap）
+
+        # 当前测量
+        self.trigger_coordinator = TriggerCoordinator(compensate=trigger_compensation)
+        self.current_take = None  # 当前测量的触发记录
+        self.last_recorded_video = None  # 录制子进程最后保存的视频
+        self.last_take_video = None  # 最后一次交接到 payloads 的视频
+        self.last_session_id = None  # 最近一次测量的会话ID，随后同步的 Payload 文件关联到它
+        self.trace = Tracer(TRACE_PROCESS_NAME)  # 当前测量的延迟追踪
+        self._take_saved = threading.Event()
+
+    # --- 设备 ---
+
+    def tracking(self):
+        """设备状态跟踪器是否可用（长连接正常且已收到最新列表）"""
+        return self.device_tracker is not None and self.device_tracker.synced
+
+    def list_devices(self, timeout=10):
+        """返回状态为 device 的序列号列表"""
+        if self.tracking():
+            return self.device_tracker.devices(STATE_DEVICE)
+        return [serial for serial, state in self.get_client().devices(timeout=timeout) if state == STATE_DEVICE]
+
+    def device_state(self, serial, timeout=10):
+        """返回设备状态（device / offline / unauthorized 等），不在列表中时返回 None"""
+        if self.tracking():
+            return self.device_tracker.state(serial)
+        return dict(self.get_client().devices(timeout=timeout)).get(serial)
+
+    def wait_device(self, serial, timeout=DEVICE_ONLINE_TIMEOUT):
+        """等待设备变为 device 状态，返回最后的状态（没有跟踪器时轮询 host:devices）"""
+        if self.tracking():
+            return self.device_tracker.wait_for(serial, (STATE_DEVICE,), timeout)
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self.device_state(serial)
+            if state == STATE_DEVICE or time.monotonic() >= deadline:
+                return state
+            time.sleep(0.2)
+
+    def connect(self, address, timeout=15):
+        """通过 adb 服务器执行 host:connect，返回服务器输出
+
+        服务器未报告连接成功、或设备连接后未变为 device 状态（如未授权）时抛出 AdbError。
+        """
+        output = self.get_client().connect(address, timeout=timeout).strip()
+        self.log(f"连接结果: {output}")
+        if "connected" not in output.lower():
+            raise AdbError(output or "未知错误")
+        state = self.wait_device(address)
+        if state != STATE_DEVICE:
+            raise AdbError(f"设备 {address} {describe_state(state)}")
+        return output
+
+    def handle_device_state(self, serial, old, new):
+        """DeviceTracker 报告的状态变化（在跟踪线程中调用），只处理当前设备"""
+        if serial != self.serial:
+            return
+        if self.link_monitor:
+            self.link_monitor.notify_state(new)
+        if new == STATE_DEVICE:
+            self.log(f"✓ 设备 {serial} 已恢复在线")
+            # 设备刚重新上线，让 Payload 后台同步立即检查一次
+            self.release_payload_watcher()
+        else:
+            self.log(f"⚠ 设备 {serial} {describe_state(new)}")
+
+    def disconnect(self, address=None, timeout=10):
+        """停止录制、关闭设备会话并断开指定（或全部）设备"""
+        self.stop_camera()
+        self.close_device()
+        self.get_client().disconnect(address, timeout=timeout)
+
+    def open_device(self, serial):
+        """为设备打开常驻shell会话、时钟同步和 Payload 后台监视（连接设备时调用）
+
+        serial 为空时抛出 MeasurementError（连接了多台设备时必须指定使用哪一台）。
+        """
+        if not serial:
+            raise MeasurementError("未指定设备：连接了多台设备时请先选择要使用的设备")
+        self.close_device()
+        self.serial = serial
+        self.device_trigger = DeviceTrigger(self.get_client(), serial,
+                                            preferred_method=self.trigger_method,
+                                            log=self.log)
+        self.device_trigger.prepare()
+        self.open_clock_sync(serial)
+        if self.payload_watch:
+            self.payload_watcher = PayloadWatcher(self.get_client(), serial, log=self.log,
+                                                  method=self.payload_transfer_method,
+                                                  on_synced=self.on_payload_synced,
+                                                  local_root=self.payload_root).start()
+        if self.link_monitoring:
+            self.link_monitor = LinkMonitor(self.get_client(), serial, log=self.log,
+                                            on_change=self.on_link_change).start()
+        return self.device_trigger
+
+    def open_clock_sync(self, serial):
+        """打开时钟同步会话并做首轮采样"""
+        try:
+            self.clock_estimator = ClockOffsetEstimator(self.get_client(), serial).open()
+            host_time, offset, rtt = self.clock_estimator.burst()
+            self.log(f"✓ 设备时钟偏移: {offset:+.6f} s (最短往返 {rtt * 1000:.1f} ms, "
+                     f"时钟源 {self.clock_estimator.source})")
+        except AdbError as e:
+            self.log(f"⚠ 设备时钟同步失败: {e}")
+            self.clock_estimator = None
+
+    def get_device_trigger(self):
+        """获取当前设备的按键触发器，尚未打开时立即打开"""
+        if self.device_trigger is None:
+            return self.open_device(self.serial)
+        if not self.device_trigger.session.alive:
+            # 会话断开（如设备重连）后重新打开
+            self.device_trigger.prepare()
+        return self.device_trigger
+
+    def close_device(self):
+        """关闭常驻shell会话、时钟同步和 Payload 后台监视"""
+        if self.device_trigger:
+            self.device_trigger.close()
+            self.device_trigger = None
+        if self.clock_estimator:
+            self.clock_estimator.close()
+            self.clock_estimator = None
+        if self.payload_watcher:
+            self.payload_watcher.stop()
+            self.payload_watcher = None
+        if self.link_monitor:
+            self.link_monitor.stop()
+            self.link_monitor = None
+        self.stop_screen_recording()
+
+    def check_link(self):
+        """链路已判定为断开时立即抛出 LinkDownError（不等待命令超时）"""
+        if self.link_monitor:
+            self.link_monitor.require_healthy()
+
+    def start_screen_recording(self):
+        """开始录制设备屏幕并等待第一帧到达（测量触发前调用），失败时只记录日志"""
+        if not self.screen_recording or not self.serial:
+            return None
+        name = self.name_provider() if self.name_provider else time.strftime("screen_%Y%m%d_%H%M%S")
+        path = os.path.join(self.video_target_dir, name + SCREEN_VIDEO_SUFFIX)
+        try:
+            if self.screen_recorder is None:
+                self.screen_recorder = ScreenRecorder(self.get_client(), self.serial, log=self.log)
+            recording = self.screen_recorder.start(path)
+        except (AdbError, OSError) as e:
+            self.log(f"⚠ 启动屏幕录制失败: {e}")
+            return None
+        if not self.screen_recorder.wait_first_frame(FIRST_FRAME_TIMEOUT):
+            self.log(f"⚠ {FIRST_FRAME_TIMEOUT:.0f} s 内未收到屏幕录制的第一帧，继续测量")
+        elif recording.error:
+            self.log(f"⚠ 屏幕录制失败: {recording.error}")
+        return recording
+
+    def stop_screen_recording(self):
+        """停止屏幕录制，返回 ScreenRecording（没有在录制时返回 None）"""
+        if self.screen_recorder is None:
+            return None
+        recorder = self.screen_recorder
+        self.screen_recorder = None
+        return recorder.stop()
+
+    def hold_payload_watcher(self):
+        """测量期间暂停 Payload 后台同步，避免与按键触发争用 adb 链路"""
+        if self.payload_watcher:
+            self.payload_watcher.hold()
+
+    def release_payload_watcher(self):
+        if self.payload_watcher:
+            self.payload_watcher.release()
+
+    # --- 摄像头 ---
+
+    def start_camera(self, camera_index):
+        """启动摄像头子进程，返回是否成功（不等待初始化，见 wait_camera_ready）"""
+        try:
+            if not os.path.exists(self.record_script):
+                self.log(f"错误: {self.record_script} 文件不存在")
+                return False
+
+            self.log("正在启动摄像头...")
+            python_executable = find_python_executable()
+            self.log("使用虚拟环境中的 Python" if python_executable == VENV_PYTHON else "使用系统 Python")
+            self.log(f"使用摄像头索引: {camera_index}")
+
+            self.camera_ready = False
+            self.frame_tap_name = None
+            self.camera_index = camera_index
+            # 传递摄像头索引，捕获输出（stderr 合并到 stdout，行缓冲）
+            command = [python_executable, self.record_script, str(camera_index)]
+            if self.video_dir:
+                command.append(self.video_dir)
+            self.record_process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                universal_newlines=True
+            )
+            threading.Thread(target=self._read_output, args=(self.record_process,), name="recorder-output",
+                             daemon=True).start()
+            self.log("摄像头进程已启动，等待初始化...")
+            return True
+
+        except Exception as e:
+            self.log(f"启动摄像头失败: {str(e)}")
+            return False
+
+    def wait_camera_ready(self, timeout=CAMERA_READY_TIMEOUT):
+        """阻塞等待摄像头初始化完成，返回是否就绪"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(0.1)
+            if self.camera_ready:
+                self.log("✓ 摄像头已就绪")
+                return True
+            # 检查进程是否还在运行
+            process = self.record_process
+            if process is None or process.poll() is not None:
+                self.log("✗ 摄像头进程异常退出")
+                return False
+        self.log("✗ 摄像头初始化超时")
+        return False
+
+    def check_camera(self):
+        """录制子进程已退出时清除摄像头状态，返回摄像头是否仍可用"""
+        process = self.record_process
+        if process is not None and process.poll() is not None:
+            if self.camera_ready:
+                self.log("录制完成，摄像头已关闭")
+            self.record_process = None
+            self.camera_ready = False
+            self.frame_tap_name = None
+        return self.camera_ready and self.record_process is not None
+
+    def stop_camera(self):
+        """让录制子进程退出（先发送 'q'，无响应时终止）"""
+        process = self.record_process
+        if not process:
+            return
+        try:
+            if process.stdin and not process.stdin.closed:
+                try:
+                    self.log("发送退出命令到录制进程...")
+                    process.stdin.write('q\n')
+                    process.stdin.flush()
+                    process.wait(timeout=3)
+                    self.log("✓ 录制进程已正常退出")
+                except subprocess.TimeoutExpired:
+                    self.log("进程未响应退出命令，尝试终止...")
+                except (BrokenPipeError, OSError):
+                    pass  # 管道已断开，直接终止进程
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=3)
+                    self.log("✓ 录制进程已终止")
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    self.log("✓ 录制进程已强制终止")
+        except Exception as e:
+            self.log(f"停止录制时发生错误: {str(e)}")
+        finally:
+            self.record_process = None
+            self.camera_ready = False
+            self.frame_tap_name = None
+
+    def _read_output(self, process):
+        """读取录制子进程输出（process 为启动时的进程引用，避免被外部修改影响）"""
+        if not process.stdout:
+            return
+        try:
+            for line in iter(process.stdout.readline, ''):
+                clean_line = line.rstrip('\n\r')
+                if clean_line:
+                    if not clean_line.startswith((METRICS_SIGNAL, TRACE_SIGNAL)):
+                        self.log(f"[录制] {clean_line}")
+                    self._handle_output_line(clean_line)
+                if process.poll() is not None:
+                    break
+        except Exception as e:
+            self.log(f"读取子进程输出时发生错误: {str(e)}")
+
+    def _handle_output_line(self, line):
+        if CAMERA_READY_SIGNAL in line:
+            self.camera_ready = True
+
+        if line.startswith(FRAME_TAP_SIGNAL):
+            self.frame_tap_name = line[len(FRAME_TAP_SIGNAL):].strip()
+
+        if line.startswith(METRICS_SIGNAL):
+            # 录制子进程的指标快照（采集帧率、丢帧、保存耗时等）并入本进程的注册表
+            try:
+                REGISTRY.absorb(json.loads(line[len(METRICS_SIGNAL):]))
+            except ValueError as e:
+                self.log(f"⚠ 录制进程指标解析失败: {e}")
+
+        if line.startswith(TRACE_SIGNAL):
+            # 录制子进程的追踪事件（首帧、末帧、编码等）并入本次测量的追踪
+            try:
+                self.trace.absorb(json.loads(line[len(TRACE_SIGNAL):]))
+            except ValueError as e:
+                self.log(f"⚠ 录制进程追踪事件解析失败: {e}")
+
+        # 录制子进程上报的触发接收/首帧时间（共享单调时钟）
+        if self.current_take is not None:
+            if line.startswith("收到触发时间:"):
+                take = self.trigger_coordinator.complete(self.current_take,
+                                                         camera_received=float(line.split(":", 1)[1]))
+                # 从开始写入 's' 到录制子进程读到命令
+                self.trace.add("recorder_wakeup", take.camera_start, take.camera_received, "recorder_wakeup")
+            elif line.startswith("首帧时间:"):
+                self.trigger_coordinator.complete(self.current_take,
+                                                  camera_first_frame=float(line.split(":", 1)[1]))
+
+        if SAVING_SIGNAL in line:
+            self.last_recorded_video = line.split(SAVING_SIGNAL)[-1].strip()
+
+        if SAVED_SIGNAL in line and self.last_recorded_video:
+            take = self.current_take
+            trace = self.trace
+            with trace.span("copy_recorded_video"):
+                take_video = self.copy_recorded_video()
+            with trace.span("write_take_metadata"):
+                self.write_take_metadata(take_video)
+            self.last_take_video = take_video
+            self._take_saved.set()
+            if self.on_take_saved:
+                with trace.span("on_take_saved"):
+                    self.on_take_saved(take_video, take)
+            self.write_trace(take_video or self.last_recorded_video, take, trace)
+
+    # --- 测量 ---
+
+    def send_record_command(self):
+        """向录制子进程发送 's' 命令（发送's'加换行符，因为子进程使用readline()）"""
+        process = self.record_process
+        if not process or not process.stdin:
+            raise RuntimeError("录制子进程未正常启动")
+        try:
+            process.stdin.write('s\n')
+            process.stdin.flush()
+        except BrokenPipeError:
+            raise RuntimeError("子进程管道已断开")
+
+    def begin_trace(self):
+        """开始记录新一次测量的延迟追踪（界面在按钮回调中调用，以便包含回调本身）"""
+        self.trace = Tracer(TRACE_PROCESS_NAME)
+        return self.trace
+
+    def measure(self, trace=None):
+        """同时向设备和录制子进程发送 's'，返回 TakeTrigger（录制随后在子进程中进行）
+
+        摄像头未就绪或录制命令发送失败时抛出 MeasurementError；用 wait_take_saved() 等待视频保存。
+        trace 为 begin_trace() 返回的追踪，None 时从这里开始新的追踪。
+        """
+        if trace is None:
+            trace = self.begin_trace()
+        self.trace = trace
+        if not self.camera_ready or not self.record_process:
+            raise MeasurementError("摄像头未就绪")
+        try:
+            self.check_link()
+        except LinkDownError as e:
+            raise MeasurementError(str(e))
+        self.hold_payload_watcher()
+        link_monitor = self.link_monitor
+        if link_monitor:
+            link_monitor.hold()
+        recording_started = False
+        measure_start = clock()
+        try:
+            # 触发前准备好设备的常驻shell会话
+            with trace.span("prepare_device_trigger"):
+                device_trigger = self.get_device_trigger()
+            self._take_saved.clear()
+            # 屏幕录制在触发前启动，第一帧到达后再触发，保证覆盖整个测量窗口
+            if self.screen_recording:
+                with trace.span("start_screen_recording"):
+                    self.start_screen_recording()
+
+            # 在共享单调时钟上同时向 Android 设备和录制子进程发送 's'
+            self.log("同时向 Android 设备和录制子进程发送 's' 命令...")
+            # 写入 's' 之前登记本次触发：录制子进程的"收到触发时间"早于设备一侧的 adb 往返结束
+            with trace.span("trigger"):
+                take = self.trigger_coordinator.fire(
+                    device_action=lambda: device_trigger.fire(timeout=10, trace=trace),
+                    camera_action=self.send_record_command,
+                    on_take=self._register_take)
+            trace.add("stdin_write", take.camera_start, take.camera_end, "camera",
+                      delay_ms=round(take.camera_delay * 1000.0, 3))
+            if take.camera_error is not None:
+                self.current_take = None
+                raise MeasurementError(f"发送录制命令失败: {take.camera_error}")
+            TAKES.inc()
+            self.log(f"✓ 录制命令已发送 (推迟 {take.camera_delay * 1000:.1f} ms)")
+
+            if take.device_error is None:
+                trigger_method, trigger_latency = take.device_result
+                TRIGGER_LATENCY_SECONDS.observe(trigger_latency / 1000.0, method=trigger_method)
+                self.log(f"✓ 成功向设备发送 's' 键 ({trigger_method}, {trigger_latency:.1f} ms, "
+                         f"推迟 {take.device_delay * 1000:.1f} ms)")
+                for line in device_trigger.stats.summary():
+                    self.log(f"  触发延迟 {line}")
+            else:
+                self.log(f"✗ 发送按键失败: {take.device_error}")
+
+            recording_started = True
+            self.log("录制已开始，等待完成...")
+            return take
+        finally:
+            trace.add("measure", measure_start, clock(), started=recording_started)
+            if link_monitor:
+                link_monitor.release()
+            if not recording_started:
+                self.stop_screen_recording()
+                self.release_payload_watcher()
+
+    def _register_take(self, take):
+        self.current_take = take
+
+    def wait_take_saved(self, timeout=TAKE_TIMEOUT):
+        """阻塞等待本次测量的视频保存并交接完成，返回 payloads 中的视频路径
+
+        超时或录制子进程提前退出时返回 None。
+        """
+        deadline = time.time() + timeout
+        while not self._take_saved.wait(0.2):
+            process = self.record_process
+            if time.time() >= deadline or process is None or process.poll() is not None:
+                # 子进程退出时最后几行可能仍在处理
+                return self.last_take_video if self._take_saved.wait(1.0) else None
+        return self.last_take_video
+
+    # --- 录制结果 ---
+
+    def copy_recorded_video(self):
+        """把录制的视频交接到payloads目录（方式见 video_handoff）"""
+        if not self.last_recorded_video or not os.path.exists(self.last_recorded_video):
+            self.log("错误: 找不到录制的视频文件")
+            return
+
+        try:
+            if not os.path.exists(self.video_target_dir):
+                os.makedirs(self.video_target_dir)
+                self.log(f"创建目录: {self.video_target_dir}")
+
+            name = self.name_provider() if self.name_provider else \
+                os.path.splitext(os.path.basename(self.last_recorded_video))[0]
+            target_path = os.path.join(self.video_target_dir, name + ".mp4")
+
+            # 按配置的交接方式放入目标目录（重命名/硬链接/克隆为零复制，复制在后台进行）
+            source_size = os.path.getsize(self.last_recorded_video)
+            result = handoff_file(self.last_recorded_video, target_path, self.video_handoff,
+                                  on_done=self.on_video_handoff_done)
+            if result.method == "copy":
+                self.log(f"视频正在后台复制到: {target_path} ({source_size:,} 字节)")
+
+            # 逐帧时间戳文件随视频一起交接，录制统计并入目标视频的元数据
+            frames_source = frame_times_path(self.last_recorded_video)
+            if os.path.exists(frames_source):
+                handoff_file(frames_source, frame_times_path(target_path), result.method)
+            recording = load_take_metadata(self.last_recorded_video).get('recording')
+            if recording:
+                update_take_metadata(target_path, 'recording', recording)
+            return target_path
+
+        except Exception as e:
+            self.log(f"✗ 复制视频文件失败: {str(e)}")
+
+    def on_video_handoff_done(self, result):
+        """视频交接完成（复制方式在后台线程中回调）"""
+        if result.error:
+            self.log(f"✗ 视频复制失败: {result.error}")
+            return
+        VIDEO_HANDOFF_SECONDS.observe(result.seconds, method=result.method)
+        VIDEO_HANDOFF_BYTES.inc(result.bytes, method=result.method)
+        method = f"{result.method}/{result.detail}" if result.detail else result.method
+        self.log(f"✓ 视频已放入: {result.target} ({method}, {result.seconds * 1000:.1f} ms, "
+                 f"{result.bytes:,} 字节{', 校验通过' if result.method == 'copy' else ''})")
+
+    def write_take_metadata(self, video_path):
+        """把本次测量的触发记录和时钟偏移写入视频旁的元数据文件，并登记到会话目录"""
+        take = self.current_take
+        self.current_take = None
+        video_path = video_path or self.last_recorded_video
+        try:
+            if take is not None:
+                metadata_path = update_take_metadata(video_path, 'trigger', take.to_dict())
+                if take.skew_ms is not None:
+                    TRIGGER_SKEW_MS.observe(take.skew_ms)
+                    self.log(f"触发偏差: 摄像头首帧相对设备按键 {take.skew_ms:+.1f} ms "
+                             f"(±{take.device_uncertainty_ms:.1f} ms)")
+                self.log(f"✓ 测量元数据已保存: {metadata_path}")
+        except Exception as e:
+            self.log(f"✗ 保存测量元数据失败: {str(e)}")
+
+        self.write_screen_metadata(video_path, take)
+        self.write_metrics_snapshot(video_path)
+        with self.trace.span("catalog_take"):
+            self.catalog_take(video_path, take)
+
+        # 本次测量结束，恢复 Payload 后台同步
+        self.release_payload_watcher()
+
+        # 录制结束后再采样一轮时钟（多次 adb 往返），在后台进行，不推迟 on_take_saved；
+        # 在本方法的其他元数据写入之后启动，避免并发改写同一个元数据文件
+        if self.clock_estimator:
+            threading.Thread(target=self.write_clock_metadata, args=(video_path, self.clock_estimator, self.trace),
+                             name="clock-sync", daemon=True).start()
+
+    def write_clock_metadata(self, video_path, clock_estimator, trace):
+        """采样一轮时钟，与连接时的样本一起估计偏移和漂移，写入元数据的 clock_sync 分节（后台线程）"""
+        try:
+            with trace.span("clock_sync_burst"):
+                clock_estimator.burst()
+            estimate = clock_estimator.estimate()
+            clock_info = estimate.to_dict()
+            clock_info['frame_times'] = os.path.basename(frame_times_path(video_path))
+            update_take_metadata(video_path, 'clock_sync', clock_info)
+            self.log(f"✓ 设备时钟偏移 {estimate.offset:+.6f} s, 漂移 {estimate.drift * 1e6:+.1f} ppm "
+                     f"(±{estimate.uncertainty * 1000:.1f} ms)")
+        except Exception as e:
+            self.log(f"⚠ 时钟同步采样失败: {str(e)}")
+
+    def write_screen_metadata(self, video_path, take):
+        """停止屏幕录制，把与摄像头视频的对齐信息写入元数据"""
+        recording = self.stop_screen_recording()
+        if recording is None:
+            return
+        if not recording.done_event.is_set():
+            # 读取线程仍在写入，帧数、时长和逐帧时间戳文件都不完整
+            self.log(f"✗ 屏幕录制未正常结束，未写入屏幕录制元数据: {recording.path}")
+            return
+        try:
+            camera_first_frame = take.camera_first_frame if take is not None else None
+            screen_info = recording.to_metadata(camera_first_frame)
+            update_take_metadata(video_path, 'screen_recording', screen_info)
+            if recording.error and not recording.frame_times:
+                self.log(f"✗ 屏幕录制失败: {recording.error}")
+            elif screen_info['start_offset_ms'] is not None:
+                self.log(f"✓ 屏幕录制已保存: {recording.path} ({screen_info['frames']} 帧, "
+                         f"首帧相对摄像头首帧 {screen_info['start_offset_ms']:+.1f} ms)")
+            else:
+                self.log(f"✓ 屏幕录制已保存: {recording.path} ({screen_info['frames']} 帧)")
+        except Exception as e:
+            self.log(f"✗ 保存屏幕录制元数据失败: {str(e)}")
+
+    def write_metrics_snapshot(self, video_path):
+        """在视频旁写入本进程（含录制子进程）指标的 JSON 快照"""
+        if not video_path:
+            return
+        try:
+            REGISTRY.write_snapshot(metrics_snapshot_path(video_path),
+                                    extra={'video': os.path.basename(video_path), 'serial': self.serial})
+        except Exception as e:
+            self.log(f"⚠ 保存指标快照失败: {str(e)}")
+
+    def write_trace(self, video_path, take, trace):
+        """在视频旁写入本次测量的延迟追踪 trace_<视频名>.json（Chrome / Perfetto 追踪格式）"""
+        if not video_path:
+            return
+        try:
+            trace.write(trace_path(video_path), metadata={
+                'video': os.path.basename(video_path),
+                'serial': self.serial,
+                'camera_index': self.camera_index,
+                'trigger': take.to_dict() if take is not None else None,
+            })
+        except Exception as e:
+            self.log(f"⚠ 保存延迟追踪失败: {str(e)}")
+
+    def catalog_take(self, video_path, take):
+        """把本次测量登记到会话目录"""
+        if not self.catalog or not video_path:
+            return
+        try:
+            metadata = load_take_metadata(video_path)
+            recording = metadata.get('recording', {})
+            source_video = self.last_recorded_video
+            size_path = video_path if os.path.exists(video_path) else source_video  # 后台复制可能尚未完成
+            record = dict(recording)
+            record.update({
+                'name': os.path.splitext(os.path.basename(video_path))[0],
+                'device_serial': self.serial,
+                'camera_index': self.camera_index,
+                'trigger_method': take.device_result[0] if take and take.device_result else None,
+                'trigger_skew_ms': take.skew_ms if take else None,
+                'video_path': os.path.abspath(video_path),
+                'video_size': os.path.getsize(size_path) if size_path and os.path.exists(size_path) else None,
+                'source_video': os.path.abspath(source_video) if source_video else None,
+                'metadata_path': os.path.abspath(take_metadata_path(video_path)),
+            })
+            self.last_session_id = self.catalog.add_session(record)
+            self.log(f"✓ 已登记到会话目录 (#{self.last_session_id})")
+        except Exception as e:
+            self.log(f"⚠ 登记会话目录失败: {str(e)}")
+
+    def on_payload_synced(self, result):
+        """一次 Payload 同步完成（手动同步或后台监视）：记录指标并关联到最近一次测量"""
+        PAYLOAD_SYNC_SECONDS.observe(result.seconds)
+        PAYLOAD_SYNC_BYTES.inc(result.bytes)
+        PAYLOAD_SYNC_FILES.inc(len(result.pulled))
+        self.attach_payload_files(result)
+
+    def attach_payload_files(self, result):
+        """把同步下来的 Payload 文件关联到最近一次测量"""
+        if not self.catalog or self.last_session_id is None or not result.pulled:
+            return
+        try:
+            self.catalog.add_payload_files(
+                self.last_session_id,
+                [(os.path.join(result.local_dir, *path.split("/")), result.sizes.get(path))
+                 for path in result.pulled])
+        except Exception as e:
+            self.log(f"⚠ 关联 Payload 文件失败: {str(e)}")
+
+    def sync_payloads(self, progress=None, on_busy=None):
+        """增量同步设备上的 Payload 目录，返回 (PayloadSync, SyncResult)；目录为空时结果为 None
+
+        与后台监视共用同一把清单锁，不会重复下载：后台同步正在进行时先调用 on_busy()，
+        再等待其完成；链路断开时立即抛出 LinkDownError。
+        """
+        self.check_link()
+        payload_sync = PayloadSync(self.get_client(), self.serial, local_root=self.payload_root,
+                                   log=self.log, method=self.payload_transfer_method)
+        remote_files = payload_sync.list_remote()
+        if not remote_files:
+            return payload_sync, None
+        result = payload_sync.sync(progress=progress, remote_files=remote_files, on_busy=on_busy)
+        self.on_payload_synced(result)
+        return payload_sync, result
+
+    # --- 清理 ---
+
+    def close(self):
+        """关闭设备会话和录制子进程（会话目录由创建者关闭）"""
+        self.close_device()
+        process = self.record_process
+        if process:
+            try:
+                if process.stdin and not process.stdin.closed:
+                    try:
+                        process.stdin.write('q\n')
+                        process.stdin.flush()
+                        process.wait(timeout=2)
+                    except Exception:
+                        pass
+                if process.poll() is None:
+                    process.terminate()
+                    try:
+                        process.wait(timeout=2)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+            except Exception:
+                pass
+            self.record_process = None
+            self.camera_ready = False
+            self.frame_tap_name = None
+
+
+def open_catalog(config_dir, log=print):
+    """打开配置目录下的录制会话目录，失败时返回 None"""
+    try:
+        return SessionCatalog(os.path.join(config_dir, "sessions.db"))
+    except Exception as e:
+        log(f"⚠ 打开会话目录失败: {str(e)}")
+        return None
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""测量流水线的性能指标
+
+原来只能从日志文字中了解各环节的耗时。这里提供一个与 Prometheus 兼容的指标注册表
+（计数器 / 仪表 / 直方图，带标签），界面进程和录制子进程共用同一套定义：
+
+- 界面进程（AndroidControlApp、批量测量）记录 adb 命令延迟、触发偏差、视频交接和 Payload 同步；
+- 录制子进程记录采集帧率、丢帧、帧缓冲占用和保存耗时，每次测量后把快照输出到标准输出，
+  主进程用 absorb() 并入自己的注册表；
+- MetricsServer 在 localhost 上提供 Prometheus 文本格式（/metrics）和 JSON（/metrics.json），
+  每次测量后还会在视频旁写入一份 JSON 快照（见 measurement_session）。
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+# 录制子进程输出中指标快照的信号
+METRICS_SIGNAL = "指标快照:"
+
+# Prometheus 端口（0 表示不启动）
+DEFAULT_METRICS_PORT = 9464
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 触发偏差分桶（毫秒，可为负）
+SKEW_BUCKETS_MS = (-50.0, -20.0, -10.0, -5.0, -2.0, -1.0, 0.0, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0)
+
+
+def _label_key(label_names, labels):
+    if set(labels) != set(label_names):
+        raise ValueError(f"标签应为 {label_names}，实际为 {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _series(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def snapshot(self):
+        return {
+            'type': self.kind,
+            'help': self.documentation,
+            'labels': list(self.label_names),
+            'series': [{'labels': dict(zip(self.label_names, key)), 'value': self._export(value)}
+                       for key, value in self._series()],
+        }
+
+    def absorb(self, snapshot):
+        """用另一个进程的快照替换对应标签的值（各进程的计数器是累计值）"""
+        with self._lock:
+            for series in snapshot.get('series', []):
+                key = _label_key(self.label_names, series['labels'])
+                self._values[key] = self._import(series['value'])
+
+    def _export(self, value):
+        return value
+
+    def _import(self, value):
+        return value
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(_label_key(self.label_names, labels), 0)
+
+    def expose(self):
+        for key, value in self._series():
+            yield f"{self.name}{_format_labels(zip(self.label_names, key))} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """可任意设置的当前值"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels):
+        return self._values.get(_label_key(self.label_names, labels))
+
+    def expose(self):
+        for key, value in self._series():
+            yield f"{self.name}{_format_labels(zip(self.label_names, key))} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """分桶统计（与 Prometheus 直方图一致，桶为累计计数）"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def time(self, **labels):
+        """上下文管理器：观测代码块的耗时（秒）"""
+        return _Timer(self, labels)
+
+    def _export(self, value):
+        cumulative = []
+        total = 0
+        for count in value['counts']:
+            total += count
+            cumulative.append(total)
+        return {'buckets': dict(zip([_format_value(b) for b in self.buckets] + ["+Inf"], cumulative)),
+                'sum': value['sum'], 'count': value['count']}
+
+    def _import(self, value):
+        counts = []
+        previous = 0
+        for bucket in [_format_value(b) for b in self.buckets] + ["+Inf"]:
+            cumulative = value['buckets'].get(bucket, previous)
+            counts.append(cumulative - previous)
+            previous = cumulative
+        return {'counts': counts, 'sum': value['sum'], 'count': value['count']}
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot['buckets'] = list(self.buckets)
+        return snapshot
+
+    def expose(self):
+        for key, value in self._series():
+            pairs = list(zip(self.label_names, key))
+            exported = self._export(value)
+            for bucket, count in exported['buckets'].items():
+                yield f"{self.name}_bucket{_format_labels(pairs + [('le', bucket)])} {count}"
+            yield f"{self.name}_sum{_format_labels(pairs)} {_format_value(exported['sum'])}"
+            yield f"{self.name}_count{_format_labels(pairs)} {exported['count']}"
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """指标注册表：同名指标只注册一次，重复注册返回已有的指标"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, label_names, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter, name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(Gauge, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self):
+        """JSON 快照：{指标名: {type, help, labels, series}}"""
+        return {metric.name: metric.snapshot() for metric in self.metrics()}
+
+    def absorb(self, snapshot):
+        """并入另一个进程（录制子进程）的快照"""
+        for name, data in snapshot.items():
+            kind = data.get('type')
+            if kind == "counter":
+                metric = self.counter(name, data.get('help', ''), data.get('labels', ()))
+            elif kind == "gauge":
+                metric = self.gauge(name, data.get('help', ''), data.get('labels', ()))
+            elif kind == "histogram":
+                metric = self.histogram(name, data.get('help', ''), data.get('labels', ()),
+                                        buckets=data.get('buckets', DEFAULT_BUCKETS))
+            else:
+                continue
+            metric.absorb(data)
+
+    def expose(self):
+        """Prometheus 文本格式"""
+        lines = []
+        for metric in sorted(self.metrics(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path, extra=None):
+        """把快照写入 JSON 文件（先写临时文件再替换）"""
+        data = dict(extra or {})
+        data['time'] = time.time()
+        data['metrics'] = self.snapshot()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+# 进程内共用的注册表
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    """在 localhost 上提供 /metrics（Prometheus 文本格式）和 /metrics.json"""
+
+    def __init__(self, registry=REGISTRY, port=DEFAULT_METRICS_PORT, host="127.0.0.1"):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """启动 HTTP 服务线程，端口被占用时抛出 OSError"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = registry.expose().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(registry.snapshot(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def start_metrics_server(port=DEFAULT_METRICS_PORT, log=print, registry=REGISTRY):
+    """启动指标服务，端口为 0 / None 或启动失败时返回 None（不影响测量）"""
+    if not port:
+        return None
+    try:
+        server = MetricsServer(registry, port=port).start()
+    except OSError as e:
+        log(f"⚠ 无法启动指标服务（端口 {port}）: {str(e)}")
+        return None
+    log(f"✓ 指标服务: {server.url}")
+    return server
+
+
+# --- 测量流水线的指标（界面进程和录制子进程共用同一套定义） ---
+
+# adb
+ADB_COMMAND_SECONDS = REGISTRY.histogram(
+    "adb_command_seconds", "adb 命令往返时间（秒），按命令类型", ("verb",))
+ADB_COMMAND_ERRORS = REGISTRY.counter(
+    "adb_command_errors_total", "adb 命令失败次数，按命令类型", ("verb",))
+
+# 触发
+TAKES = REGISTRY.counter("takes_total", "已触发的测量次数")
+TRIGGER_SKEW_MS = REGISTRY.histogram(
+    "trigger_skew_ms", "摄像头首帧相对设备按键生效时刻的偏差（毫秒）", buckets=SKEW_BUCKETS_MS)
+TRIGGER_LATENCY_SECONDS = REGISTRY.histogram(
+    "trigger_latency_seconds", "设备按键注入延迟（秒），按触发方式", ("method",))
+
+# 录制子进程
+CAPTURE_FPS = REGISTRY.gauge("recorder_capture_fps", "最近一次录制的平均采集帧率")
+CAPTURED_FRAMES = REGISTRY.counter("recorder_frames_total", "录制的帧数")
+DROPPED_FRAMES = REGISTRY.counter("recorder_dropped_frames_total", "录制时读取失败的帧数")
+BUFFER_FRAMES = REGISTRY.gauge("recorder_buffer_frames", "最近一次录制结束时内存帧缓冲中的帧数")
+BUFFER_BYTES = REGISTRY.gauge("recorder_buffer_bytes", "最近一次录制结束时内存帧缓冲占用的字节数")
+SAVE_SECONDS = REGISTRY.histogram("recorder_save_seconds", "编码并保存视频的时间（秒）")
+
+# 视频交接和 Payload 同步
+VIDEO_HANDOFF_SECONDS = REGISTRY.histogram(
+    "video_handoff_seconds", "录制视频交接到 payloads 的时间（秒），按交接方式", ("method",))
+VIDEO_HANDOFF_BYTES = REGISTRY.counter("video_handoff_bytes_total", "交接的视频字节数", ("method",))
+PAYLOAD_SYNC_SECONDS = REGISTRY.histogram("payload_sync_seconds", "一次 Payload 同步的时间（秒）")
+PAYLOAD_SYNC_BYTES = REGISTRY.counter("payload_sync_bytes_total", "Payload 同步下载的字节数")
+PAYLOAD_SYNC_FILES = REGISTRY.counter("payload_sync_files_total", "Payload 同步下载的文件数")
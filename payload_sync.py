@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""Payload 增量同步
+
+原来每次点击“获取 Payload”都会把 /sdcard/Download/MagicMirror/ 整个目录重新 adb pull 一遍，
+并且固定 30 秒超时；通过 Wi-Fi adb 传输时目录一大就会超时。
+
+PayloadSync 用一次 shell 调用（find + stat）列出远程文件的大小和修改时间，与本地清单比较，
+只拉取新增或变化的文件；超时按传输字节数计算，并通过回调报告进度和吞吐量。
+
+文件较多时逐个 sync 拉取的每文件开销占主导，此时改用 `exec-out tar -c` 把选中的文件
+打成一个流，用 tarfile 的流模式（r|）边接收边解包，不落地临时归档；设备上没有 tar
+或流中断时退回逐个文件拉取。
+"""
+import json
+import os
+import shlex
+import stat
+import tarfile
+import threading
+import time
+
+from adb_client import AdbError
+
+REMOTE_PAYLOAD_DIR = "/sdcard/Download/MagicMirror"
+LOCAL_PAYLOAD_ROOT = "payloads"
+MANIFEST_NAME = ".payload_manifest.json"
+
+# 超时 = 基础超时 + 字节数 / 最低可接受吞吐量
+BASE_TIMEOUT = 10.0
+MIN_THROUGHPUT = 256 * 1024  # 字节/秒
+
+# 进度回调的最小间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+# 传输方式：auto（文件数达到 TAR_MIN_FILES 且设备有 tar 时用 tar）/ tar / pull
+TRANSFER_METHODS = ("auto", "tar", "pull")
+TAR_MIN_FILES = 8
+
+# 单条 tar 命令的最大长度：旧版 adbd 的服务请求上限为 4KB，支持 shell_v2 的设备为 256KB 以上
+TAR_COMMAND_MAX_V1 = 4000
+TAR_COMMAND_MAX = 32 * 1024
+
+# 同一本地清单同时只允许一个同步（手动获取与后台监视共用）
+_manifest_locks = {}
+_manifest_locks_guard = threading.Lock()
+
+
+def manifest_lock(manifest_path):
+    key = os.path.abspath(manifest_path)
+    with _manifest_locks_guard:
+        return _manifest_locks.setdefault(key, threading.Lock())
+
+
+class SyncInterrupted(Exception):
+    """由 throttle 回调抛出以中止同步并释放清单锁（已下载的文件保留在清单中）"""
+
+
+class RemoteFile:
+    """远程文件条目（相对路径使用 / 分隔）"""
+
+    def __init__(self, path, size, mtime):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+
+class SyncResult:
+    """一次同步的结果"""
+
+    def __init__(self):
+        self.pulled = []  # 已拉取的相对路径
+        self.sizes = {}  # 相对路径 -> 字节数
+        self.local_dir = None
+        self.skipped = 0  # 未变化而跳过的文件数
+        self.failed = []  # (相对路径, 错误信息)
+        self.bytes = 0
+        self.seconds = 0.0
+        self.method = None  # 实际使用的传输方式
+
+    @property
+    def throughput(self):
+        """平均吞吐量（字节/秒）"""
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+
+def transfer_timeout(byte_count, base=BASE_TIMEOUT, min_throughput=MIN_THROUGHPUT):
+    """按传输字节数计算超时（秒）"""
+    return base + byte_count / float(min_throughput)
+
+
+def format_bytes(byte_count):
+    """把字节数格式化为易读的单位"""
+    value = float(byte_count)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.1f} {unit}" if unit != "B" else f"{int(value)} B"
+        value /= 1024
+
+
+def safe_member_path(name):
+    """把 tar 成员名规范为相对路径，越出目录的名字返回 None"""
+    path = name.replace("\\", "/")
+    while path.startswith("./"):
+        path = path[2:]
+    parts = [part for part in path.split("/") if part not in ("", ".")]
+    if not parts or path.startswith("/") or ".." in parts:
+        return None
+    return "/".join(parts)
+
+
+def parse_stat_listing(output):
+    """解析 `stat -c '%s %Y %n'` 的输出，返回 {相对路径: RemoteFile}"""
+    files = {}
+    for line in output.splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) != 3:
+            continue
+        try:
+            size, mtime = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        path = parts[2]
+        if path.startswith("./"):
+            path = path[2:]
+        files[path] = RemoteFile(path, size, mtime)
+    return files
+
+
+class PayloadSync:
+    """把设备上的 Payload 目录增量同步到本地"""
+
+    def __init__(self, client, serial=None, remote_dir=REMOTE_PAYLOAD_DIR,
+                 local_root=LOCAL_PAYLOAD_ROOT, log=print, method="auto"):
+        self.client = client
+        self.serial = serial
+        self.remote_dir = remote_dir.rstrip("/")
+        self.local_dir = os.path.join(local_root, os.path.basename(self.remote_dir))
+        self.manifest_path = os.path.join(local_root, MANIFEST_NAME)
+        self.log = log
+        self.method = method if method in TRANSFER_METHODS else "auto"
+        self._has_tar = None
+
+    # --- 清单 ---
+
+    def load_manifest(self):
+        """读取本地清单 {相对路径: {'size', 'mtime'}}"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('remote_dir') == self.remote_dir:
+                return manifest.get('files', {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def save_manifest(self, files):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'remote_dir': self.remote_dir, 'files': files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    # --- 远程列表 ---
+
+    def list_remote(self):
+        """一次 shell 调用列出远程文件，返回 {相对路径: RemoteFile}"""
+        command = f"cd '{self.remote_dir}' && find . -type f -exec stat -c '%s %Y %n' {{}} +"
+        result = self.client.shell(self.serial, command, timeout=BASE_TIMEOUT)
+        if result.returncode == 0:
+            return parse_stat_listing(result.stdout)
+        if "No such file" in result.stdout + result.stderr or "can't cd" in result.stdout + result.stderr:
+            raise AdbError(f"设备上不存在目录 {self.remote_dir}")
+        # 旧设备的 find/stat 不支持上述参数时，退回 sync 协议逐目录列出
+        return self.list_remote_sync()
+
+    def list_remote_sync(self):
+        files = {}
+        with self.client.sync(self.serial, BASE_TIMEOUT) as sync:
+            pending = [""]
+            while pending:
+                relative = pending.pop()
+                remote = f"{self.remote_dir}/{relative}" if relative else self.remote_dir
+                for name, mode, size, mtime in sync.list(remote):
+                    path = f"{relative}/{name}" if relative else name
+                    if stat.S_ISDIR(mode):
+                        pending.append(path)
+                    elif stat.S_ISREG(mode):
+                        files[path] = RemoteFile(path, size, mtime)
+        return files
+
+    # --- 同步 ---
+
+    def local_path(self, relative_path):
+        return os.path.join(self.local_dir, *relative_path.split("/"))
+
+    def plan(self, remote_files, manifest):
+        """返回需要拉取的 RemoteFile 列表（新增、大小/时间变化或本地缺失）"""
+        changed = []
+        for path, remote in sorted(remote_files.items()):
+            entry = manifest.get(path)
+            local_path = self.local_path(path)
+            if (entry and entry['size'] == remote.size and entry['mtime'] == remote.mtime
+                    and os.path.isfile(local_path) and os.path.getsize(local_path) == remote.size):
+                continue
+            changed.append(remote)
+        return changed
+
+    def has_tar(self):
+        """设备上是否有可用的 tar（结果缓存）"""
+        if self._has_tar is None:
+            result = self.client.shell(self.serial, "command -v tar", timeout=BASE_TIMEOUT)
+            self._has_tar = result.returncode == 0 and bool(result.stdout.strip())
+        return self._has_tar
+
+    def choose_method(self, changed):
+        if self.method == "pull":
+            return "pull"
+        if self.method == "auto" and len(changed) < TAR_MIN_FILES:
+            return "pull"
+        if not self.has_tar():
+            self.log("设备上没有 tar，改为逐个文件下载")
+            return "pull"
+        return "tar"
+
+    def tar_batches(self, changed, whole_directory):
+        """把待拉取文件分成若干条不超过命令长度上限的 tar 命令，返回 [(命令, 文件列表)]"""
+        prefix = f"cd {shlex.quote(self.remote_dir)} && tar -cf -"
+        suffix = " 2>/dev/null"  # exec: 不区分 stderr，错误输出会混入归档流
+        if whole_directory:
+            return [(f"{prefix} .{suffix}", list(changed))]
+        limit = TAR_COMMAND_MAX if "shell_v2" in self.client.features(self.serial) else TAR_COMMAND_MAX_V1
+        batches = []
+        command, files = prefix, []
+        for remote in changed:
+            argument = " " + shlex.quote("./" + remote.path)
+            if files and len(command) + len(argument) + len(suffix) > limit:
+                batches.append((command + suffix, files))
+                command, files = prefix, []
+            command += argument
+            files.append(remote)
+        if files:
+            batches.append((command + suffix, files))
+        return batches
+
+    def extract_member(self, stream, member, on_chunk):
+        """把 tar 成员写入本地（先写临时文件再原子替换），返回相对路径；跳过的成员返回 None"""
+        path = safe_member_path(member.name)
+        if path is None or not member.isfile():
+            return None
+        local_path = self.local_path(path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = local_path + ".part"
+        source = stream.extractfile(member)
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: source.read(256 * 1024), b""):
+                    f.write(chunk)
+                    on_chunk(len(chunk))
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        os.utime(local_path, (member.mtime, member.mtime))
+        return path
+
+    def pull_tar(self, changed, whole_directory, manifest, result, on_chunk):
+        """用 tar 流批量拉取，返回流中没有收到的 RemoteFile 列表"""
+        received = set()
+        for command, files in self.tar_batches(changed, whole_directory):
+            batch_bytes = sum(f.size for f in files)
+            conn = self.client.exec_out(self.serial, command, timeout=transfer_timeout(batch_bytes))
+            try:
+                with tarfile.open(fileobj=conn, mode="r|") as stream:
+                    for member in stream:
+                        path = self.extract_member(stream, member, on_chunk)
+                        if path is None:
+                            continue
+                        manifest[path] = {'size': member.size, 'mtime': int(member.mtime)}
+                        received.add(path)
+                        result.pulled.append(path)
+                        result.sizes[path] = member.size
+                        result.bytes += member.size
+            finally:
+                conn.close()
+        return [f for f in changed if f.path not in received]
+
+    def pull_files(self, files, manifest, result, on_chunk):
+        """逐个文件用 sync 协议拉取"""
+        for index, remote in enumerate(files):
+            local_path = self.local_path(remote.path)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            try:
+                with self.client.sync(self.serial, transfer_timeout(remote.size)) as sync:
+                    sync.pull(f"{self.remote_dir}/{remote.path}", local_path, on_chunk, remote.mtime)
+            except AdbError as e:
+                result.failed.append((remote.path, str(e)))
+                continue
+            manifest[remote.path] = {'size': remote.size, 'mtime': remote.mtime}
+            result.pulled.append(remote.path)
+            result.sizes[remote.path] = remote.size
+            result.bytes += remote.size
+            if index % 50 == 49:
+                self.save_manifest(manifest)  # 大批量同步中途定期保存，中断后可继续
+
+    def sync(self, progress=None, remote_files=None, only=None, throttle=None, on_busy=None):
+        """执行增量同步，返回 SyncResult
+
+        progress(done_bytes, total_bytes, done_files, total_files, throughput) 至多每
+        PROGRESS_INTERVAL 秒调用一次；only 为相对路径集合时只同步其中变化的文件；
+        throttle(length) 在每个数据块之后调用，可用于限速，抛出 SyncInterrupted 时中止同步。
+        清单锁被另一个同步占用时先调用 on_busy()，再等待其完成。
+        """
+        lock = manifest_lock(self.manifest_path)
+        if not lock.acquire(blocking=False):
+            if on_busy:
+                on_busy()
+            lock.acquire()
+        try:
+            return self._sync(progress, remote_files, only, throttle)
+        finally:
+            lock.release()
+
+    def _sync(self, progress, remote_files, only, throttle):
+        result = SyncResult()
+        result.local_dir = self.local_dir
+        start = time.perf_counter()
+        if remote_files is None:
+            remote_files = self.list_remote()
+        manifest = self.load_manifest()
+        changed = self.plan(remote_files, manifest)
+        result.skipped = len(remote_files) - len(changed)
+        if only is not None:
+            changed = [f for f in changed if f.path in only]
+        total_bytes = sum(f.size for f in changed)
+        if not changed:
+            result.seconds = time.perf_counter() - start
+            return result
+
+        result.method = self.choose_method(changed)
+        self.log(f"需要同步 {len(changed)} 个文件 ({format_bytes(total_bytes)})，"
+                 f"{result.skipped} 个未变化已跳过，传输方式: {result.method}")
+        state = {'done': 0, 'last_report': 0.0}
+
+        def on_chunk(length):
+            if throttle:
+                throttle(length)
+            state['done'] += length
+            now = time.perf_counter()
+            if progress and now - state['last_report'] >= PROGRESS_INTERVAL:
+                state['last_report'] = now
+                elapsed = now - start
+                progress(state['done'], total_bytes, len(result.pulled), len(changed),
+                         state['done'] / elapsed if elapsed > 0 else 0.0)
+
+        remaining = changed
+        try:
+            if result.method == "tar":
+                try:
+                    # 本地没有任何文件时直接打包整个目录，省去逐个列出文件名
+                    remaining = self.pull_tar(changed, only is None and len(changed) == len(remote_files),
+                                              manifest, result, on_chunk)
+                except (AdbError, tarfile.TarError) as e:
+                    self.log(f"tar 流传输中断 ({e})，剩余文件改为逐个下载")
+                    pulled = set(result.pulled)
+                    remaining = [f for f in changed if f.path not in pulled]
+                if remaining:
+                    result.method = "tar+pull"
+                self.save_manifest(manifest)
+            self.pull_files(remaining, manifest, result, on_chunk)
+        finally:
+            # 中止（SyncInterrupted）时也保存已下载的文件，下次只传剩余部分
+            self.save_manifest(manifest)
+        result.seconds = time.perf_counter() - start
+        if progress:
+            progress(state['done'], total_bytes, len(result.pulled), len(changed), result.throughput)
+        return result
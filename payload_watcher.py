@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""Payload 后台监视
+
+每次测量后都要手动点击“获取 Payload”，而且拉取要等到那时才开始。PayloadWatcher 在设备
+连接期间于后台监视 MagicMirror 目录：设备上有 inotifyd 时订阅“写入后关闭/移入”事件，
+否则按自适应间隔轮询一次廉价的目录列表（连续两次大小和时间不变才视为写完），
+发现新文件后立即增量同步，摄像头保存完成时 Payload 通常已在本地。
+
+测量触发期间调用 hold() 暂停监视，并中止正在进行的传输（释放清单锁，手动获取不会被挡住），
+恢复后从未完成的文件继续；传输限速，避免与按键触发争用 adb 链路。
+"""
+import shlex
+import threading
+import time
+
+from adb_client import AdbError, AdbTimeoutError
+from payload_sync import PayloadSync, SyncInterrupted, LOCAL_PAYLOAD_ROOT, format_bytes
+
+# 轮询间隔（秒）：有变化时回到最小值，空闲时逐步放大到最大值
+POLL_MIN_INTERVAL = 1.0
+POLL_MAX_INTERVAL = 15.0
+POLL_BACKOFF = 1.5
+
+# 后台传输限速（字节/秒）
+DEFAULT_MAX_RATE = 4 * 1024 * 1024
+
+# hold() 的最长暂停时间（秒），防止录制异常时监视永远不恢复
+MAX_HOLD_TIME = 120.0
+
+# inotifyd 事件：w 写入后关闭，y 移入，n 新建（可能是子目录）
+INOTIFY_MASK = "wyn"
+
+
+def parse_inotifyd_line(line):
+    """解析 `inotifyd -` 的输出行（事件\\t被监视路径[\\t文件名]），返回 (事件, 完整路径)"""
+    parts = line.rstrip("\r\n").split("\t")
+    if len(parts) < 2 or not parts[0]:
+        return None
+    path = parts[1].rstrip("/")
+    if len(parts) > 2 and parts[2]:
+        path = f"{path}/{parts[2]}"
+    return parts[0][0], path
+
+
+class PayloadWatcher:
+    """在后台监视设备上的 Payload 目录并自动增量同步"""
+
+    def __init__(self, client, serial=None, log=print, method="auto", max_rate=DEFAULT_MAX_RATE,
+                 on_synced=None, local_root=LOCAL_PAYLOAD_ROOT):
+        self.client = client
+        self.serial = serial
+        self.log = log
+        self.on_synced = on_synced  # on_synced(SyncResult)，每次自动同步后调用
+        self.payload_sync = PayloadSync(client, serial, local_root=local_root, log=log, method=method)
+        self.max_rate = max_rate
+        self.mode = None  # inotifyd / poll
+        self.thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._hold_until = 0.0
+        self._closed_paths = set()  # inotifyd 报告已写完的相对路径
+        self._pending = {}  # 上次列表中尚未同步的文件 -> (大小, 修改时间)
+        self._watched_dirs = None
+        self._rescan_dirs = False
+        self._inotify_conn = None
+        self._bucket_time = time.perf_counter()
+        self._bucket_bytes = 0.0
+
+    # --- 生命周期 ---
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._close_inotify()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+        self.thread = None
+
+    # --- 暂停 ---
+
+    def hold(self, timeout=MAX_HOLD_TIME):
+        """暂停监视和传输（测量触发前调用）"""
+        with self._lock:
+            self._hold_until = time.perf_counter() + timeout
+
+    def release(self):
+        """恢复监视并立即检查一次（设备通常刚写完 Payload）"""
+        with self._lock:
+            self._hold_until = 0.0
+        self._wake.set()
+
+    @property
+    def held(self):
+        return time.perf_counter() < self._hold_until
+
+    def _throttle(self, length):
+        """传输限速；暂停或停止时中止正在进行的传输
+
+        不能在这里等待暂停结束：同步期间持有清单锁，等待会让手动获取 Payload 一起阻塞。
+        """
+        if self.held or self._stop.is_set():
+            raise SyncInterrupted("Payload 后台同步已暂停")
+        if not self.max_rate:
+            return
+        now = time.perf_counter()
+        # 令牌桶：最多积攒 0.5 秒的配额
+        self._bucket_bytes = max(0.0, self._bucket_bytes - (now - self._bucket_time) * self.max_rate)
+        self._bucket_time = now
+        self._bucket_bytes += length
+        excess = self._bucket_bytes - self.max_rate * 0.5
+        if excess > 0:
+            time.sleep(excess / self.max_rate)
+
+    # --- inotifyd ---
+
+    def _relative(self, remote_path):
+        root = self.payload_sync.remote_dir + "/"
+        return remote_path[len(root):] if remote_path.startswith(root) else None
+
+    def _list_directories(self):
+        command = f"find {shlex.quote(self.payload_sync.remote_dir)} -type d"
+        result = self.client.shell(self.serial, command, timeout=10)
+        if result.returncode != 0:
+            raise AdbError(f"无法列出目录: {result.stderr.strip() or result.stdout.strip()}")
+        return sorted(line.rstrip("/") for line in result.stdout.splitlines() if line.strip())
+
+    def _start_inotify(self):
+        """按当前子目录列表（重新）启动 inotifyd 事件流"""
+        directories = self._list_directories()
+        self._rescan_dirs = False
+        if directories == self._watched_dirs and self._inotify_conn is not None:
+            return
+        self._close_inotify()
+        watches = " ".join(shlex.quote(f"{d}:{INOTIFY_MASK}") for d in directories)
+        conn = self.client.exec_out(self.serial, f"inotifyd - {watches}", timeout=1.0)
+        self._inotify_conn = conn
+        self._watched_dirs = directories
+        threading.Thread(target=self._read_inotify, args=(conn,), daemon=True).start()
+
+    def _close_inotify(self):
+        conn = self._inotify_conn
+        self._inotify_conn = None
+        if conn is not None:
+            conn.close()
+
+    def _read_inotify(self, conn):
+        buffer = b""
+        while not self._stop.is_set() and conn is self._inotify_conn:
+            try:
+                chunk = conn.recv()
+            except AdbTimeoutError:
+                continue
+            if not chunk:
+                break
+            buffer += chunk
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                event = parse_inotifyd_line(line.decode("utf-8", errors="replace"))
+                if event is None:
+                    continue
+                kind, path = event
+                if kind == "n":
+                    self._rescan_dirs = True
+                relative = self._relative(path)
+                if relative and kind in "wy":
+                    with self._lock:
+                        self._closed_paths.add(relative)
+                self._wake.set()
+        if conn is self._inotify_conn and not self._stop.is_set():
+            # 事件流意外结束（设备断开或 inotifyd 退出），下一轮检查时重启或改为轮询
+            self._inotify_conn = None
+            self._wake.set()
+
+    def _has_inotifyd(self):
+        try:
+            result = self.client.shell(self.serial, "command -v inotifyd", timeout=10)
+        except AdbError:
+            return False
+        return result.returncode == 0 and bool(result.stdout.strip())
+
+    # --- 主循环 ---
+
+    def check(self):
+        """列出远程目录并同步已写完的新文件，返回是否仍有未同步的变化"""
+        remote_files = self.payload_sync.list_remote()
+        changed = self.payload_sync.plan(remote_files, self.payload_sync.load_manifest())
+        with self._lock:
+            closed, self._closed_paths = self._closed_paths, set()
+        # inotifyd 报告已关闭的文件立即同步；其余文件在两次列表间保持不变才视为写完
+        ready = {f.path for f in changed
+                 if f.path in closed or self._pending.get(f.path) == (f.size, f.mtime)}
+        self._pending = {f.path: (f.size, f.mtime) for f in changed if f.path not in ready}
+        if ready:
+            try:
+                result = self.payload_sync.sync(remote_files=remote_files, only=ready, throttle=self._throttle)
+            except SyncInterrupted:
+                # 暂停结束后立即重试这些文件（已下载的部分已记入清单）
+                with self._lock:
+                    self._closed_paths |= ready
+                return True
+            if result.pulled:
+                self.log(f"✓ 自动同步 Payload: {len(result.pulled)} 个文件 ({format_bytes(result.bytes)}), "
+                         f"用时 {result.seconds:.1f}s")
+            for path, error in result.failed:
+                self.log(f"✗ 自动同步失败: {path}: {error}")
+            if self.on_synced:
+                self.on_synced(result)
+        return bool(changed)
+
+    def run(self):
+        self.mode = "inotifyd" if self._has_inotifyd() else "poll"
+        self.log(f"Payload 后台监视已启动 ({self.mode})")
+        interval = POLL_MIN_INTERVAL
+        failures = 0
+        local_failures = 0  # 本地写入失败（磁盘已满、清单无法保存等）
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if self.held:
+                interval = min(0.2, max(0.0, self._hold_until - time.perf_counter()))
+                continue
+            try:
+                if self.mode == "inotifyd" and (self._inotify_conn is None or self._rescan_dirs):
+                    self._start_inotify()
+                busy = self.check()
+                failures = 0
+                local_failures = 0
+            except AdbError as e:
+                failures += 1
+                if failures == 1:
+                    self.log(f"⚠ Payload 后台监视出错: {e}")
+                if self.mode == "inotifyd" and failures >= 3:
+                    self.log("inotifyd 不可用，Payload 后台监视改为轮询")
+                    self._close_inotify()
+                    self.mode = "poll"
+                interval = POLL_MAX_INTERVAL
+                continue
+            except Exception as e:
+                # 本地错误不能让监视线程静默退出，按最长间隔重试
+                local_failures += 1
+                if local_failures == 1:
+                    self.log(f"✗ Payload 后台同步失败: {e}，{POLL_MAX_INTERVAL:.0f} s 后重试")
+                interval = POLL_MAX_INTERVAL
+                continue
+            if busy:
+                interval = POLL_MIN_INTERVAL
+            elif self.mode == "inotifyd":
+                interval = POLL_MAX_INTERVAL  # 事件驱动，轮询只是兜底
+            else:
+                interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+        self._close_inotify()
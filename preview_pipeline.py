@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""摄像头预览流水线
+
+原来的预览线程在后台线程中直接调用 preview_label.config(image=...)（Tk 不支持跨线程操作控件），
+每帧先对整幅画面做颜色转换再缩放、每帧新建一个 PhotoImage，并固定 sleep(1/30)。现在：
+
+- 采集线程只把最新一帧放入单槽缓冲区 FrameSlot，界面来不及显示的旧帧直接丢弃；
+- Tk 主线程用 after() 定时从槽中取帧，先缩放再转换颜色（只处理要显示的帧、像素最少），
+  PreviewRenderer 复用同一个 PhotoImage，用 paste() 更新内容；
+- FpsMeter 统计实际显示帧率和采集帧率，显示在预览下方。
+"""
+import threading
+import time
+
+from lazy_import import lazy_module
+
+cv2 = lazy_module('cv2')
+Image = lazy_module('PIL.Image')
+ImageTk = lazy_module('PIL.ImageTk')
+
+# 预览显示区域（像素）
+PREVIEW_MAX_SIZE = (400, 300)
+
+# Tk 主线程取帧的间隔（毫秒）
+PREVIEW_POLL_MS = 15
+
+# 帧率统计窗口（秒）
+FPS_WINDOW = 1.0
+
+
+def fit_size(width, height, max_width, max_height):
+    """保持纵横比缩放到显示区域内的尺寸"""
+    scale = min(max_width / width, max_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+class FrameSlot:
+    """单槽帧缓冲区：发布方覆盖旧帧，读取方只拿到最新一帧"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame = None
+        self._sequence = 0  # 已发布的帧数
+        self._taken = 0  # 读取方最后取走的帧序号
+        self.dropped = 0  # 未被显示就被覆盖的帧数
+
+    def publish(self, frame):
+        with self._lock:
+            if self._frame is not None and self._taken < self._sequence:
+                self.dropped += 1
+            self._frame = frame
+            self._sequence += 1
+
+    def take(self):
+        """取出尚未取过的最新一帧，没有新帧时返回 None"""
+        with self._lock:
+            if self._taken == self._sequence:
+                return None
+            self._taken = self._sequence
+            frame = self._frame
+            self._frame = None
+            return frame
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def clear(self):
+        with self._lock:
+            self._frame = None
+            self._taken = self._sequence
+
+
+class FpsMeter:
+    """按固定时间窗口统计帧率"""
+
+    def __init__(self, window=FPS_WINDOW):
+        self.window = window
+        self.fps = None
+        self._count = 0
+        self._start = None
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        if self._start is None:
+            self._start = now
+            return self.fps
+        self._count += 1
+        elapsed = now - self._start
+        if elapsed >= self.window:
+            self.fps = self._count / elapsed
+            self._count = 0
+            self._start = now
+        return self.fps
+
+    def reset(self):
+        self.fps = None
+        self._count = 0
+        self._start = None
+
+
+class PreviewRenderer:
+    """在 Tk 主线程中把 BGR 帧显示到 Label 上（复用同一个 PhotoImage）"""
+
+    def __init__(self, label, max_size=PREVIEW_MAX_SIZE):
+        self.label = label
+        self.max_size = max_size
+        self.photo = None
+        self.fps = FpsMeter()
+
+    def render(self, frame):
+        """缩放、转换颜色并显示一帧（只能在 Tk 主线程中调用）"""
+        height, width = frame.shape[:2]
+        size = fit_size(width, height, *self.max_size)
+        if (width, height) != size:
+            # 先缩小再转换颜色，转换的像素数最少
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if self.photo is None or (self.photo.width(), self.photo.height()) != size:
+            self.photo = ImageTk.PhotoImage(image)
+            self.label.config(image=self.photo, text="")
+            self.label.image = self.photo  # 保持引用
+        else:
+            self.photo.paste(image)
+        self.fps.tick()
+
+    def reset(self):
+        self.photo = None
+        self.fps.reset()
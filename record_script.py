@@ -1,9 +1,21 @@
 # -*- coding: utf-8 -*-
-import cv2
 import time
 import datetime
+import json
 import os
 import sys
+from lazy_import import lazy_module
+from take_metadata import write_frame_times, update_take_metadata
+from frame_tap import FrameTapWriter, FRAME_TAP_SIGNAL
+from metrics import (REGISTRY, METRICS_SIGNAL, CAPTURE_FPS, CAPTURED_FRAMES, DROPPED_FRAMES, BUFFER_FRAMES,
+                     BUFFER_BYTES, SAVE_SECONDS)
+from tracing import Tracer, TRACE_SIGNAL
+
+# OpenCV 在解析完命令行参数、真正打开摄像头时才导入
+cv2 = lazy_module('cv2')
+
+# 与主程序共享的单调时钟（系统范围，跨进程可比较）
+clock = time.perf_counter
 
 # --- 配置参数 ---
 FRAME_WIDTH = 640
@@ -12,16 +24,33 @@ FPS = 240
 RECORD_SECONDS = 31
 OUTPUT_DIR = "videos"
 
+# 每次测量的延迟追踪，视频保存后输出给主程序（见 tracing）
+TRACER = Tracer("录制子进程")
+
 # 曝光参数（根据相机调试可调整）
 AUTO_EXPOSURE_MODE = 0.75   # 0.25=自动，0.75=手动
 EXPOSURE_VALUE = -8         # 曝光锁定值（不同摄像头范围不同）
 
 # --- 录制函数 ---
-def record_video(cap, actual_fps, actual_width, actual_height):
-    """录制视频并保存到文件"""
+def report_metrics():
+    """把本进程的指标快照输出给主程序（主程序并入自己的注册表）"""
+    print(f"{METRICS_SIGNAL} {json.dumps(REGISTRY.snapshot(), ensure_ascii=False)}", flush=True)
+
+def report_trace():
+    """把本次测量的追踪事件输出给主程序（主程序并入本次测量的追踪文件）"""
+    print(f"{TRACE_SIGNAL} {json.dumps(TRACER.drain(), ensure_ascii=False)}", flush=True)
+
+def record_video(cap, actual_fps, actual_width, actual_height, tap=None, received_time=None):
+    """录制视频并保存到文件（tap 为 FrameTapWriter 时同时向界面预览分流缩小的画面）
+
+    received_time 为收到 's' 命令的共享时钟时间，用于追踪从唤醒到首帧的耗时。
+    """
     print(f"开始录制 {RECORD_SECONDS} 秒视频...", flush=True)
 
     frames_buffer = []
+    frame_times = []  # 每帧的共享时钟时间戳，用于把设备时间映射到帧号
+    first_frame_time = None
+    dropped_frames = 0
     start_time = time.time()
 
     num_frames_to_capture = int(RECORD_SECONDS * actual_fps)
@@ -29,17 +58,43 @@ def record_video(cap, actual_fps, actual_width, actual_height):
     for i in range(num_frames_to_capture):
         ret, frame = cap.read()
         if ret:
+            frame_time = clock()
+            if first_frame_time is None:
+                first_frame_time = frame_time
             frames_buffer.append(frame)
+            frame_times.append(frame_time)
+            if tap is not None:
+                tap.offer(frame, frame_time, i)
         else:
+            dropped_frames += 1
             print("录制过程中丢失一帧。", flush=True)
 
     end_time = time.time()
+    capture_end = clock()
     record_duration = end_time - start_time
     actual_recorded_fps = len(frames_buffer) / record_duration if record_duration > 0 else 0
 
     print(f"录制完成。共捕获 {len(frames_buffer)} 帧。", flush=True)
+    if first_frame_time is not None:
+        print(f"首帧时间: {first_frame_time:.6f}", flush=True)
     print(f"实际录制时长: {record_duration:.2f} 秒, 平均帧率: {actual_recorded_fps:.2f} FPS", flush=True)
 
+    CAPTURE_FPS.set(round(actual_recorded_fps, 3))
+    CAPTURED_FRAMES.inc(len(frames_buffer))
+    DROPPED_FRAMES.inc(dropped_frames)
+    BUFFER_FRAMES.set(len(frames_buffer))
+    BUFFER_BYTES.set(sum(f.nbytes for f in frames_buffer))
+
+    # 热循环中不做追踪，采集结束后按首帧/末帧时间戳补记
+    if first_frame_time is not None:
+        TRACER.add("wait_first_frame", received_time, first_frame_time, "capture")
+        TRACER.add("capture", first_frame_time, frame_times[-1], "capture",
+                   frames=len(frames_buffer), dropped_frames=dropped_frames,
+                   fps=round(actual_recorded_fps, 3))
+        TRACER.instant("first_frame", first_frame_time, "capture")
+        TRACER.instant("last_frame", frame_times[-1], "capture")
+    TRACER.add("capture_loop", received_time, capture_end, "recorder")
+
     if frames_buffer:
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         filename = f"Cam240_{timestamp}.mp4"
@@ -47,15 +102,36 @@ def record_video(cap, actual_fps, actual_width, actual_height):
 
         print(f"正在保存文件到: {filepath}", flush=True)
 
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(filepath, fourcc, actual_fps, (int(actual_width), int(actual_height)))
-
-        for f in frames_buffer:
-            out.write(f)
-
-        out.release()
+        save_start = clock()
+        with TRACER.span("encode", "recorder", frames=len(frames_buffer)):
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out = cv2.VideoWriter(filepath, fourcc, actual_fps, (int(actual_width), int(actual_height)))
+
+            for f in frames_buffer:
+                out.write(f)
+
+            out.release()
+        write_frame_times(filepath, frame_times)
+        # 录制参数和统计写入元数据，主程序据此登记到会话目录
+        update_take_metadata(filepath, 'recording', {
+            'width': int(actual_width),
+            'height': int(actual_height),
+            'requested_fps': FPS,
+            'camera_fps': actual_fps,
+            'actual_fps': round(actual_recorded_fps, 3),
+            'frames': len(frames_buffer),
+            'dropped_frames': dropped_frames,
+            'duration_s': round(record_duration, 3),
+        })
+        save_end = clock()
+        SAVE_SECONDS.observe(save_end - save_start)
+        TRACER.add("save", save_start, save_end, "recorder")
+        report_metrics()
+        report_trace()
         print("文件保存成功。", flush=True)
     else:
+        report_metrics()
+        report_trace()
         print("缓冲区为空，未保存视频。", flush=True)
 
 # --- 主函数 ---
@@ -68,6 +144,11 @@ def main():
             print(f"使用指定的摄像头 {camera_index}", flush=True)
         except ValueError:
             print("警告: 摄像头索引参数无效，使用默认摄像头 0", flush=True)
+    # 第二个参数为视频输出目录（多台设备并行录制时各用一个目录，避免同一秒保存的文件重名）
+    if len(sys.argv) > 2:
+        global OUTPUT_DIR
+        OUTPUT_DIR = sys.argv[2]
+        print(f"视频输出目录: {OUTPUT_DIR}", flush=True)
     
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
@@ -117,6 +198,14 @@ def main():
     actual_fps = cap.get(cv2.CAP_PROP_FPS)
     actual_exposure = cap.get(cv2.CAP_PROP_EXPOSURE)
 
+    # 录制期间摄像头被本进程占用，缩小的画面经共享内存分流给界面预览
+    tap = None
+    try:
+        tap = FrameTapWriter()
+        print(f"{FRAME_TAP_SIGNAL} {tap.name}", flush=True)
+    except Exception as e:
+        print(f"警告: 无法创建预览共享内存，录制期间不能预览: {e}", flush=True)
+
     print("摄像头初始化完成。", flush=True)
     print(f"实际分辨率: {int(actual_width)}x{int(actual_height)}, 实际帧率: {actual_fps} FPS", flush=True)
     print(f"曝光模式: {AUTO_EXPOSURE_MODE}, 实际曝光值: {actual_exposure}", flush=True)
@@ -128,10 +217,12 @@ def main():
             try:
                 # 使用readline()来读取输入，这样更适合管道通信
                 char_received = sys.stdin.readline().strip()
+                received_time = clock()
                 print(f"接收到命令: '{char_received}'", flush=True)
 
                 if char_received == 's':
-                    record_video(cap, actual_fps, actual_width, actual_height)
+                    print(f"收到触发时间: {received_time:.6f}", flush=True)
+                    record_video(cap, actual_fps, actual_width, actual_height, tap, received_time)
                     # 录制完成后，继续等待下一个命令
                     print("\n等待从标准输入接收's'命令...", flush=True)
                 elif char_received == 'q' or char_received == 'quit':
@@ -154,6 +245,8 @@ def main():
     except KeyboardInterrupt:
         print("收到中断信号，程序退出。", flush=True)
 
+    if tap is not None:
+        tap.close()
     cap.release()
     cv2.destroyAllWindows()
     print("程序已退出。", flush=True)
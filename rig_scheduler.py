@@ -0,0 +1,576 @@
+# -*- coding: utf-8 -*-
+"""多设备并行测量
+
+一台主机连接多组“手机 + 高速摄像头”（下称设备组），每组有自己的录制子进程、按键触发会话、
+Payload 同步目录和文件名编号，由同一个调度器并行运行。录制时每个子进程要占用约一个 CPU 核心、
+所在 USB 总线的带宽，并把整段视频缓存在内存中再写盘，因此调度器在每次触发前检查这些资源，
+超出预算时让该设备组等待，直到正在录制的设备组保存完成。
+
+设备组保存在配置文件的 rigs 列表中（序列号 → 摄像头索引）:
+    python rig_scheduler.py add --name rigA --serial 192.168.1.101:5555 --camera 0
+    python rig_scheduler.py add --name rigB --serial R58M123ABC --camera 1 --usb-bus usb3
+    python rig_scheduler.py list
+    python rig_scheduler.py run --cycles 20 --interval 120 [--rig rigA --rig rigB] [--max-concurrent 2]
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+
+from adb_client import AdbClient, AdbError
+from device_tracker import DeviceTracker
+from batch_runner import (RESULT_FIELDS, DEFAULT_FILENAME_PARTS, config_path, load_config, find_adb, run_cycle,
+                          print_summary, log)
+from measurement_session import MeasurementSession, format_take_name, next_take_number, open_catalog, TAKE_TIMEOUT
+from metrics import start_metrics_server, DEFAULT_METRICS_PORT
+from payload_sync import format_bytes
+from record_script import FRAME_WIDTH, FRAME_HEIGHT, FPS, RECORD_SECONDS
+from session_catalog import app_config_dir
+
+# USB 摄像头 MJPEG 输出的估计码率（字节/像素），用于估算总线带宽占用
+MJPEG_BYTES_PER_PIXEL = 0.35
+
+# 录制子进程在内存中缓存的每帧字节数（BGR）
+FRAME_BUFFER_BYTES_PER_PIXEL = 3
+
+# 周期传输（等时）最多占用 USB 总线带宽的比例
+USB_PERIODIC_SHARE = 0.8
+
+# 每个录制子进程占用的 CPU 核心数，以及留给主程序/adb 的核心数
+CORES_PER_RIG = 1.0
+RESERVED_CORES = 1.0
+
+# 磁盘写入吞吐和物理内存的可用比例
+DISK_UTILIZATION = 0.7
+MEMORY_UTILIZATION = 0.75
+
+# 单次测量视频大小的初始估计（之后按实际大小更新）
+DEFAULT_TAKE_BYTES = 150 * 1024 * 1024
+
+# 磁盘吞吐探测写入量
+DISK_PROBE_BYTES = 64 * 1024 * 1024
+
+RIG_RESULT_FIELDS = ("rig",) + RESULT_FIELDS
+
+_config_lock = threading.Lock()
+
+
+def safe_rig_name(name):
+    """设备组名用作目录名，只保留字母、数字、下划线、点和破折号"""
+    return re.sub(r"[^\w.-]+", "_", name).strip("._") or "rig"
+
+
+def camera_usb_bus(camera_index):
+    """Linux: 通过 /sys/class/video4linux 查找摄像头所在的 USB 总线，返回 (总线名, 带宽 字节/秒)
+
+    xHCI 控制器上 USB 2.0 和 USB 3.x 设备分属不同的根总线，根集线器的速率即为该总线的速率。
+    其他平台或无法确定时返回 (None, None)。
+    """
+    device = f"/sys/class/video4linux/video{camera_index}/device"
+    if not os.path.exists(device):
+        return None, None
+    match = re.search(r"/(usb\d+)/", os.path.realpath(device) + "/")
+    if not match:
+        return None, None
+    bus = match.group(1)
+    try:
+        with open(f"/sys/bus/usb/devices/{bus}/speed") as f:
+            speed_mbps = float(f.read().strip())
+    except (OSError, ValueError):
+        return bus, None
+    return bus, speed_mbps * 1e6 / 8 * USB_PERIODIC_SHARE
+
+
+def measure_disk_throughput(directory, size=DISK_PROBE_BYTES):
+    """写入并同步一个临时文件，返回磁盘顺序写入吞吐（字节/秒）"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, ".disk_probe")
+    chunk = os.urandom(1024 * 1024)
+    start = time.perf_counter()
+    try:
+        with open(path, 'wb') as f:
+            for _ in range(max(1, size // len(chunk))):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        elapsed = time.perf_counter() - start
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return size / elapsed if elapsed > 0 else None
+
+
+def physical_memory():
+    """物理内存字节数，无法获取时返回 None（如 Windows）"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class Rig:
+    """一组设备：一台手机（adb 序列号）加一个摄像头"""
+
+    def __init__(self, name, serial, camera_index, filename_parts=None, usb_bus=None,
+                 width=FRAME_WIDTH, height=FRAME_HEIGHT, fps=FPS, enabled=True):
+        self.name = safe_rig_name(name)
+        self.serial = serial
+        self.camera_index = int(camera_index)
+        self.filename_parts = list(filename_parts or DEFAULT_FILENAME_PARTS)
+        self.usb_bus = usb_bus  # None 时在 Linux 上自动检测
+        self.usb_capacity = None  # 所在总线的可用带宽（字节/秒），未知时为 None
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.enabled = enabled
+        self.take_bytes = DEFAULT_TAKE_BYTES
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['serial'], data.get('camera_index', 0),
+                   filename_parts=data.get('filename_parts'), usb_bus=data.get('usb_bus'),
+                   width=data.get('width', FRAME_WIDTH), height=data.get('height', FRAME_HEIGHT),
+                   fps=data.get('fps', FPS), enabled=data.get('enabled', True))
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'serial': self.serial,
+            'camera_index': self.camera_index,
+            'filename_parts': self.filename_parts,
+            'usb_bus': self.usb_bus,
+            'width': self.width,
+            'height': self.height,
+            'fps': self.fps,
+            'enabled': self.enabled,
+        }
+
+    @property
+    def video_dir(self):
+        return os.path.join("videos", self.name)
+
+    @property
+    def payload_root(self):
+        return os.path.join("payloads", self.name)
+
+    @property
+    def usb_bandwidth(self):
+        """录制时摄像头占用的 USB 带宽估计（字节/秒）"""
+        return self.width * self.height * self.fps * MJPEG_BYTES_PER_PIXEL
+
+    @property
+    def frame_buffer_bytes(self):
+        """录制子进程缓存整段视频所需的内存"""
+        return self.width * self.height * FRAME_BUFFER_BYTES_PER_PIXEL * self.fps * RECORD_SECONDS
+
+    @property
+    def disk_rate(self):
+        """平均磁盘写入速率估计（字节/秒）"""
+        return self.take_bytes / RECORD_SECONDS
+
+    def detect_usb_bus(self):
+        bus, capacity = camera_usb_bus(self.camera_index)
+        if self.usb_bus is None:
+            self.usb_bus = bus
+        if bus is not None and bus == self.usb_bus:
+            self.usb_capacity = capacity
+
+
+def load_rigs(config):
+    return [Rig.from_dict(data) for data in config.get('rigs', [])]
+
+
+def save_rigs(rigs):
+    """写回配置文件中的 rigs 列表，其余设置保持不变"""
+    with _config_lock:
+        config = load_config()
+        config['rigs'] = [rig.to_dict() for rig in rigs]
+        config['last_updated'] = datetime.now().isoformat()
+        with open(config_path(), 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def save_rig_filename_parts(rig):
+    """只更新某个设备组的文件名编号（测量线程中调用）"""
+    with _config_lock:
+        config = load_config()
+        for data in config.get('rigs', []):
+            if data.get('name') == rig.name:
+                data['filename_parts'] = rig.filename_parts
+        config['last_updated'] = datetime.now().isoformat()
+        with open(config_path(), 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+class ResourceBudget:
+    """同时录制的资源预算：CPU 核心、USB 总线带宽、磁盘吞吐和空间、内存"""
+
+    def __init__(self, cpu_cores=None, disk_throughput=None, memory=None, max_concurrent=None,
+                 cores_per_rig=CORES_PER_RIG, reserved_cores=RESERVED_CORES):
+        self.cpu_cores = cpu_cores or os.cpu_count() or 1
+        self.disk_throughput = disk_throughput
+        self.memory = memory
+        self.max_concurrent = max_concurrent
+        self.cores_per_rig = cores_per_rig
+        self.reserved_cores = reserved_cores
+
+    @property
+    def cpu_slots(self):
+        return max(1, int((self.cpu_cores - self.reserved_cores) // self.cores_per_rig))
+
+    def check(self, rig, active):
+        """rig 能否在 active（正在录制的设备组）之外再开始录制，不能时返回原因
+
+        没有其他设备组在录制时总是允许（磁盘空间除外），单个设备组超出预算只在启动时提示。
+        """
+        video_dir = rig.video_dir if os.path.exists(rig.video_dir) else "."
+        needed_space = (len(active) + 1) * rig.take_bytes * 2  # 原视频 + 交接副本
+        if shutil.disk_usage(video_dir).free < needed_space:
+            return f"磁盘空间不足（需要 {format_bytes(needed_space)}）"
+        if not active:
+            return None
+        if self.max_concurrent and len(active) >= self.max_concurrent:
+            return f"已有 {len(active)} 台在录制（上限 {self.max_concurrent}）"
+        if len(active) + 1 > self.cpu_slots:
+            return f"CPU 核心不足（{self.cpu_cores} 核，最多同时录制 {self.cpu_slots} 台）"
+        if hasattr(os, "getloadavg"):
+            load = os.getloadavg()[0]
+            if load + self.cores_per_rig > self.cpu_cores:
+                return f"CPU 负载过高（{load:.1f}/{self.cpu_cores}）"
+        if rig.usb_bus and rig.usb_capacity:
+            used = sum(other.usb_bandwidth for other in active if other.usb_bus == rig.usb_bus)
+            if used > 0 and used + rig.usb_bandwidth > rig.usb_capacity:
+                return (f"USB 总线 {rig.usb_bus} 带宽不足（已用 {format_bytes(used)}/s，"
+                        f"可用 {format_bytes(rig.usb_capacity)}/s）")
+        if self.disk_throughput:
+            used = sum(other.disk_rate for other in active)
+            if used + rig.disk_rate > self.disk_throughput * DISK_UTILIZATION:
+                return f"磁盘写入吞吐不足（{format_bytes(self.disk_throughput)}/s）"
+        if self.memory:
+            used = sum(other.frame_buffer_bytes for other in active)
+            if used + rig.frame_buffer_bytes > self.memory * MEMORY_UTILIZATION:
+                return f"内存不足（录制缓存共需 {format_bytes(used + rig.frame_buffer_bytes)}）"
+        return None
+
+    def describe(self, rigs):
+        lines = [f"CPU: {self.cpu_cores} 核，最多同时录制 {self.cpu_slots} 台"]
+        if self.disk_throughput:
+            lines.append(f"磁盘写入: {format_bytes(self.disk_throughput)}/s")
+        if self.memory:
+            lines.append(f"内存: {format_bytes(self.memory)}")
+        if self.max_concurrent:
+            lines.append(f"同时录制上限: {self.max_concurrent}")
+        for rig in rigs:
+            bus = rig.usb_bus or "未知"
+            capacity = f"{format_bytes(rig.usb_capacity)}/s" if rig.usb_capacity else "未知"
+            lines.append(f"{rig.name}: 设备 {rig.serial}, 摄像头 {rig.camera_index}, USB 总线 {bus} "
+                         f"(可用 {capacity}, 估计占用 {format_bytes(rig.usb_bandwidth)}/s), "
+                         f"录制缓存 {format_bytes(rig.frame_buffer_bytes)}")
+            if rig.usb_capacity and rig.usb_bandwidth > rig.usb_capacity:
+                lines.append(f"  ⚠ {rig.name} 单独录制即超过 USB 总线带宽，可能丢帧")
+            if self.memory and rig.frame_buffer_bytes > self.memory * MEMORY_UTILIZATION:
+                lines.append(f"  ⚠ {rig.name} 单独录制即超过内存预算")
+        return lines
+
+
+class RigScheduler:
+    """并行运行多个设备组，按资源预算控制同时录制的数量"""
+
+    def __init__(self, rigs, client, budget, config, catalog=None, log=log, device_tracker=None):
+        self.rigs = rigs
+        self.client = client
+        self.device_tracker = device_tracker  # 所有设备组共用一条 track-devices 长连接
+        self.budget = budget
+        self.config = config
+        self.catalog = catalog
+        self.log = log
+        self.stop_event = threading.Event()
+        self._condition = threading.Condition()
+        self._active = []  # 正在录制的设备组
+        self.rows = []
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    # --- 录制资源 ---
+
+    def acquire(self, rig):
+        """等待资源允许后登记为正在录制"""
+        last_reason = None
+        with self._condition:
+            while not self.stop_event.is_set():
+                reason = self.budget.check(rig, self._active)
+                if reason is None:
+                    self._active.append(rig)
+                    return
+                if reason != last_reason:
+                    self.log(f"[{rig.name}] 等待资源: {reason}")
+                    last_reason = reason
+                self._condition.wait(1.0)
+        raise AdbError("调度已停止")
+
+    def release(self, rig):
+        with self._condition:
+            if rig in self._active:
+                self._active.remove(rig)
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, rig):
+        self.acquire(rig)
+        try:
+            yield
+        finally:
+            self.release(rig)
+
+    # --- 设备组 ---
+
+    def create_session(self, rig):
+        def rig_log(message):
+            self.log(f"[{rig.name}] {message}")
+
+        def on_take_saved(video_path, take):
+            if video_path and os.path.exists(video_path):
+                rig.take_bytes = os.path.getsize(video_path)
+            try:
+                rig.filename_parts[1] = next_take_number(rig.filename_parts[1])
+                save_rig_filename_parts(rig)
+            except (ValueError, OSError) as e:
+                rig_log(f"⚠ 文件名编号递增失败: {e}")
+
+        session = MeasurementSession(
+            lambda: self.client, log=rig_log,
+            name_provider=lambda: format_take_name(rig.filename_parts),
+            on_take_saved=on_take_saved,
+            trigger_method=self.config.get('trigger_method', 'auto'),
+            trigger_compensation=self.config.get('trigger_compensation', False),
+            payload_transfer_method=self.config.get('payload_transfer_method', 'auto'),
+            payload_watch=self.config.get('payload_watch', True),
+            video_handoff=self.config.get('video_handoff', 'auto'),
+            link_monitoring=self.config.get('link_monitoring', True),
+            screen_recording=self.config.get('screen_recording', False),
+            catalog=self.catalog,
+            video_dir=rig.video_dir,
+            payload_root=rig.payload_root,
+            device_tracker=self.device_tracker)
+        if self.device_tracker:
+            self.device_tracker.add_listener(session.handle_device_state)
+        return session
+
+    def prepare(self, rig, session, camera_timeout):
+        """连接设备、打开触发会话并预热摄像头，返回是否就绪"""
+        try:
+            if ":" in rig.serial and rig.serial not in session.list_devices():
+                session.connect(rig.serial)
+            session.open_device(rig.serial)
+        except AdbError as e:
+            self.log(f"[{rig.name}] ✗ 设备 {rig.serial} 不可用: {e}")
+            return False
+        if not session.start_camera(rig.camera_index) or not session.wait_camera_ready(camera_timeout):
+            self.log(f"[{rig.name}] ✗ 摄像头 {rig.camera_index} 启动失败")
+            return False
+        return True
+
+    def write_row(self, rig, row):
+        row = dict(row, rig=rig.name)
+        with self._writer_lock:
+            self.rows.append(row)
+            if self._writer is not None:
+                self._writer.writerow(row)
+                self._file.flush()
+
+    def run_rig(self, rig, session, cycles, interval, take_timeout, sync_payload):
+        for cycle in range(1, cycles + 1):
+            if self.stop_event.is_set():
+                break
+            cycle_start = time.perf_counter()
+            self.log(f"[{rig.name}] === 第 {cycle}/{cycles} 次测量: {format_take_name(rig.filename_parts)} ===")
+            row = run_cycle(session, cycle, take_timeout, sync_payload=sync_payload, slot=self.slot(rig))
+            self.write_row(rig, row)
+            if not session.check_camera():
+                self.log(f"[{rig.name}] ✗ 录制进程已退出，该设备组停止")
+                break
+            if cycle < cycles:
+                remaining = interval - (time.perf_counter() - cycle_start)
+                if remaining > 0:
+                    self.stop_event.wait(remaining)
+
+    def run(self, cycles, interval=0.0, results_path=None, take_timeout=TAKE_TIMEOUT, sync_payload=True,
+            camera_timeout=20.0):
+        """预热所有设备组后并行执行测量，返回结果行列表"""
+        sessions = {rig.name: self.create_session(rig) for rig in self.rigs}
+        ready = []
+        try:
+            # 各设备组并行连接和预热，互不等待
+            threads = []
+            for rig in self.rigs:
+                def prepare(rig=rig):
+                    if self.prepare(rig, sessions[rig.name], camera_timeout):
+                        ready.append(rig)
+                thread = threading.Thread(target=prepare, daemon=True)
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+            if not ready:
+                self.log("✗ 没有可用的设备组")
+                return self.rows
+            self.log(f"✓ {len(ready)}/{len(self.rigs)} 个设备组就绪: {', '.join(rig.name for rig in ready)}")
+
+            if results_path:
+                os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+                self._file = open(results_path, 'w', newline='', encoding='utf-8')
+                self._writer = csv.DictWriter(self._file, fieldnames=RIG_RESULT_FIELDS)
+                self._writer.writeheader()
+
+            threads = [threading.Thread(target=self.run_rig, daemon=True,
+                                        args=(rig, sessions[rig.name], cycles, interval, take_timeout, sync_payload))
+                       for rig in ready]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)  # 定时返回，以便主线程响应 Ctrl+C
+            return self.rows
+        finally:
+            self.stop_event.set()
+            for session in sessions.values():
+                session.close()
+            if self._writer is not None:
+                self._file.close()
+                self._writer = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多设备并行测量")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="添加或更新设备组")
+    add_parser.add_argument("--name", required=True)
+    add_parser.add_argument("--serial", required=True, help="adb 序列号（无线设备为 IP:端口）")
+    add_parser.add_argument("--camera", type=int, required=True, help="摄像头索引")
+    add_parser.add_argument("--prefix", help="文件名前缀（默认沿用配置中的文件名）")
+    add_parser.add_argument("--number", help="起始编号")
+    add_parser.add_argument("--suffix", help="文件名后缀")
+    add_parser.add_argument("--usb-bus", help="摄像头所在 USB 总线（如 usb3），Linux 上可自动检测")
+
+    remove_parser = subparsers.add_parser("remove", help="删除设备组")
+    remove_parser.add_argument("name")
+
+    subparsers.add_parser("list", help="列出设备组和资源预算")
+
+    run_parser = subparsers.add_parser("run", help="并行执行测量")
+    run_parser.add_argument("--rig", action="append", help="只运行指定的设备组（可重复）")
+    run_parser.add_argument("--cycles", type=int, default=1, help="每个设备组的测量次数")
+    run_parser.add_argument("--interval", type=float, default=0.0, help="同一设备组相邻两次测量开始的最短间隔（秒）")
+    run_parser.add_argument("--max-concurrent", type=int, default=None, help="同时录制的设备组上限")
+    run_parser.add_argument("--results", default=None, help="结果 CSV 路径（默认 results/rigs_<时间>.csv）")
+    run_parser.add_argument("--no-payload", action="store_true", help="每次测量后不同步 Payload")
+    run_parser.add_argument("--no-catalog", action="store_true", help="不登记到录制会话目录")
+    run_parser.add_argument("--skip-disk-probe", action="store_true", help="不测量磁盘写入吞吐")
+    run_parser.add_argument("--take-timeout", type=float, default=TAKE_TIMEOUT, help="单次录制保存超时（秒）")
+    run_parser.add_argument("--adb", default=None, help="adb 可执行文件路径")
+    args = parser.parse_args()
+
+    config = load_config()
+    rigs = load_rigs(config)
+
+    if args.command == "add":
+        rig = next((r for r in rigs if r.name == safe_rig_name(args.name)), None)
+        if rig is None:
+            rig = Rig(args.name, args.serial, args.camera, filename_parts=config.get('filename_parts'))
+            rigs.append(rig)
+        rig.serial = args.serial
+        rig.camera_index = args.camera
+        for index, value in ((0, args.prefix), (1, args.number), (2, args.suffix)):
+            if value is not None:
+                rig.filename_parts[index] = value
+        if args.usb_bus is not None:
+            rig.usb_bus = args.usb_bus
+        save_rigs(rigs)
+        print(f"✓ 设备组 {rig.name}: 设备 {rig.serial}, 摄像头 {rig.camera_index}, "
+              f"文件名 {format_take_name(rig.filename_parts)}")
+        return 0
+
+    if args.command == "remove":
+        remaining = [r for r in rigs if r.name != safe_rig_name(args.name)]
+        if len(remaining) == len(rigs):
+            print(f"设备组 {args.name} 不存在")
+            return 1
+        save_rigs(remaining)
+        print(f"✓ 已删除设备组 {args.name}")
+        return 0
+
+    if not rigs:
+        print("配置中没有设备组，请先用 add 添加")
+        return 1
+    for rig in rigs:
+        rig.detect_usb_bus()
+
+    if args.command == "list":
+        budget = ResourceBudget(memory=physical_memory())
+        for rig in rigs:
+            state = "" if rig.enabled else "（已停用）"
+            print(f"{rig.name}{state}: 设备 {rig.serial}, 摄像头 {rig.camera_index}, "
+                  f"下一个文件名 {format_take_name(rig.filename_parts)}")
+        for line in budget.describe(rigs):
+            print(line)
+        return 0
+
+    selected = [rig for rig in rigs if (rig.name in args.rig if args.rig else rig.enabled)]
+    if not selected:
+        print("没有选中的设备组")
+        return 1
+    serials = [rig.serial for rig in selected]
+    if len(set(serials)) != len(serials) or len({rig.camera_index for rig in selected}) != len(selected):
+        print("✗ 设备组之间的设备序列号和摄像头索引不能重复")
+        return 1
+
+    disk_throughput = None
+    if not args.skip_disk_probe:
+        disk_throughput = measure_disk_throughput("videos")
+    budget = ResourceBudget(disk_throughput=disk_throughput, memory=physical_memory(),
+                            max_concurrent=args.max_concurrent)
+    for line in budget.describe(selected):
+        log(line)
+
+    results_path = args.results or os.path.join(
+        "results", f"rigs_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv")
+    client = AdbClient(adb_path=find_adb(args.adb))
+    tracker = DeviceTracker(client, log=log).start()
+    tracker.wait_synced()
+    metrics_server = start_metrics_server(config.get('metrics_port', DEFAULT_METRICS_PORT), log=log)
+    catalog = None if args.no_catalog else open_catalog(app_config_dir(), log)
+    scheduler = RigScheduler(selected, client, budget, config, catalog=catalog, device_tracker=tracker)
+    start = time.perf_counter()
+    rows = []
+    try:
+        rows = scheduler.run(args.cycles, args.interval, results_path, args.take_timeout,
+                             sync_payload=not args.no_payload)
+    except KeyboardInterrupt:
+        log("收到中断信号，停止所有设备组")
+        scheduler.stop_event.set()
+        rows = scheduler.rows
+    finally:
+        tracker.stop()
+        if metrics_server:
+            metrics_server.stop()
+        if catalog:
+            catalog.close()
+        client.close()
+    if rows:
+        print_summary(rows, time.perf_counter() - start)
+        log(f"结果已写入: {os.path.abspath(results_path)}")
+    return 0 if rows and all(row["status"] == "ok" for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
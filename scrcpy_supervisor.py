@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""scrcpy 屏幕镜像进程监管
+
+原来 scrcpy 以 stdout/stderr=PIPE 启动后再也没有人读取这两个管道，管道缓冲区写满后 scrcpy
+阻塞，镜像画面冻结；scrcpy 崩溃或设备断开后也不会被发现。ScrcpySupervisor：
+
+- 在读取线程中持续读取并解析 scrcpy 的输出（stderr 合并到 stdout），管道不会写满；
+- 进程意外退出后按指数退避自动重启，稳定运行一段时间后退避时间复位；
+- 从输出中解析帧率（--print-fps）、画面尺寸、设备名称和连接状态，供状态栏显示镜像占用。
+
+镜像配置（profile）把 --max-size、--max-fps、--video-bit-rate、--no-audio、--no-playback、
+--no-control 等参数按名称保存在配置文件中，测量录制期间切换到最轻的配置，为 240 fps 采集留出
+CPU 和 USB 带宽，录制结束后恢复。旧版本 scrcpy 不认识的选项（如 --print-fps、--video-bit-rate）
+会在启动失败后自动去掉并重新启动。
+"""
+import collections
+import re
+import subprocess
+import threading
+import time
+
+# 重启退避（秒）
+RESTART_MIN_DELAY = 1.0
+RESTART_MAX_DELAY = 30.0
+
+# 运行超过该时间后视为稳定，下次退出时从最短退避重新开始（秒）
+STABLE_RUNTIME = 30.0
+
+# 保留的最近输出行数（退出时写入日志）
+OUTPUT_HISTORY = 20
+
+PRINT_FPS_OPTION = "--print-fps"
+
+# 镜像配置：键为 scrcpy 长选项名（下划线代替连字符），True 为不带值的开关，False/None 表示不加该选项
+DEFAULT_PROFILES = {
+    "full": {},  # scrcpy 默认参数（全分辨率、默认码率）
+    "normal": {"max_size": 1024, "max_fps": 30, "video_bit_rate": "4M", "no_audio": True},
+    "light": {"max_size": 480, "max_fps": 10, "video_bit_rate": "1M", "no_audio": True, "no_control": True},
+}
+DEFAULT_PROFILE = "normal"
+DEFAULT_CAPTURE_PROFILE = "light"  # 测量录制期间使用
+
+UNSUPPORTED_OPTION_PATTERN = re.compile(r"(?:unrecognized|unknown|invalid) option[ :'\"]*(--[\w-]+)", re.IGNORECASE)
+FPS_PATTERN = re.compile(r"(\d+) fps(?: \(\+(\d+) frames? skipped\))?")
+TEXTURE_PATTERN = re.compile(r"Texture: (\d+)x(\d+)")
+DEVICE_PATTERN = re.compile(r"Device: (.+)")
+
+STATE_STARTING = "starting"
+STATE_RUNNING = "running"
+STATE_RESTARTING = "restarting"
+STATE_STOPPED = "stopped"
+
+STATE_LABELS = {
+    STATE_STARTING: "启动中",
+    STATE_RUNNING: "运行中",
+    STATE_RESTARTING: "重启中",
+    STATE_STOPPED: "已停止",
+}
+
+
+def profile_arguments(profile):
+    """把镜像配置转换为 scrcpy 命令行参数"""
+    arguments = []
+    for key, value in profile.items():
+        if value is None or value is False:
+            continue
+        option = "--" + key.replace("_", "-")
+        arguments.append(option if value is True else f"{option}={value}")
+    return arguments
+
+
+class ScrcpySupervisor:
+    """启动 scrcpy 并在意外退出后自动重启"""
+
+    def __init__(self, command, log=print, on_change=None, print_fps=True, popen_kwargs=None, profile=None):
+        self.command = list(command)  # scrcpy 可执行文件和参数（不含 --print-fps）
+        self.profile = profile  # 当前镜像配置名称（仅用于显示）
+        self.log = log
+        self.on_change = on_change  # on_change(ScrcpySupervisor)：状态变化时在监管线程中调用
+        self.print_fps = print_fps
+        self.popen_kwargs = popen_kwargs or {}
+
+        self.process = None
+        self.state = STATE_STOPPED
+        self.restarts = 0
+        self.last_error = None
+        self.fps = None
+        self.skipped_frames = 0
+        self.texture_size = None
+        self.device_name = None
+        self.started_at = None
+        self.unsupported_options = set()  # 当前 scrcpy 版本不认识的选项
+        self._output = collections.deque(maxlen=OUTPUT_HISTORY)
+        self._backoff = RESTART_MIN_DELAY
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._restart_lock = threading.Lock()
+        self._thread = None
+        self._reader = None
+
+    # --- 生命周期 ---
+
+    def start(self):
+        """启动 scrcpy 和监管线程，返回首次启动是否成功"""
+        thread = self._thread
+        if thread is not None:
+            if not self._stop.is_set():
+                return True
+            if thread.is_alive():
+                # 上一次 stop() 等待超时，旧的监管线程仍在运行，不能再启动第二个
+                self.log("⚠ 上一个scrcpy监管线程尚未退出，暂不启动")
+                return False
+            self._thread = None
+        self._stop.clear()
+        if not self._launch():
+            self._set_state(STATE_STOPPED)
+            return False
+        self._thread = threading.Thread(target=self._supervise, name="scrcpy-supervisor", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=5):
+        """停止 scrcpy，不再重启"""
+        self._stop.set()
+        with self._lock:
+            process = self.process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            if thread.is_alive():
+                self.log(f"⚠ scrcpy监管线程 {timeout} s 内未退出")
+            else:
+                self._thread = None
+        else:
+            self._thread = None
+        with self._lock:
+            self.process = None
+        self._set_state(STATE_STOPPED)
+
+    def restart(self, command=None, profile=None):
+        """用新的参数重新启动（如切换镜像配置），返回是否成功"""
+        with self._restart_lock:
+            self.stop()
+            if command is not None:
+                self.command = list(command)
+            if profile is not None:
+                self.profile = profile
+            self._backoff = RESTART_MIN_DELAY
+            return self.start()
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def wait_running(self, timeout):
+        """等待 scrcpy 开始显示画面（状态变为运行中），返回是否在 timeout 秒内就绪"""
+        deadline = time.monotonic() + timeout
+        while self.state != STATE_RUNNING:
+            if time.monotonic() >= deadline or self._stop.is_set():
+                return False
+            time.sleep(0.05)
+        return True
+
+    # --- 进程 ---
+
+    def _full_command(self):
+        command = list(self.command)
+        if self.print_fps and PRINT_FPS_OPTION not in command:
+            command.append(PRINT_FPS_OPTION)
+        return [argument for argument in command
+                if argument.split("=", 1)[0] not in self.unsupported_options]
+
+    def _launch(self):
+        self.fps = None
+        self.skipped_frames = 0
+        self.last_error = None
+        self._output.clear()
+        self._set_state(STATE_STARTING)
+        try:
+            process = subprocess.Popen(self._full_command(), stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, errors="replace", bufsize=1, **self.popen_kwargs)
+        except OSError as e:
+            self.last_error = str(e)
+            self.log(f"✗ 启动scrcpy失败: {e}")
+            return False
+        with self._lock:
+            if self._stop.is_set():
+                # 启动期间已被 stop()/restart() 停止：stop() 看不到这个进程，在这里终止它
+                stopped = True
+            else:
+                stopped = False
+                self.process = process
+                self.started_at = time.monotonic()
+        if stopped:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            return False
+        self._reader = threading.Thread(target=self._read_output, args=(process,), name="scrcpy-output",
+                                        daemon=True)
+        self._reader.start()
+        return True
+
+    def _read_output(self, process):
+        """持续读取输出，保证管道不会写满"""
+        for line in process.stdout:
+            line = line.strip()
+            if line:
+                self._handle_line(line)
+        process.stdout.close()
+
+    def _handle_line(self, line):
+        self._output.append(line)
+        match = FPS_PATTERN.search(line)
+        if match and "INFO" in line:
+            self.fps = int(match.group(1))
+            self.skipped_frames = int(match.group(2) or 0)
+            if self.state != STATE_RUNNING:
+                self._set_state(STATE_RUNNING)
+            return
+        match = TEXTURE_PATTERN.search(line)
+        if match:
+            self.texture_size = (int(match.group(1)), int(match.group(2)))
+            # 画面尺寸确定即表示已开始解码显示
+            self._set_state(STATE_RUNNING)
+            return
+        match = DEVICE_PATTERN.search(line)
+        if match:
+            self.device_name = match.group(1).strip()
+            return
+        if "ERROR" in line or "Device disconnected" in line:
+            self.last_error = line
+            self.log(f"scrcpy: {line}")
+        elif "WARN" in line:
+            self.log(f"scrcpy: {line}")
+
+    def _supervise(self):
+        while not self._stop.is_set():
+            process = self.process
+            returncode = process.wait()
+            if self._stop.is_set():
+                break
+            # 等读取线程处理完剩余输出再判断退出原因
+            self._reader.join(1.0)
+            runtime = time.monotonic() - (self.started_at or time.monotonic())
+            match = UNSUPPORTED_OPTION_PATTERN.search("\n".join(self._output))
+            if match and match.group(1) not in self.unsupported_options:
+                # 旧版本不认识的选项：去掉后立即重启
+                option = match.group(1)
+                self.unsupported_options.add(option)
+                if option == PRINT_FPS_OPTION:
+                    self.log("⚠ 当前scrcpy版本不支持帧率输出，已关闭帧率统计")
+                    self.print_fps = False
+                else:
+                    self.log(f"⚠ 当前scrcpy版本不支持选项 {option}，已忽略")
+            else:
+                if runtime >= STABLE_RUNTIME:
+                    self._backoff = RESTART_MIN_DELAY
+                self.log(f"⚠ scrcpy已退出 (返回码 {returncode}, 运行 {runtime:.0f} s)，"
+                         f"{self._backoff:.0f} s 后重启")
+                if self.last_error is None:
+                    # 没有输出错误信息就退出时，记录最后几行输出便于排查
+                    for line in list(self._output)[-3:]:
+                        self.log(f"  scrcpy: {line}")
+                self._set_state(STATE_RESTARTING)
+                if self._stop.wait(self._backoff):
+                    break
+                self._backoff = min(self._backoff * 2, RESTART_MAX_DELAY)
+            self.restarts += 1
+            while not self._stop.is_set() and not self._launch():
+                self._set_state(STATE_RESTARTING)
+                if self._stop.wait(self._backoff):
+                    break
+                self._backoff = min(self._backoff * 2, RESTART_MAX_DELAY)
+
+    # --- 状态 ---
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        if self.on_change:
+            try:
+                self.on_change(self)
+            except Exception as e:
+                self.log(f"✗ scrcpy状态回调失败: {e}")
+
+    def describe(self):
+        """状态栏显示的镜像状态，如 “镜像 58 fps（跳帧 2） [normal]”"""
+        if self.state != STATE_RUNNING:
+            text = f"镜像{STATE_LABELS[self.state]}"
+        elif self.fps is not None:
+            text = f"镜像 {self.fps} fps"
+            if self.skipped_frames:
+                text += f"（跳帧 {self.skipped_frames}）"
+        else:
+            text = "镜像运行中"
+        if self.profile and self.state != STATE_STOPPED:
+            text += f" [{self.profile}]"
+        if self.restarts and self.state != STATE_STOPPED:
+            text += f" 重启 {self.restarts} 次"
+        return text
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""设备屏幕同步录制
+
+scrcpy 只用于实时显示，分析时却需要与 240 fps 摄像头视频同一时间窗口内的手机屏幕内容。
+ScreenRecorder 通过 adb 服务器的 exec: 服务执行
+`screenrecord --output-format=h264 -`，把原始 H.264 流直接写入测量目录（不经过设备存储）：
+
+- 每个帧（片 NAL 且 first_mb_in_slice 为 0）到达主机的时间记录在共享单调时钟上，
+  写入 `<测量名>.screen.frames.csv`，原始 H.264 流本身不带时间戳；
+- 测量元数据的 screen_recording 分节记录第一帧到达时间相对摄像头首帧的偏移，
+  两段视频无需手工对齐。到达时间包含设备编码和传输延迟，是屏幕画面时间的上界。
+"""
+import os
+import threading
+import time
+
+from adb_client import AdbError
+
+SCREEN_VIDEO_SUFFIX = ".screen.h264"
+SCREEN_FRAMES_SUFFIX = ".screen.frames.csv"
+
+# screenrecord 的最长录制时间（秒）：覆盖 31 秒录制和保存，测量结束时主动停止
+DEFAULT_TIME_LIMIT = 60
+
+# 等待第一帧到达的时间（秒），之后才触发，避免编码器启动时的数据与按键触发争用链路
+FIRST_FRAME_TIMEOUT = 2.0
+
+# H.264 起始码和帧所在的 NAL 类型（非 IDR 片 / IDR 片）
+START_CODE = b"\x00\x00\x01"
+SLICE_NAL_TYPES = (1, 5)
+
+# 与 record_script 一致的共享单调时钟
+clock = time.perf_counter
+
+
+class ScreenRecording:
+    """一次屏幕录制的结果（时间均为共享时钟秒数）"""
+
+    def __init__(self, path):
+        self.path = path
+        base = path[:-len(SCREEN_VIDEO_SUFFIX)] if path.endswith(SCREEN_VIDEO_SUFFIX) else path
+        self.frames_path = base + SCREEN_FRAMES_SUFFIX
+        self.requested = None  # 发出 exec: 请求
+        self.opened = None  # 服务器确认
+        self.first_data = None  # 第一块数据到达
+        self.ended = None
+        self.frame_times = []  # 每帧到达时间
+        self.bytes = 0
+        self.error = None
+        self.first_frame_event = threading.Event()
+        self.done_event = threading.Event()
+
+    @property
+    def first_frame(self):
+        return self.frame_times[0] if self.frame_times else None
+
+    def to_metadata(self, camera_first_frame=None):
+        """测量元数据中的 screen_recording 分节
+
+        *_ms 为相对摄像头首帧的毫秒数（没有摄像头首帧时间时为 None），start_offset_ms 即屏幕
+        第一帧相对摄像头首帧的偏移，正数表示屏幕录制较晚。
+        """
+        def ms(value):
+            if value is None or camera_first_frame is None:
+                return None
+            return round((value - camera_first_frame) * 1000.0, 3)
+
+        duration = None
+        if len(self.frame_times) > 1:
+            duration = round(self.frame_times[-1] - self.frame_times[0], 3)
+        return {
+            'file': os.path.basename(self.path),
+            'frames_file': os.path.basename(self.frames_path) if self.frame_times else None,
+            'format': 'h264',
+            'method': 'screenrecord',
+            'clock': 'perf_counter',
+            'first_frame_time': self.first_frame,
+            'camera_first_frame_time': camera_first_frame,
+            'requested_ms': ms(self.requested),
+            'stream_opened_ms': ms(self.opened),
+            'first_data_ms': ms(self.first_data),
+            'start_offset_ms': ms(self.first_frame),
+            'frames': len(self.frame_times),
+            'duration_s': duration,
+            'bytes': self.bytes,
+            'error': self.error,
+        }
+
+
+class ScreenRecorder:
+    """用 screenrecord 把设备屏幕录制为原始 H.264 流"""
+
+    def __init__(self, client, serial, log=print, time_limit=DEFAULT_TIME_LIMIT, bit_rate=None, size=None):
+        self.client = client
+        self.serial = serial
+        self.log = log
+        self.time_limit = time_limit
+        self.bit_rate = bit_rate  # 如 "4M"，None 为设备默认
+        self.size = size  # 如 "720x1280"，None 为屏幕分辨率
+        self.recording = None
+        self._conn = None
+        self._thread = None
+
+    def command(self):
+        arguments = ["screenrecord", "--output-format=h264", f"--time-limit={int(self.time_limit)}"]
+        if self.bit_rate:
+            arguments.append(f"--bit-rate={self.bit_rate}")
+        if self.size:
+            arguments.append(f"--size={self.size}")
+        return " ".join(arguments + ["-"])
+
+    def start(self, path):
+        """开始录制到 path，返回 ScreenRecording；打开服务失败时抛出 AdbError"""
+        self.stop()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        recording = ScreenRecording(path)
+        recording.requested = clock()
+        self._conn = self.client.exec_out(self.serial, self.command())
+        recording.opened = clock()
+        self._conn.settimeout(None)
+        self.recording = recording
+        self._thread = threading.Thread(target=self._receive, args=(self._conn, recording),
+                                        name="screen-recorder", daemon=True)
+        self._thread.start()
+        return recording
+
+    def wait_first_frame(self, timeout=FIRST_FRAME_TIMEOUT):
+        """等待第一帧到达，返回是否已到达"""
+        recording = self.recording
+        return recording is not None and recording.first_frame_event.wait(timeout)
+
+    def stop(self, timeout=3.0):
+        """停止录制（关闭流，设备端 screenrecord 随之退出），返回 ScreenRecording
+
+        读取线程在 timeout 内没有结束时记录日志，返回的 ScreenRecording 的 done_event 未设置。
+        """
+        recording = self.recording
+        conn = self._conn
+        if conn is not None:
+            conn.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                self.log(f"⚠ 屏幕录制读取线程 {timeout:.0f} s 内未结束")
+        self._conn = None
+        self._thread = None
+        self.recording = None
+        return recording
+
+    def _receive(self, conn, recording):
+        tail = b""
+        try:
+            with open(recording.path, "wb") as f:
+                while True:
+                    try:
+                        chunk = conn.recv()
+                    except AdbError as e:
+                        recording.error = str(e)
+                        break
+                    if not chunk:
+                        break
+                    arrival = clock()
+                    if recording.first_data is None:
+                        recording.first_data = arrival
+                    f.write(chunk)
+                    recording.bytes += len(chunk)
+                    tail = self._scan_frames(tail + chunk, arrival, recording)
+        except OSError as e:
+            recording.error = str(e)
+        finally:
+            recording.ended = clock()
+            if recording.frame_times:
+                try:
+                    with open(recording.frames_path, "w", encoding="utf-8") as f:
+                        f.write("frame,time\n")
+                        for index, frame_time in enumerate(recording.frame_times):
+                            f.write(f"{index},{frame_time:.6f}\n")
+                except OSError as e:
+                    recording.error = recording.error or str(e)
+            elif recording.error is None and recording.bytes:
+                # screenrecord 的错误信息（如不支持 h264 输出）会写到流里
+                with open(recording.path, "rb") as f:
+                    recording.error = f.read(200).decode("utf-8", errors="replace").strip()
+            recording.first_frame_event.set()
+            recording.done_event.set()
+
+    @staticmethod
+    def _scan_frames(data, arrival, recording):
+        """在数据中查找新帧的起始位置，记录到达时间，返回需要与下一块拼接的尾部"""
+        position = 0
+        while True:
+            index = data.find(START_CODE, position)
+            if index < 0:
+                # 起始码可能跨越两块数据
+                return data[max(position, len(data) - 2):]
+            if index + 4 >= len(data):
+                return data[index:]
+            nal_type = data[index + 3] & 0x1F
+            # first_mb_in_slice 为 ue(v) 编码的 0 时首位为 1，表示新的一帧
+            if nal_type in SLICE_NAL_TYPES and data[index + 4] & 0x80:
+                recording.frame_times.append(arrival)
+                recording.first_frame_event.set()
+            position = index + 3
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""录制会话目录（SQLite）
+
+每次测量的信息原来只存在于日志和文件名中，查找历史录制只能扫描目录。SessionCatalog 在配置
+目录下的 sessions.db 中为每次测量记录一行（文件名、设备序列号、摄像头模式、实际帧率、丢帧数、
+触发偏差、文件路径和大小），并关联随后同步到本地的 Payload 文件；常用查询条件都有索引。
+
+命令行用法:
+    python session_catalog.py list [--name 关键字] [--serial 序列号] [--since 2025-01-01] [--limit 50]
+    python session_catalog.py show <会话ID>
+"""
+import argparse
+import os
+import platform
+import sqlite3
+import threading
+from datetime import datetime
+
+CATALOG_NAME = "sessions.db"
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    device_serial TEXT,
+    camera_index INTEGER,
+    width INTEGER,
+    height INTEGER,
+    requested_fps REAL,
+    camera_fps REAL,
+    actual_fps REAL,
+    frames INTEGER,
+    dropped_frames INTEGER,
+    duration_s REAL,
+    trigger_method TEXT,
+    trigger_skew_ms REAL,
+    video_path TEXT,
+    video_size INTEGER,
+    source_video TEXT,
+    metadata_path TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_name ON sessions(name);
+CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions(created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_serial ON sessions(device_serial, created_at);
+
+CREATE TABLE IF NOT EXISTS payload_files (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    size INTEGER,
+    synced_at TEXT,
+    PRIMARY KEY (session_id, path)
+);
+CREATE INDEX IF NOT EXISTS idx_payload_path ON payload_files(path);
+"""
+
+# sessions 表中可由 add_session 写入的列
+SESSION_COLUMNS = (
+    "name", "created_at", "device_serial", "camera_index", "width", "height",
+    "requested_fps", "camera_fps", "actual_fps", "frames", "dropped_frames", "duration_s",
+    "trigger_method", "trigger_skew_ms", "video_path", "video_size", "source_video", "metadata_path",
+)
+
+
+def app_config_dir():
+    """应用配置目录，兼容Windows和Mac（不存在时创建）"""
+    system = platform.system()
+    if system == "Windows":
+        config_dir = os.path.join(os.path.expanduser("~"), "Documents", "AndroidControlApp")
+    elif system == "Darwin":
+        config_dir = os.path.join(os.path.expanduser("~"), "Library", "Application Support", "AndroidControlApp")
+    else:
+        config_dir = os.path.join(os.path.expanduser("~"), ".config", "AndroidControlApp")
+    os.makedirs(config_dir, exist_ok=True)
+    return config_dir
+
+
+def default_catalog_path():
+    return os.path.join(app_config_dir(), CATALOG_NAME)
+
+
+class SessionCatalog:
+    """录制会话目录，可在多个线程中共享"""
+
+    def __init__(self, path=None):
+        self.path = path or default_catalog_path()
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def add_session(self, record):
+        """写入一次测量，返回会话ID；record 中未知的键被忽略"""
+        record = dict(record)
+        record.setdefault("created_at", datetime.now().isoformat(timespec="seconds"))
+        columns = [c for c in SESSION_COLUMNS if record.get(c) is not None]
+        placeholders = ", ".join("?" for _ in columns)
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                f"INSERT INTO sessions ({', '.join(columns)}) VALUES ({placeholders})",
+                [record[c] for c in columns])
+            return cursor.lastrowid
+
+    def add_payload_files(self, session_id, files):
+        """关联 Payload 文件，files 为 [(路径, 大小)]"""
+        synced_at = datetime.now().isoformat(timespec="seconds")
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO payload_files (session_id, path, size, synced_at) VALUES (?, ?, ?, ?)",
+                [(session_id, path, size, synced_at) for path, size in files])
+
+    def find(self, name=None, serial=None, since=None, until=None, limit=50):
+        """按条件查询会话（新的在前），返回 sqlite3.Row 列表
+
+        name 为文件名包含的关键字；since/until 为 ISO 日期或时间字符串。
+        """
+        clauses, params = [], []
+        if name:
+            clauses.append("s.name LIKE ?")
+            params.append(f"%{name}%")
+        if serial:
+            clauses.append("s.device_serial = ?")
+            params.append(serial)
+        if since:
+            clauses.append("s.created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("s.created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (f"SELECT s.*, (SELECT COUNT(*) FROM payload_files p WHERE p.session_id = s.id) AS payload_count "
+                 f"FROM sessions s {where} ORDER BY s.created_at DESC, s.id DESC LIMIT ?")
+        with self._lock:
+            return self.conn.execute(query, params + [limit]).fetchall()
+
+    def get(self, session_id):
+        """返回 (会话, Payload 文件列表)，不存在时会话为 None"""
+        with self._lock:
+            session = self.conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            payloads = self.conn.execute(
+                "SELECT path, size, synced_at FROM payload_files WHERE session_id = ? ORDER BY path",
+                (session_id,)).fetchall()
+        return session, payloads
+
+
+def _format_value(value, digits=1):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.{digits}f}"
+    return str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录制会话目录")
+    parser.add_argument("--db", default=None, help=f"数据库路径（默认为配置目录下的 {CATALOG_NAME}）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="列出会话")
+    list_parser.add_argument("--name", help="文件名包含的关键字")
+    list_parser.add_argument("--serial", help="设备序列号")
+    list_parser.add_argument("--since", help="起始时间（ISO 格式，如 2025-01-01）")
+    list_parser.add_argument("--until", help="结束时间（不含）")
+    list_parser.add_argument("--limit", type=int, default=50)
+
+    show_parser = subparsers.add_parser("show", help="显示会话详情")
+    show_parser.add_argument("session_id", type=int)
+    args = parser.parse_args()
+
+    catalog = SessionCatalog(args.db)
+    try:
+        if args.command == "list":
+            rows = catalog.find(args.name, args.serial, args.since, args.until, args.limit)
+            print(f"{'ID':>5}  {'时间':19}  {'文件名':40}  {'设备':20}  {'帧率':>6}  {'丢帧':>4}  {'偏差ms':>7}  Payload")
+            for row in rows:
+                print(f"{row['id']:>5}  {row['created_at']:19}  {row['name']:40}  "
+                      f"{_format_value(row['device_serial']):20}  {_format_value(row['actual_fps']):>6}  "
+                      f"{_format_value(row['dropped_frames']):>4}  {_format_value(row['trigger_skew_ms']):>7}  "
+                      f"{row['payload_count']}")
+            print(f"共 {len(rows)} 条")
+        else:
+            session, payloads = catalog.get(args.session_id)
+            if session is None:
+                print(f"会话 {args.session_id} 不存在")
+                return
+            for key in session.keys():
+                print(f"{key:16} {_format_value(session[key], 3)}")
+            print(f"Payload 文件 ({len(payloads)}):")
+            for payload in payloads:
+                print(f"  {payload['path']}  {_format_value(payload['size'])} 字节  {payload['synced_at']}")
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""常驻 adb shell 会话与设备触发
+
+每次触发都新开 `adb shell input text s` 既要在主机端启动进程，又要在设备端冷启动
+app_process（input 命令是一个 Java 程序），延迟高达数百毫秒且波动大。
+
+ShellSession 在连接设备时打开一个长期存在的 shell，之后的命令直接写入该会话；
+DeviceTrigger 在此基础上优先使用预先生成的 sendevent 序列直接写入输入设备节点，
+按键事件几乎立即生效，不可用时依次回退到会话内 input 命令、独立 shell 服务。
+"""
+import collections
+import re
+import threading
+import time
+
+from adb_client import AdbError, AdbConnectionError
+from lazy_import import lazy_module
+
+statistics = lazy_module('statistics')
+
+# Linux 输入事件常量
+EV_SYN = 0
+EV_KEY = 1
+SYN_REPORT = 0
+KEY_S = 31
+
+# 触发方式（按延迟从低到高）
+TRIGGER_SENDEVENT = "sendevent"
+TRIGGER_SESSION_INPUT = "session-input"
+TRIGGER_SPAWN = "spawn"
+TRIGGER_METHODS = (TRIGGER_SENDEVENT, TRIGGER_SESSION_INPUT, TRIGGER_SPAWN)
+
+_DEVICE_LINE = re.compile(r"^add device \d+: (\S+)")
+_EVENT_TYPE_LINE = re.compile(r"^\s+([A-Z]+) \(([0-9a-fA-F]{4})\):(.*)$")
+_HEX_CODES_LINE = re.compile(r"^\s+((?:[0-9a-fA-F]{4}\*?\s*)+)$")
+
+
+class ShellSession:
+    """设备上长期存在的 shell 会话，命令通过同一条连接顺序执行"""
+
+    def __init__(self, client, serial=None):
+        self.client = client
+        self.serial = serial
+        self.conn = None
+        self._buffer = b""
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self):
+        return self.conn is not None and not self.conn.closed
+
+    def open(self, timeout=10):
+        """打开会话（shell:sh，无伪终端）"""
+        self.close()
+        self.conn = self.client.open_service(self.serial, "shell:sh", timeout)
+        self._buffer = b""
+        # 确认会话可用
+        self.run("true", timeout=timeout)
+        return self
+
+    def write(self, command):
+        """只写入命令，不等待结果（最低延迟）"""
+        if not self.alive:
+            raise AdbConnectionError("shell 会话未打开")
+        with self._lock:
+            self.conn.sendall((command + "\n").encode("utf-8"))
+
+    def run(self, command, timeout=10):
+        """执行命令并等待完成，返回 (returncode, 输出文本)"""
+        if not self.alive:
+            raise AdbConnectionError("shell 会话未打开")
+        with self._lock:
+            self._counter += 1
+            marker = f"__RC{self._counter}__"
+            try:
+                self.conn.settimeout(timeout)
+                # 结束标记前先输出一个换行，输出不以换行结尾（如 printf abc）时标记仍在单独一行
+                self.conn.sendall(f"{command}\nprintf '\\n%s%d\\n' {marker} $?\n".encode("utf-8"))
+                output = []
+                while True:
+                    line = self._read_line()
+                    if line.startswith(marker):
+                        if output and not output[-1]:
+                            output.pop()  # 标记前补的换行
+                        return int(line[len(marker):] or 0), "\n".join(output)
+                    if marker not in line:  # 兼容带回显的旧版 adbd
+                        output.append(line)
+            except AdbError:
+                self.close()
+                raise
+
+    def _read_line(self):
+        while b"\n" not in self._buffer:
+            chunk = self.conn.recv()
+            if not chunk:
+                raise AdbConnectionError("shell 会话已关闭")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.decode("utf-8", errors="replace").rstrip("\r")
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.sendall(b"exit\n")
+            except AdbError:
+                pass
+            self.conn.close()
+            self.conn = None
+
+
+def parse_getevent(output):
+    """解析 `getevent -p` 输出，返回 {设备节点: 支持的按键码集合}"""
+    devices = {}
+    current = None
+    in_key_section = False
+    for line in output.splitlines():
+        match = _DEVICE_LINE.match(line)
+        if match:
+            current = match.group(1)
+            devices[current] = set()
+            in_key_section = False
+            continue
+        if current is None:
+            continue
+        match = _EVENT_TYPE_LINE.match(line)
+        if match:
+            in_key_section = int(match.group(2), 16) == EV_KEY
+            codes = match.group(3)
+        elif in_key_section and _HEX_CODES_LINE.match(line):
+            codes = line
+        else:
+            in_key_section = False
+            continue
+        if in_key_section:
+            for token in codes.split():
+                devices[current].add(int(token.rstrip("*"), 16))
+    return devices
+
+
+def build_sendevent_sequence(device_node, key_code):
+    """生成一次按键（按下+抬起）的 sendevent 命令序列"""
+    events = [
+        (EV_KEY, key_code, 1), (EV_SYN, SYN_REPORT, 0),
+        (EV_KEY, key_code, 0), (EV_SYN, SYN_REPORT, 0),
+    ]
+    return ";".join(f"sendevent {device_node} {t} {c} {v}" for t, c, v in events)
+
+
+class TriggerStats:
+    """按触发方式统计延迟（毫秒）"""
+
+    def __init__(self, history=200):
+        self.samples = collections.defaultdict(lambda: collections.deque(maxlen=history))
+
+    def add(self, method, latency_ms):
+        self.samples[method].append(latency_ms)
+
+    def describe(self, method):
+        values = list(self.samples.get(method, ()))
+        if not values:
+            return f"{method}: 无数据"
+        return (f"{method}: 最近 {values[-1]:.1f} ms, 中位数 {statistics.median(values):.1f} ms, "
+                f"最小 {min(values):.1f} ms, 最大 {max(values):.1f} ms (n={len(values)})")
+
+    def summary(self):
+        return [self.describe(method) for method in TRIGGER_METHODS if self.samples.get(method)]
+
+
+class DeviceTrigger:
+    """设备按键触发器：常驻会话 + 预生成 sendevent 序列"""
+
+    def __init__(self, client, serial=None, key_code=KEY_S, text="s",
+                 preferred_method="auto", log=print):
+        self.client = client
+        self.serial = serial
+        self.key_code = key_code
+        self.text = text
+        self.preferred_method = preferred_method
+        self.log = log
+        self.session = ShellSession(client, serial)
+        self.sendevent_command = None
+        self.stats = TriggerStats()
+
+    def prepare(self):
+        """打开常驻会话并探测可用的触发方式"""
+        try:
+            self.session.open()
+            # 空命令往返延迟即会话的基础开销
+            start = time.perf_counter()
+            self.session.run("true")
+            self.log(f"✓ 常驻shell会话已打开 (往返 {(time.perf_counter() - start) * 1000:.1f} ms)")
+        except AdbError as e:
+            self.log(f"⚠ 无法打开常驻shell会话，将使用独立shell触发: {e}")
+            return
+
+        if self.preferred_method in ("auto", TRIGGER_SENDEVENT):
+            self.sendevent_command = self.detect_sendevent()
+
+    def detect_sendevent(self):
+        """查找支持目标按键的输入设备，生成 sendevent 序列"""
+        try:
+            returncode, output = self.session.run("getevent -p", timeout=10)
+        except AdbError as e:
+            self.log(f"⚠ getevent 执行失败: {e}")
+            return None
+        if returncode != 0:
+            return None
+        for device_node, key_codes in sorted(parse_getevent(output).items()):
+            if self.key_code in key_codes:
+                self.log(f"✓ 触发按键将通过 sendevent 写入 {device_node}")
+                return build_sendevent_sequence(device_node, self.key_code)
+        self.log("注意: 没有输入设备支持该按键，sendevent 不可用，改用会话内 input 命令")
+        return None
+
+    def available_methods(self):
+        methods = []
+        if self.session.alive and self.sendevent_command:
+            methods.append(TRIGGER_SENDEVENT)
+        if self.session.alive:
+            methods.append(TRIGGER_SESSION_INPUT)
+        methods.append(TRIGGER_SPAWN)
+        if self.preferred_method in methods:
+            methods.remove(self.preferred_method)
+            methods.insert(0, self.preferred_method)
+        return methods
+
+    def fire(self, timeout=10, trace=None):
+        """发送一次按键，返回 (触发方式, 延迟毫秒)；全部方式失败时抛出 AdbError
+
+        trace 为 tracing.Tracer 时把每次尝试记录为一个区间（spawn 方式为启动新的 adb shell）。
+        """
+        last_error = None
+        for method in self.available_methods():
+            span = "adb_spawn" if method == TRIGGER_SPAWN else "key_injection"
+            start = time.perf_counter()
+            try:
+                if method == TRIGGER_SENDEVENT:
+                    returncode, output = self.session.run(self.sendevent_command, timeout)
+                elif method == TRIGGER_SESSION_INPUT:
+                    returncode, output = self.session.run(f"input text {self.text}", timeout)
+                else:
+                    result = self.client.shell(self.serial, f"input text {self.text}", timeout)
+                    returncode, output = result.returncode, result.stdout + result.stderr
+            except AdbError as e:
+                last_error = e
+                if trace:
+                    trace.add(span, start, time.perf_counter(), "device", method=method, error=str(e))
+                self.log(f"⚠ 触发方式 {method} 失败: {e}")
+                continue
+            end = time.perf_counter()
+            latency_ms = (end - start) * 1000.0
+            if trace:
+                trace.add(span, start, end, "device", method=method, returncode=returncode)
+            if returncode != 0:
+                last_error = AdbError(output.strip() or f"返回码 {returncode}")
+                self.log(f"⚠ 触发方式 {method} 返回错误: {last_error}")
+                if method == TRIGGER_SENDEVENT:
+                    self.sendevent_command = None  # 权限不足等情况，后续不再尝试
+                continue
+            self.stats.add(method, latency_ms)
+            return method, latency_ms
+        raise last_error or AdbError("没有可用的触发方式")
+
+    def close(self):
+        self.session.close()
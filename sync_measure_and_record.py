@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import subprocess
-import sys
 import time
 import os
 import platform
@@ -11,11 +10,74 @@ import queue
 import glob
 import shutil
 from datetime import datetime
-import cv2
-from PIL import Image, ImageTk
 import json
-import zipfile
 import stat
+import hashlib
+import zlib
+from lazy_import import lazy_module
+from adb_client import AdbClient, AdbError, AdbTimeoutError
+from device_tracker import DeviceTracker, describe_state, STATE_DEVICE, STATE_UNAUTHORIZED
+from link_monitor import LinkDownError, LINK_DOWN
+from scrcpy_supervisor import (ScrcpySupervisor, profile_arguments, DEFAULT_PROFILES, DEFAULT_PROFILE,
+                               DEFAULT_CAPTURE_PROFILE)
+from payload_sync import format_bytes
+from session_catalog import app_config_dir
+from measurement_session import (MeasurementSession, MeasurementError, format_take_name, next_take_number,
+                                 open_catalog, TAKE_TIMEOUT)
+from task_manager import DeviceTaskManager, TaskRejectedError, TaskTimeoutError
+from preview_pipeline import FrameSlot, FpsMeter, PreviewRenderer, PREVIEW_POLL_MS
+from frame_tap import FrameTapReader
+from log_pipeline import LogPipeline, TextLogView, DEFAULT_MAX_LINES
+from metrics import start_metrics_server, DEFAULT_METRICS_PORT
+from tracing import clock as trace_clock
+from ui_state import UiStateBus, STATUS, BUTTON, CAMERA_LIST, PROGRESS, UI_TICK_MS
+
+# 重量级模块延迟到首次使用（预览/检测/录制/解压）时才导入，缩短冷启动时间
+cv2 = lazy_module('cv2')
+zipfile = lazy_module('zipfile')
+
+# platform-tools 解压目录及安装清单
+PLATFORM_TOOLS_DIR = "platform-tools"
+PLATFORM_TOOLS_MANIFEST = os.path.join(PLATFORM_TOOLS_DIR, ".install_manifest.json")
+TOOLS_MANIFEST_VERSION = 1
+
+# 后台设备任务的截止时间（秒，包括排队等待同一设备上其他任务的时间）
+CHECK_TASK_TIMEOUT = 40
+CONNECT_TASK_TIMEOUT = 30
+DISCONNECT_TASK_TIMEOUT = 20
+MEASURE_TASK_TIMEOUT = 30
+
+# 触发前切换到录制期间镜像配置的最长等待时间，以及 scrcpy 重新显示画面后的稳定时间（秒）
+CAPTURE_PROFILE_TIMEOUT = 8.0
+CAPTURE_PROFILE_SETTLE = 0.3
+RECONFIGURE_TASK_TIMEOUT = 600
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_crc32(path, chunk_size=1024 * 1024):
+    """计算文件的CRC32（与zip成员记录的校验值一致）"""
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc & 0xFFFFFFFF
+
+
+def file_matches_stat(path, entry):
+    """文件大小和修改时间是否与清单记录一致"""
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return False
+    return file_stat.st_size == entry['size'] and file_stat.st_mtime_ns == entry['mtime_ns']
 
 class AndroidControlApp:
     def __init__(self, root):
@@ -23,30 +85,59 @@ class AndroidControlApp:
         self.root.title("Android 设备控制与录制")
         self.root.geometry("1200x800")  # 增大窗口以容纳预览
         
-        # 日志队列用于线程间通信
-        self.log_queue = queue.Queue()
+        # 日志：控制台和滚动日志文件在后台线程中写入，界面定时批量显示
+        self.log_pipeline = LogPipeline(os.path.join(app_config_dir(), "logs", "app.log")).start()
+        self.log_view = None
+        self.log_max_lines = DEFAULT_MAX_LINES  # 日志控件保留的行数
+        
+        # 后台任务交回的界面操作，在Tk主线程中执行
+        self.ui_queue = queue.Queue()
+        
+        # 后台线程发布的界面状态（状态栏、按钮、摄像头列表、进度），Tk主线程按键合并后应用
+        self.ui_state = UiStateBus(log=self.log)
         
-        # 录制子进程
-        self.record_process = None
-        self.camera_ready = False  # 摄像头是否已准备就绪
+        # 设备操作和外部命令在同一个后台事件循环中执行（串行化同一设备、限制并发、可取消）
+        self.tasks = DeviceTaskManager(dispatch=self.ui, log=self.log).start()
         
         # 预览相关
         self.preview_cap = None
         self.preview_active = False
         self.preview_thread = None
+        self.preview_slot = FrameSlot()  # 采集线程只保留最新一帧，Tk 主线程定时取走显示
+        self.preview_capture_fps = FpsMeter()
+        self.preview_renderer = None
+        self.preview_timer = None
+        self.preview_tap = None  # 录制进程占用摄像头时，从共享内存读取录制画面（见 frame_tap）
+        self.preview_last_frame = None  # 最近一次显示画面的时间
         
         # 文件名组件（先设置默认值，后面会从配置文件读取）
         self.filename_parts = ["AnuraMMA-5-MMA0V7230924002", "0000027", "1"]
-        self.last_recorded_video = None  # 最后录制的视频文件路径
         
         # ADB工具路径
         self.adb_path = None
         self.adb_ready = False
+        self.adb_client = None  # ADB服务器协议客户端（复用连接，避免每次启动adb子进程）
+        self.device_tracker = None  # host:track-devices 设备状态跟踪
+        
+        # 测量设置（设备、摄像头子进程和每次测量的状态由 MeasurementSession 管理）
+        self.trigger_method = "auto"  # auto / sendevent / session-input / spawn
+        self.trigger_compensation = False  # 是否按学习到的延迟推迟较快的一侧
+        self.payload_transfer_method = "auto"  # auto / tar / pull
+        self.payload_watch = True  # 连接设备后是否在后台自动同步 Payload
+        self.video_handoff = "auto"  # auto / rename / hardlink / reflink / copy
+        self.link_monitoring = True  # 连接设备后是否在后台监测链路并自动重连
+        self.screen_recording = False  # 测量时是否同时录制设备屏幕
+        self.metrics_port = DEFAULT_METRICS_PORT  # Prometheus 指标端口（0 表示不启动）
+        self.metrics_server = None
         
         # scrcpy工具路径和状态
         self.scrcpy_path = None
         self.scrcpy_ready = False
-        self.scrcpy_process = None  # scrcpy进程
+        self.scrcpy_supervisor = None  # scrcpy进程监管（读取输出、意外退出后自动重启）
+        self.scrcpy_device = None  # 镜像的设备（切换镜像配置时重启用）
+        self.scrcpy_profiles = dict(DEFAULT_PROFILES)  # 镜像配置名称 -> scrcpy 参数
+        self.scrcpy_profile = DEFAULT_PROFILE  # 平时使用的镜像配置
+        self.scrcpy_capture_profile = DEFAULT_CAPTURE_PROFILE  # 测量录制期间使用的镜像配置
         
         # 摄像头选择
         self.available_cameras = []
@@ -58,6 +149,20 @@ class AndroidControlApp:
         # 从配置文件加载设置
         self.load_config()
         
+        # 测量流程（连接设备、摄像头子进程、触发、交接视频、写入元数据），界面只负责更新控件
+        self.session = MeasurementSession(
+            self.get_adb_client, log=self.log,
+            name_provider=self.get_formatted_filename,
+            on_take_saved=self.on_take_saved,
+            trigger_method=self.trigger_method,
+            trigger_compensation=self.trigger_compensation,
+            payload_transfer_method=self.payload_transfer_method,
+            payload_watch=self.payload_watch,
+            video_handoff=self.video_handoff,
+            link_monitoring=self.link_monitoring,
+            on_link_change=self.on_link_change,
+            screen_recording=self.screen_recording)
+        
         # 自动配置ADB工具
         self.setup_adb_tools()
         
@@ -67,38 +172,30 @@ class AndroidControlApp:
         # 设置UI
         self.setup_ui()
         
-        # 检测摄像头并更新列表
-        self.detect_cameras()
-        self.update_camera_list()
+        # 打开录制会话目录
+        self.open_session_catalog()
+        
+        # 在本机提供 Prometheus 指标（/metrics、/metrics.json）
+        self.metrics_server = start_metrics_server(self.metrics_port, log=self.log)
+        
+        # 检测摄像头并更新列表（推迟到窗口显示之后，避免OpenCV导入和摄像头探测阻塞启动）
+        self.root.after(100, self.refresh_cameras_on_startup)
         
         # 检查依赖
         self.check_dependencies()
         
         # 启动日志更新线程
         self.update_logs()
+        self.process_ui_queue()
+        self.apply_ui_state()
+        self.update_link_status()
         
         # 设置窗口关闭事件处理
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
     def get_config_path(self):
-        """获取配置文件路径，兼容Windows和Mac"""
-        system = platform.system()
-        
-        if system == "Windows":
-            # Windows: 使用用户文档目录
-            config_dir = os.path.join(os.path.expanduser("~"), "Documents", "AndroidControlApp")
-        elif system == "Darwin":  # macOS
-            # macOS: 使用用户应用支持目录
-            config_dir = os.path.join(os.path.expanduser("~"), "Library", "Application Support", "AndroidControlApp")
-        else:  # Linux 和其他
-            # Linux: 使用 .config 目录
-            config_dir = os.path.join(os.path.expanduser("~"), ".config", "AndroidControlApp")
-        
-        # 确保配置目录存在
-        if not os.path.exists(config_dir):
-            os.makedirs(config_dir)
-            
-        return os.path.join(config_dir, "config.json")
+        """获取配置文件路径，兼容Windows和Mac（目录见 session_catalog.app_config_dir）"""
+        return os.path.join(app_config_dir(), "config.json")
         
     def load_config(self):
         """从配置文件加载设置"""
@@ -119,6 +216,35 @@ class AndroidControlApp:
                 
                 # 加载摄像头索引配置
                 self.saved_camera_index = config.get('camera_index', 0)
+                
+                # 加载触发方式配置
+                self.trigger_method = config.get('trigger_method', 'auto')
+                self.trigger_compensation = config.get('trigger_compensation', False)
+                
+                # 加载 Payload 传输方式配置
+                self.payload_transfer_method = config.get('payload_transfer_method', 'auto')
+                self.payload_watch = config.get('payload_watch', True)
+                
+                # 加载录制视频交接方式配置
+                self.video_handoff = config.get('video_handoff', 'auto')
+                
+                # 加载链路监测配置
+                self.link_monitoring = config.get('link_monitoring', True)
+                
+                # 加载设备屏幕录制配置
+                self.screen_recording = config.get('screen_recording', False)
+                
+                # 加载指标服务端口配置（0 表示不启动）
+                self.metrics_port = config.get('metrics_port', DEFAULT_METRICS_PORT)
+                
+                # 加载日志配置（各来源的显示级别，如 {"recorder": "WARNING"}）
+                self.log_pipeline.set_levels(config.get('log_levels', {}))
+                self.log_max_lines = config.get('log_max_lines', DEFAULT_MAX_LINES)
+                
+                # 加载屏幕镜像配置（配置文件中的同名配置覆盖默认值）
+                self.scrcpy_profiles.update(config.get('scrcpy_profiles', {}))
+                self.scrcpy_profile = config.get('scrcpy_profile', DEFAULT_PROFILE)
+                self.scrcpy_capture_profile = config.get('scrcpy_capture_profile', DEFAULT_CAPTURE_PROFILE)
             else:
                 self.log("配置文件不存在，使用默认设置")
                 self.saved_device_ip = '192.168.1.100'
@@ -144,12 +270,33 @@ class AndroidControlApp:
             if hasattr(self, 'camera_var') and self.available_cameras:
                 camera_index = self.get_selected_camera_index()
             
-            config = {
+            # 保留界面不管理的设置（如 rig_scheduler 使用的 rigs）
+            config = {}
+            if os.path.exists(self.config_file):
+                try:
+                    with open(self.config_file, 'r', encoding='utf-8') as f:
+                        config = json.load(f)
+                except ValueError:
+                    config = {}
+            config.update({
                 'filename_parts': self.filename_parts,
                 'device_ip': device_ip,
                 'camera_index': camera_index,
+                'trigger_method': self.trigger_method,
+                'trigger_compensation': self.trigger_compensation,
+                'payload_transfer_method': self.payload_transfer_method,
+                'payload_watch': self.payload_watch,
+                'video_handoff': self.video_handoff,
+                'link_monitoring': self.link_monitoring,
+                'screen_recording': self.screen_recording,
+                'metrics_port': self.metrics_port,
+                'log_levels': self.log_pipeline.level_names(),
+                'log_max_lines': self.log_max_lines,
+                'scrcpy_profiles': self.scrcpy_profiles,
+                'scrcpy_profile': self.scrcpy_profile,
+                'scrcpy_capture_profile': self.scrcpy_capture_profile,
                 'last_updated': datetime.now().isoformat()
-            }
+            })
             
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=2)
@@ -161,18 +308,12 @@ class AndroidControlApp:
             
     def get_formatted_filename(self):
         """获取格式化的文件名：前缀_编号-后缀"""
-        if len(self.filename_parts) >= 3:
-            # 前缀后面用下划线，其他地方用破折号
-            return f"{self.filename_parts[0]}_{self.filename_parts[1]}-{self.filename_parts[2]}"
-        else:
-            # 兼容旧格式
-            return "-".join(self.filename_parts)
+        return format_take_name(self.filename_parts)
             
     def increment_filename_number(self):
         """增加文件名编号并保存配置"""
         try:
-            current = int(self.filename_parts[1])
-            new_number = f"{current + 1:07d}"  # 保持7位数字格式
+            new_number = next_take_number(self.filename_parts[1])  # 保持7位数字格式
             self.filename_parts[1] = new_number
             
             # 更新UI显示
@@ -188,8 +329,12 @@ class AndroidControlApp:
         except ValueError:
             self.log("错误: 文件名编号格式无效，无法自动递增")
             
-    def setup_adb_tools(self):
-        """自动配置ADB工具"""
+    def setup_adb_tools(self, deep_verify=False):
+        """自动配置ADB工具
+        
+        deep_verify=True 时逐个校验已解压文件的CRC并重新执行 adb version，
+        否则只比较清单中记录的文件大小和修改时间。
+        """
         self.log("正在配置ADB工具...")
         
         try:
@@ -214,39 +359,26 @@ class AndroidControlApp:
                 self.log(f"错误: 找不到ADB工具包 {zip_file}")
                 return False
             
-            # 创建platform-tools目录
-            tools_dir = "platform-tools"
-            if os.path.exists(tools_dir):
-                self.log("platform-tools目录已存在，检查是否需要更新...")
-                # 检查ADB是否已经存在且可用
-                potential_adb_path = os.path.join(tools_dir, adb_executable)
-                if os.path.exists(potential_adb_path) and self.test_adb_executable(potential_adb_path):
-                    self.adb_path = os.path.abspath(potential_adb_path)
-                    self.adb_ready = True
-                    self.log(f"✓ ADB工具已就绪: {self.adb_path}")
-                    return True
-                else:
-                    self.log("现有ADB工具不可用，重新解压...")
-                    shutil.rmtree(tools_dir)
-            
-            # 解压ADB工具包
-            self.log(f"正在解压 {zip_file}...")
-            with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                zip_ref.extractall('.')
-                self.log("✓ ADB工具包解压完成")
+            # 按安装清单同步platform-tools目录（只重写缺失或变化的文件）
+            manifest = self.sync_platform_tools(zip_file, deep_verify)
             
             # 设置ADB可执行文件路径
-            self.adb_path = os.path.abspath(os.path.join(tools_dir, adb_executable))
+            self.adb_path = os.path.abspath(os.path.join(PLATFORM_TOOLS_DIR, adb_executable))
+            if not os.path.exists(self.adb_path):
+                self.log(f"✗ 工具包中未找到 {adb_executable}")
+                return False
             
             # 在macOS/Linux上设置执行权限
-            if system in ["Darwin", "Linux"]:
+            if system in ["Darwin", "Linux"] and not os.access(self.adb_path, os.X_OK):
                 self.log("设置ADB可执行权限...")
                 os.chmod(self.adb_path, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
                 self.log("✓ 可执行权限设置完成")
             
-            # 测试ADB是否可用
-            if self.test_adb_executable(self.adb_path):
+            # 测试ADB是否可用（同一二进制的测试结果会被缓存）
+            if self.test_adb_executable(self.adb_path, manifest, use_cache=not deep_verify):
+                self.adb_client = AdbClient(adb_path=self.adb_path)
                 self.adb_ready = True
+                self.start_device_tracker()
                 self.log(f"✓ ADB工具配置成功: {self.adb_path}")
                 return True
             else:
@@ -257,14 +389,142 @@ class AndroidControlApp:
             self.log(f"配置ADB工具时发生错误: {str(e)}")
             return False
             
-    def test_adb_executable(self, adb_path):
-        """测试ADB可执行文件是否正常工作"""
+    def load_tools_manifest(self):
+        """读取platform-tools安装清单，不存在或损坏时返回None"""
+        try:
+            with open(PLATFORM_TOOLS_MANIFEST, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == TOOLS_MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return None
+        
+    def save_tools_manifest(self, manifest):
+        """原子写入platform-tools安装清单"""
+        tmp_path = PLATFORM_TOOLS_MANIFEST + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, PLATFORM_TOOLS_MANIFEST)
+        
+    def sync_platform_tools(self, zip_file, deep_verify=False):
+        """根据清单同步platform-tools目录，返回最新的清单
+        
+        快速路径只做stat比较（压缩包和每个已解压文件的大小/修改时间），
+        不启动任何子进程；只有缺失或内容变化的成员才会被重新解压。
+        """
+        manifest = self.load_tools_manifest()
+        zip_stat = os.stat(zip_file)
+        zip_signature = [zip_stat.st_size, zip_stat.st_mtime_ns]
+        
+        same_zip_stat = (manifest is not None and manifest.get('zip') == zip_file
+                         and manifest.get('zip_stat') == zip_signature)
+        
+        if same_zip_stat and not deep_verify:
+            stale = [name for name, info in manifest['files'].items()
+                     if not file_matches_stat(name, info)]
+            if not stale:
+                self.log("✓ platform-tools与安装清单一致，跳过解压")
+                return manifest
+            self.log(f"安装清单中有 {len(stale)} 个文件缺失或已变化，正在校验...")
+            zip_sha256 = manifest['zip_sha256']
+        else:
+            zip_sha256 = file_digest(zip_file)
+            stale = None
+            
+        # 压缩包内容未变化时，只需检查stat不一致的文件；否则全部成员都需比对
+        if (manifest is not None and manifest.get('zip_sha256') == zip_sha256
+                and stale is not None and not deep_verify):
+            check_names = set(stale)
+        else:
+            check_names = None
+            self.log(f"正在比对 {zip_file} 与已解压文件...")
+            
+        old_files = manifest['files'] if manifest else {}
+        files = {}
+        rewritten = []
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+            for info in zip_ref.infolist():
+                if info.is_dir():
+                    continue
+                name = info.filename
+                if check_names is not None and name not in check_names and name in old_files:
+                    files[name] = old_files[name]
+                    continue
+                    
+                if not (os.path.isfile(name) and os.path.getsize(name) == info.file_size
+                        and file_crc32(name) == info.CRC):
+                    zip_ref.extract(info, '.')
+                    # 恢复压缩包中记录的Unix权限位（可执行文件）
+                    mode = (info.external_attr >> 16) & 0o777
+                    if mode and platform.system() != "Windows":
+                        os.chmod(name, mode)
+                    rewritten.append(name)
+                    
+                file_stat = os.stat(name)
+                files[name] = {
+                    'size': file_stat.st_size,
+                    'mtime_ns': file_stat.st_mtime_ns,
+                    'crc32': info.CRC,
+                    'sha256': (old_files[name]['sha256']
+                               if name in old_files and name not in rewritten
+                               and old_files[name].get('crc32') == info.CRC
+                               else file_digest(name)),
+                }
+                
+        # 删除旧版本工具包中存在、新版本中已移除的文件
+        for name in set(old_files) - set(files):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+                
+        if rewritten:
+            self.log(f"✓ 已重新解压 {len(rewritten)} 个文件")
+        else:
+            self.log("✓ 已解压文件均与压缩包一致")
+            
+        manifest = {
+            'version': TOOLS_MANIFEST_VERSION,
+            'zip': zip_file,
+            'zip_sha256': zip_sha256,
+            'zip_stat': zip_signature,
+            'files': files,
+            'adb_checks': manifest.get('adb_checks', {}) if manifest else {},
+        }
+        self.save_tools_manifest(manifest)
+        return manifest
+            
+    def test_adb_executable(self, adb_path, manifest=None, use_cache=True):
+        """测试ADB可执行文件是否正常工作
+        
+        测试结果按二进制文件的SHA-256缓存在安装清单中，同一二进制不再重复启动子进程。
+        """
+        binary_hash = None
+        if manifest is not None:
+            rel_path = os.path.relpath(adb_path).replace(os.sep, '/')
+            entry = manifest['files'].get(rel_path)
+            if entry and file_matches_stat(rel_path, entry):
+                binary_hash = entry['sha256']
+            else:
+                binary_hash = file_digest(adb_path)
+                
+            cached = manifest.get('adb_checks', {}).get(binary_hash)
+            if use_cache and cached:
+                self.log(f"ADB版本: {cached['version']} (缓存)")
+                return True
+                
         try:
-            result = subprocess.run([adb_path, 'version'], 
-                                  capture_output=True, text=True, timeout=10)
+            result = self.tasks.run_process_sync([adb_path, 'version'], timeout=10)
             if result.returncode == 0:
                 version_info = result.stdout.strip().split('\n')[0]
                 self.log(f"ADB版本: {version_info}")
+                if binary_hash is not None:
+                    manifest.setdefault('adb_checks', {})[binary_hash] = {
+                        'version': version_info,
+                        'checked_at': datetime.now().isoformat()
+                    }
+                    self.save_tools_manifest(manifest)
                 return True
             else:
                 self.log(f"ADB测试失败: {result.stderr}")
@@ -279,32 +539,67 @@ class AndroidControlApp:
             raise RuntimeError("ADB工具未就绪")
         return [self.adb_path] + list(args)
         
+    def get_adb_client(self):
+        """获取ADB服务器协议客户端（直接与本机adb服务器通信）"""
+        if not self.adb_ready or not self.adb_client:
+            raise RuntimeError("ADB工具未就绪")
+        return self.adb_client
+        
+    def start_device_tracker(self):
+        """与adb服务器保持 track-devices 长连接，设备列表和状态从内存读取，变化时立即处理"""
+        self.stop_device_tracker()
+        self.device_tracker = DeviceTracker(self.adb_client, log=self.log)
+        self.device_tracker.add_listener(self.session.handle_device_state)
+        self.device_tracker.add_listener(self.on_device_state_changed)
+        self.session.device_tracker = self.device_tracker.start()
+        
+    def stop_device_tracker(self):
+        if self.device_tracker:
+            self.device_tracker.stop()
+            self.device_tracker = None
+            self.session.device_tracker = None
+            
+    def on_device_state_changed(self, serial, old, new):
+        """设备状态变化（在跟踪线程中调用）"""
+        if serial != self.session.serial:
+            if old is None or new is None:
+                self.log(f"设备 {serial} {'已连接' if old is None else '已断开'}")
+            elif new == STATE_UNAUTHORIZED:
+                self.log(f"⚠ 设备 {serial} {describe_state(new)}")
+            return
+        if new == STATE_DEVICE:
+            if self.session.camera_ready:
+                self.set_status("设备已恢复在线，摄像头就绪")
+                self.set_button("start", True)
+            else:
+                self.set_status("设备已恢复在线")
+        else:
+            # 当前设备掉线或未授权：立即禁用开始按钮，不必等下一次触发超时
+            self.set_status(f"设备{describe_state(new)}")
+            self.set_button("start", False)
+        
     def reconfigure_adb(self):
         """重新配置ADB工具"""
         self.log("开始重新配置ADB工具...")
         
         def reconfigure_thread():
             try:
-                # 停止当前ADB服务器
-                if self.adb_ready and self.adb_path:
+                # 停止设备状态跟踪和当前ADB服务器
+                self.stop_device_tracker()
+                if self.adb_ready and self.adb_client:
                     try:
-                        kill_cmd = self.get_adb_command('kill-server')
-                        subprocess.run(kill_cmd, capture_output=True, timeout=5)
+                        self.adb_client.kill_server()
                         self.log("已停止现有ADB服务器")
                     except:
                         pass
                 
-                # 删除现有platform-tools目录
-                tools_dir = "platform-tools"
-                if os.path.exists(tools_dir):
-                    self.log("删除现有ADB工具...")
-                    shutil.rmtree(tools_dir)
-                
-                # 重新配置ADB
+                # 重新配置ADB：逐个校验已解压文件，只重写缺失或损坏的文件
+                self.session.close_device()
                 self.adb_ready = False
                 self.adb_path = None
+                self.adb_client = None
                 
-                if self.setup_adb_tools():
+                if self.setup_adb_tools(deep_verify=True):
                     self.log("✓ ADB工具重新配置完成")
                 else:
                     self.log("✗ ADB工具重新配置失败")
@@ -312,7 +607,7 @@ class AndroidControlApp:
             except Exception as e:
                 self.log(f"重新配置ADB时发生错误: {str(e)}")
                 
-        threading.Thread(target=reconfigure_thread, daemon=True).start()
+        self.run_task(reconfigure_thread, key="reconfigure", timeout=RECONFIGURE_TASK_TIMEOUT)
         
     def setup_scrcpy_tools(self):
         """自动配置scrcpy工具"""
@@ -416,15 +711,13 @@ class AndroidControlApp:
         """检查macOS上是否通过brew安装了scrcpy"""
         try:
             # 检查brew是否安装
-            result = subprocess.run(['brew', '--version'], 
-                                  capture_output=True, text=True, timeout=5)
+            result = self.tasks.run_process_sync(['brew', '--version'], timeout=5)
             if result.returncode != 0:
                 self.log("brew未安装，无法自动安装scrcpy")
                 return False
             
             # 检查scrcpy是否已安装
-            result = subprocess.run(['brew', 'list', 'scrcpy'], 
-                                  capture_output=True, text=True, timeout=10)
+            result = self.tasks.run_process_sync(['brew', 'list', 'scrcpy'], timeout=10)
             if result.returncode == 0:
                 # 检查scrcpy是否可用
                 return self.check_scrcpy_system()
@@ -438,8 +731,7 @@ class AndroidControlApp:
         """通过brew安装scrcpy"""
         try:
             self.log("正在通过brew安装scrcpy...")
-            result = subprocess.run(['brew', 'install', 'scrcpy'], 
-                                  capture_output=True, text=True, timeout=300)  # 5分钟超时
+            result = self.tasks.run_process_sync(['brew', 'install', 'scrcpy'], timeout=300)  # 5分钟超时
             
             if result.returncode == 0:
                 self.log("brew安装scrcpy成功")
@@ -449,7 +741,7 @@ class AndroidControlApp:
                 self.log(f"brew安装scrcpy失败: {result.stderr}")
                 return False
                 
-        except subprocess.TimeoutExpired:
+        except TaskTimeoutError:
             self.log("brew安装scrcpy超时")
             return False
         except Exception as e:
@@ -459,8 +751,7 @@ class AndroidControlApp:
     def check_scrcpy_system(self):
         """检查系统是否安装了scrcpy"""
         try:
-            result = subprocess.run(['scrcpy', '--version'], 
-                                  capture_output=True, text=True, timeout=5)
+            result = self.tasks.run_process_sync(['scrcpy', '--version'], timeout=5)
             if result.returncode == 0:
                 version_info = result.stdout.strip().split('\n')[0]
                 self.log(f"scrcpy版本: {version_info}")
@@ -474,8 +765,7 @@ class AndroidControlApp:
     def test_scrcpy_executable(self, scrcpy_path):
         """测试scrcpy可执行文件是否正常工作"""
         try:
-            result = subprocess.run([scrcpy_path, '--version'], 
-                                  capture_output=True, text=True, timeout=10)
+            result = self.tasks.run_process_sync([scrcpy_path, '--version'], timeout=10)
             if result.returncode == 0:
                 version_info = result.stdout.strip().split('\n')[0]
                 self.log(f"scrcpy版本: {version_info}")
@@ -493,6 +783,15 @@ class AndroidControlApp:
             raise RuntimeError("scrcpy工具未就绪")
         return [self.scrcpy_path] + list(args)
         
+    def get_scrcpy_profile_command(self, device_id, profile):
+        """按镜像配置构建scrcpy命令"""
+        if profile not in self.scrcpy_profiles:
+            self.log(f"⚠ 未找到镜像配置 {profile}，使用scrcpy默认参数")
+        arguments = profile_arguments(self.scrcpy_profiles.get(profile, {}))
+        if device_id:
+            return self.get_scrcpy_command('-s', device_id, *arguments)
+        return self.get_scrcpy_command(*arguments)
+        
     def start_scrcpy(self, device_id=None):
         """启动scrcpy屏幕镜像"""
         if not self.scrcpy_ready:
@@ -501,20 +800,20 @@ class AndroidControlApp:
             
         try:
             # 构建scrcpy命令
+            scrcpy_cmd = self.get_scrcpy_profile_command(device_id, self.scrcpy_profile)
             if device_id:
-                scrcpy_cmd = self.get_scrcpy_command('-s', device_id)
-                self.log(f"启动scrcpy连接到设备: {device_id}")
+                self.log(f"启动scrcpy连接到设备: {device_id} (镜像配置 {self.scrcpy_profile})")
             else:
-                scrcpy_cmd = self.get_scrcpy_command()
-                self.log("启动scrcpy连接到默认设备")
-            
-            # 启动scrcpy进程（后台运行）
-            self.scrcpy_process = subprocess.Popen(
-                scrcpy_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+                self.log(f"启动scrcpy连接到默认设备 (镜像配置 {self.scrcpy_profile})")
+            
+            # 启动scrcpy进程（后台运行，输出由监管线程持续读取）
+            if self.scrcpy_supervisor:
+                self.scrcpy_supervisor.stop()
+            self.scrcpy_device = device_id
+            self.scrcpy_supervisor = ScrcpySupervisor(scrcpy_cmd, log=self.log, profile=self.scrcpy_profile)
+            if not self.scrcpy_supervisor.start():
+                self.scrcpy_supervisor = None
+                return False
             
             self.log("✓ scrcpy屏幕镜像已启动")
             return True
@@ -523,20 +822,63 @@ class AndroidControlApp:
             self.log(f"✗ 启动scrcpy失败: {str(e)}")
             return False
             
+    def switch_scrcpy_profile(self, profile):
+        """切换镜像配置（重启scrcpy），在后台按提交顺序执行"""
+        supervisor = self.scrcpy_supervisor
+        if not supervisor or supervisor.profile == profile:
+            return
+        try:
+            command = self.get_scrcpy_profile_command(self.scrcpy_device, profile)
+        except RuntimeError as e:
+            self.log(f"✗ 切换镜像配置失败: {str(e)}")
+            return
+        
+        def switch():
+            if self.scrcpy_supervisor is not supervisor or supervisor.profile == profile:
+                return
+            self.log(f"切换屏幕镜像配置: {supervisor.profile} → {profile}")
+            supervisor.restart(command, profile)
+            
+        # 同一个“设备”键上的任务按提交顺序执行，录制开始和结束的切换不会颠倒
+        return self.tasks.submit(switch, device="scrcpy")
+        
+    def enter_capture_profile(self, timeout=CAPTURE_PROFILE_TIMEOUT):
+        """触发前切换到录制期间的镜像配置，并等待 scrcpy 重新显示画面（在后台线程中调用）
+
+        重启 scrcpy（推送 server、启动编码器和解码器）很占 CPU 和 USB 带宽，必须在触发前完成，
+        不能落在 240 fps 采集的最初几秒；超时只记录日志，测量照常进行。
+        """
+        supervisor = self.scrcpy_supervisor
+        profile = self.scrcpy_capture_profile
+        if not supervisor or supervisor.profile == profile:
+            return
+        deadline = time.monotonic() + timeout
+        future = self.switch_scrcpy_profile(profile)
+        try:
+            if future is not None:
+                future.result(timeout)
+            if supervisor.wait_running(max(0.0, deadline - time.monotonic())):
+                time.sleep(CAPTURE_PROFILE_SETTLE)
+                return
+        except Exception as e:
+            self.log(f"⚠ 切换镜像配置失败: {str(e)}")
+            return
+        self.log(f"⚠ 镜像配置 {profile} 未在 {timeout:.0f} s 内就绪，继续测量")
+        
+    def restore_scrcpy_profile(self, take=None):
+        """恢复平时的镜像配置；指定 take 时仅在该次测量仍是当前测量时恢复（超时兜底用）"""
+        if take is not None and self.session.current_take is not take:
+            return
+        self.switch_scrcpy_profile(self.scrcpy_profile)
+        
     def stop_scrcpy(self):
         """停止scrcpy进程"""
-        if self.scrcpy_process:
+        if self.scrcpy_supervisor:
             try:
                 self.log("正在关闭scrcpy...")
-                self.scrcpy_process.terminate()
-                try:
-                    self.scrcpy_process.wait(timeout=5)
-                    self.log("✓ scrcpy已正常关闭")
-                except subprocess.TimeoutExpired:
-                    self.scrcpy_process.kill()
-                    self.log("✓ scrcpy已强制关闭")
-                    
-                self.scrcpy_process = None
+                self.scrcpy_supervisor.stop()
+                self.log("✓ scrcpy已关闭")
+                self.scrcpy_supervisor = None
                 
             except Exception as e:
                 self.log(f"关闭scrcpy时发生错误: {str(e)}")
@@ -548,34 +890,30 @@ class AndroidControlApp:
         def reconfigure_thread():
             try:
                 # 停止scrcpy
-                if self.scrcpy_process:
+                if self.scrcpy_supervisor:
                     self.stop_scrcpy()
                 
-                # 停止当前ADB服务器
-                if self.adb_ready and self.adb_path:
+                # 停止设备状态跟踪和当前ADB服务器
+                self.stop_device_tracker()
+                if self.adb_ready and self.adb_client:
                     try:
-                        kill_cmd = self.get_adb_command('kill-server')
-                        subprocess.run(kill_cmd, capture_output=True, timeout=5)
+                        self.adb_client.kill_server()
                         self.log("已停止现有ADB服务器")
                     except:
                         pass
                 
-                # 删除现有platform-tools目录
-                tools_dir = "platform-tools"
-                if os.path.exists(tools_dir):
-                    self.log("删除现有ADB工具...")
-                    shutil.rmtree(tools_dir)
-                
-                # 重新配置ADB
+                # 重新配置ADB：逐个校验已解压文件，只重写缺失或损坏的文件
+                self.session.close_device()
                 self.adb_ready = False
                 self.adb_path = None
+                self.adb_client = None
                 
-                adb_success = self.setup_adb_tools()
+                adb_success = self.setup_adb_tools(deep_verify=True)
                 
                 # 重新配置scrcpy
                 self.scrcpy_ready = False
                 self.scrcpy_path = None
-                self.scrcpy_process = None
+                self.scrcpy_supervisor = None
                 
                 scrcpy_success = self.setup_scrcpy_tools()
                 
@@ -591,11 +929,11 @@ class AndroidControlApp:
             except Exception as e:
                 self.log(f"重新配置时发生错误: {str(e)}")
                 
-        threading.Thread(target=reconfigure_thread, daemon=True).start()
+        self.run_task(reconfigure_thread, key="reconfigure", timeout=RECONFIGURE_TASK_TIMEOUT)
         
     def detect_cameras(self):
-        """检测可用的摄像头设备"""
-        self.available_cameras = []
+        """检测可用的摄像头设备（可在后台线程中调用），结果发布到界面状态总线"""
+        cameras = []
         self.log("正在检测可用摄像头...")
         
         # 尝试不同的后端，但优先使用默认后端（在macOS上通常工作最好）
@@ -662,13 +1000,13 @@ class AndroidControlApp:
                             
                             # 检查是否已经添加了相同索引的摄像头（避免重复）
                             existing = False
-                            for existing_cam in self.available_cameras:
+                            for existing_cam in cameras:
                                 if existing_cam['index'] == i:
                                     existing = True
                                     break
                             
                             if not existing:
-                                self.available_cameras.append(camera_info)
+                                cameras.append(camera_info)
                                 backend_name = "默认" if backend == cv2.CAP_ANY else f"后端{backend}"
                                 self.log(f"✓ 找到摄像头 {i}: {int(width)}x{int(height)} @ {fps:.1f}fps ({successful_reads}/10 帧, {backend_name})")
                                 camera_found = True
@@ -684,7 +1022,7 @@ class AndroidControlApp:
                     # 继续尝试下一个后端
                     continue
                     
-        if not self.available_cameras:
+        if not cameras:
             self.log("⚠ 未找到可用摄像头")
             # 提供更详细的诊断信息
             self.log("摄像头检测诊断：")
@@ -692,23 +1030,30 @@ class AndroidControlApp:
             self.log("- 检查摄像头是否被其他应用程序占用")
             self.log("- 在macOS上，请检查系统偏好设置中的摄像头权限")
             self.log("- 尝试重新插拔USB摄像头")
-            messagebox.showwarning("摄像头警告", 
+            self.ui(messagebox.showwarning, "摄像头警告",
                                  "未找到可用摄像头！\n\n可能的解决方案：\n"
                                  "1. 确保摄像头已正确连接\n"
                                  "2. 检查摄像头权限设置\n"
                                  "3. 关闭其他使用摄像头的应用\n"
                                  "4. 重新插拔USB摄像头后点击'刷新摄像头'")
         else:
-            self.log(f"✓ 共找到 {len(self.available_cameras)} 个可用摄像头")
+            self.log(f"✓ 共找到 {len(cameras)} 个可用摄像头")
             # 显示检测到的摄像头详情
-            for camera in self.available_cameras:
+            for camera in cameras:
                 self.log(f"  - 摄像头 {camera['index']}: {camera['resolution']} @ {camera['fps']}fps (成功率: {camera['success_rate']})")
             
             # 从配置中加载上次选择的摄像头
             if hasattr(self, 'saved_camera_index'):
-                if 0 <= self.saved_camera_index < len(self.available_cameras):
+                if 0 <= self.saved_camera_index < len(cameras):
                     self.selected_camera_index = self.saved_camera_index
         
+        self.ui_state.camera_list(cameras)
+        return cameras
+        
+    def refresh_cameras_on_startup(self):
+        """窗口显示后首次检测摄像头（在后台检测，结果经界面状态总线更新列表）"""
+        self.run_task(self.detect_cameras, key="detect_cameras")
+        
     def get_selected_camera_index(self):
         """获取当前选择的摄像头索引"""
         if hasattr(self, 'camera_var') and self.available_cameras:
@@ -751,6 +1096,7 @@ class AndroidControlApp:
         
         self.log_text = scrolledtext.ScrolledText(log_frame, height=20, width=60)
         self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.log_view = TextLogView(self.log_text, self.log_pipeline, self.log_max_lines)
         
         # 使用说明区域
         usage_frame = ttk.LabelFrame(left_frame, text="使用说明", padding="5")
@@ -780,6 +1126,11 @@ class AndroidControlApp:
         self.preview_label = ttk.Label(preview_frame, text="点击'测试预览'开启摄像头预览", 
                                       anchor=tk.CENTER, font=("Arial", 12))
         self.preview_label.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.preview_renderer = PreviewRenderer(self.preview_label)
+        
+        self.preview_fps_var = tk.StringVar(value="")
+        ttk.Label(preview_frame, textvariable=self.preview_fps_var, anchor=tk.CENTER,
+                  foreground="gray").grid(row=1, column=0, sticky=(tk.W, tk.E))
         
         # 控制面板区域
         control_frame = ttk.Frame(main_frame)
@@ -886,9 +1237,26 @@ class AndroidControlApp:
         # 状态栏
         self.status_var = tk.StringVar()
         self.status_var.set("就绪")
-        status_label = ttk.Label(main_frame, textvariable=self.status_var, 
+        status_frame = ttk.Frame(main_frame)
+        status_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        status_frame.columnconfigure(0, weight=1)
+        status_label = ttk.Label(status_frame, textvariable=self.status_var, 
                                 relief=tk.SUNKEN, anchor=tk.W)
-        status_label.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        status_label.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        
+        # 链路质量（往返时间、丢包率）和屏幕镜像状态
+        self.link_var = tk.StringVar()
+        self.link_var.set("链路: 未连接")
+        link_label = ttk.Label(status_frame, textvariable=self.link_var,
+                              relief=tk.SUNKEN, anchor=tk.E, width=52)
+        link_label.grid(row=0, column=2, sticky=(tk.W, tk.E))
+        
+        # 进度条（Payload 下载等长时间操作期间显示）
+        self.progress_bar = ttk.Progressbar(status_frame, mode="determinate", maximum=100, length=120)
+        self.progress_bar.grid(row=0, column=1, padx=(5, 5))
+        self.progress_bar.grid_remove()
+        
+        self.register_ui_state()
         
     def setup_filename_ui(self, parent):
         """设置文件名编辑界面"""
@@ -1005,11 +1373,11 @@ class AndroidControlApp:
         if self.preview_active:
             self.stop_preview()
         
-        # 重新检测摄像头
-        self.detect_cameras()
-        self.update_camera_list()
-        
-        self.log("摄像头列表已刷新")
+        # 在后台重新检测摄像头，检测完成后更新列表
+        def detect():
+            self.detect_cameras()
+            self.log("摄像头列表已刷新")
+        self.run_task(detect, key="detect_cameras")
         
     def test_selected_camera(self):
         """测试选中的摄像头"""
@@ -1128,6 +1496,10 @@ class AndroidControlApp:
             
     def start_preview(self):
         """启动预览"""
+        if self.session.frame_tap_name and self.session.record_process is not None:
+            # 摄像头已被录制进程占用，改为显示录制画面
+            self.start_tap_preview(self.session.frame_tap_name)
+            return
         try:
             # 获取当前选择的摄像头索引
             camera_index = self.get_selected_camera_index()
@@ -1197,12 +1569,8 @@ class AndroidControlApp:
             
             self.log(f"预览摄像头已启动: {int(actual_width)}x{int(actual_height)}, {actual_fps:.1f} FPS")
             
-            self.preview_active = True
-            self.preview_button.config(text="停止预览")
-            
-            # 启动预览线程
-            self.preview_thread = threading.Thread(target=self.preview_loop, daemon=True)
-            self.preview_thread.start()
+            # 启动采集线程，显示在 Tk 主线程中定时进行
+            self.start_preview_thread(self.preview_loop)
             
         except Exception as e:
             self.log(f"启动预览失败: {str(e)}")
@@ -1210,76 +1578,226 @@ class AndroidControlApp:
                 self.preview_cap.release()
                 self.preview_cap = None
             
+    def start_tap_preview(self, name):
+        """从录制进程的共享内存读取录制画面（录制期间才有新画面）"""
+        try:
+            self.preview_tap = FrameTapReader(name)
+        except Exception as e:
+            self.log(f"打开录制画面预览失败: {str(e)}")
+            self.preview_tap = None
+            return
+        self.log(f"预览录制画面（每 {self.preview_tap.decimation} 帧取 1 帧）")
+        self.start_preview_thread(self.tap_preview_loop)
+        
+    def start_preview_thread(self, target):
+        self.preview_active = True
+        self.preview_button.config(text="停止预览")
+        self.preview_slot.clear()
+        self.preview_capture_fps.reset()
+        self.preview_renderer.reset()
+        self.preview_last_frame = None
+        self.preview_thread = threading.Thread(target=target, daemon=True)
+        self.preview_thread.start()
+        self.preview_timer = self.root.after(PREVIEW_POLL_MS, self.update_preview)
+        
     def stop_preview(self):
         """停止预览"""
         self.preview_active = False
         self.preview_button.config(text="测试预览")
+        if self.preview_timer is not None:
+            self.root.after_cancel(self.preview_timer)
+            self.preview_timer = None
         
         if self.preview_cap:
             self.preview_cap.release()
             self.preview_cap = None
+        if self.preview_tap:
+            # 读取线程退出后才能关闭共享内存
+            if self.preview_thread is not None and self.preview_thread is not threading.current_thread():
+                self.preview_thread.join(0.5)
+            self.preview_tap.close()
+            self.preview_tap = None
             
         # 清空预览区域
+        self.preview_slot.clear()
+        self.preview_renderer.reset()
         self.preview_label.config(image="", text="点击'测试预览'开启摄像头预览")
+        self.preview_label.image = None
+        self.preview_fps_var.set("")
         self.log("预览已停止")
         
     def preview_loop(self):
-        """预览循环"""
+        """预览采集循环（后台线程）：只把最新一帧放入单槽缓冲区，不操作界面"""
         while self.preview_active and self.preview_cap:
             try:
                 ret, frame = self.preview_cap.read()
                 if ret:
-                    # 转换颜色空间
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    
-                    # 调整显示尺寸（保持纵横比）
-                    height, width = frame_rgb.shape[:2]
-                    max_width, max_height = 400, 300
-                    
-                    # 计算缩放比例
-                    scale = min(max_width/width, max_height/height)
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
+                    self.preview_slot.publish(frame)
+                    self.preview_capture_fps.tick()
                     
-                    # 缩放图像
-                    frame_resized = cv2.resize(frame_rgb, (new_width, new_height))
-                    
-                    # 转换为PIL图像
-                    image = Image.fromarray(frame_resized)
-                    photo = ImageTk.PhotoImage(image)
-                    
-                    # 更新显示
-                    if self.preview_active:
-                        self.preview_label.config(image=photo, text="")
-                        self.preview_label.image = photo  # 保持引用
-                        
-                time.sleep(1/30)  # 30 FPS 显示频率
-                
             except Exception as e:
                 if self.preview_active:
                     self.log(f"预览更新错误: {str(e)}")
                 break
         
+    def tap_preview_loop(self):
+        """录制画面读取循环（后台线程）：从共享内存取最新一帧放入单槽缓冲区"""
+        tap = self.preview_tap
+        while self.preview_active and tap is self.preview_tap:
+            try:
+                frame = tap.read()
+            except Exception as e:
+                if self.preview_active:
+                    self.log(f"预览更新错误: {str(e)}")
+                break
+            if frame is None:
+                time.sleep(0.005)
+                continue
+            self.preview_slot.publish(frame)
+            self.preview_capture_fps.tick()
+        
+    def update_preview(self):
+        """在 Tk 主线程中显示最新一帧（旧帧已在缓冲区中丢弃）"""
+        self.preview_timer = None
+        if not self.preview_active:
+            return
+        frame = self.preview_slot.take()
+        if frame is not None:
+            try:
+                self.preview_renderer.render(frame)
+            except Exception as e:
+                self.log(f"预览更新错误: {str(e)}")
+                self.stop_preview()
+                return
+            self.preview_last_frame = time.perf_counter()
+            self.update_preview_fps()
+        elif self.preview_thread is not None and not self.preview_thread.is_alive():
+            # 采集线程已出错退出
+            self.stop_preview()
+            return
+        elif self.preview_tap is not None and (self.preview_last_frame is None or
+                                               time.perf_counter() - self.preview_last_frame > 1.0):
+            self.preview_fps_var.set("录制画面：等待录制开始（仅录制期间有新画面）")
+        self.preview_timer = self.root.after(PREVIEW_POLL_MS, self.update_preview)
+        
+    def update_preview_fps(self):
+        """预览下方显示实际显示帧率、采集帧率和丢弃的帧数"""
+        display_fps = self.preview_renderer.fps.fps
+        capture_fps = self.preview_capture_fps.fps
+        if display_fps is None or capture_fps is None:
+            return
+        source = "录制画面" if self.preview_tap is not None else "采集"
+        self.preview_fps_var.set(f"显示 {display_fps:.1f} fps | {source} {capture_fps:.1f} fps | "
+                                 f"丢弃 {self.preview_slot.dropped} 帧")
+        
     def log(self, message):
-        """添加日志消息到队列"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        formatted_message = f"[{timestamp}] {message}"
-        self.log_queue.put(formatted_message)
-        print(formatted_message)  # 同时输出到控制台
+        """记录日志（任意线程）：写入控制台和日志文件，按来源的显示级别放入界面待显示缓冲区"""
+        self.log_pipeline.log(message)
         
     def update_logs(self):
-        """更新日志显示"""
+        """更新日志显示（积累的消息一次插入）"""
         try:
-            while True:
-                message = self.log_queue.get_nowait()
-                self.log_text.insert(tk.END, message + "\n")
-                self.log_text.see(tk.END)
-        except queue.Empty:
-            pass
+            self.log_view.update()
+        except Exception as e:
+            print(f"日志显示失败: {e}")
         
         # 每100ms检查一次
         self.root.after(100, self.update_logs)
-        
+
+    def ui(self, callback, *args, **kwargs):
+        """在Tk主线程中执行界面操作（后台线程调用时放入队列）"""
+        if threading.current_thread() is threading.main_thread():
+            callback(*args, **kwargs)
+        else:
+            self.ui_queue.put((callback, args, kwargs))
+
+    def set_status(self, text):
+        self.ui_state.status(text)
+
+    def set_button(self, name, enabled):
+        """设置按钮是否可用（任意线程，经界面状态总线合并）"""
+        self.ui_state.button(name, enabled)
+
+    def set_progress(self, name, percent):
+        """显示进度（0–100），None 表示结束并隐藏进度条（任意线程）"""
+        self.ui_state.progress(name, percent)
+
+    def register_ui_state(self):
+        """注册界面状态的应用函数"""
+        self.ui_state.register(STATUS, lambda name, text: self.status_var.set(text))
+        self.ui_state.register(BUTTON, self.apply_button_state)
+        self.ui_state.register(CAMERA_LIST, self.apply_camera_list)
+        self.ui_state.register(PROGRESS, self.apply_progress)
+
+    def apply_button_state(self, name, enabled):
+        buttons = {'start': self.start_button, 'stop': self.stop_button}
+        buttons[name].config(state=tk.NORMAL if enabled else tk.DISABLED)
+
+    def apply_camera_list(self, name, cameras):
+        self.available_cameras = cameras
+        self.update_camera_list()
+
+    def apply_progress(self, name, percent):
+        if percent is None:
+            self.progress_bar.grid_remove()
+            self.progress_bar['value'] = 0
+        else:
+            self.progress_bar['value'] = percent
+            self.progress_bar.grid()
+
+    def apply_ui_state(self):
+        """每个刷新周期应用一次后台线程发布的界面状态"""
+        self.ui_state.apply_pending()
+        self.root.after(UI_TICK_MS, self.apply_ui_state)
+
+    def process_ui_queue(self):
+        """执行后台任务交回的界面操作"""
+        try:
+            while True:
+                callback, args, kwargs = self.ui_queue.get_nowait()
+                try:
+                    callback(*args, **kwargs)
+                except Exception as e:
+                    self.log(f"界面更新失败: {str(e)}")
+        except queue.Empty:
+            pass
+
+        self.root.after(50, self.process_ui_queue)
+
+    def update_link_status(self):
+        """刷新状态栏中的链路质量和镜像状态"""
+        monitor = self.session.link_monitor
+        parts = [monitor.describe() if monitor else "链路: 未连接"]
+        if self.scrcpy_supervisor:
+            parts.append(self.scrcpy_supervisor.describe())
+        self.link_var.set(" | ".join(parts))
+        self.root.after(1000, self.update_link_status)
+        
+    def on_link_change(self, monitor):
+        """链路等级变化（在监测线程中调用）"""
+        if monitor.quality == LINK_DOWN:
+            self.set_status("设备链路断开，正在后台重连" if monitor.reconnect_enabled else "设备链路断开")
+        else:
+            self.set_status(f"设备{monitor.describe()}")
+        
+    def run_task(self, func, key, device=None, timeout=None, replace=False):
+        """把操作提交到后台事件循环，返回是否已提交（同一操作仍在进行时不重复提交）"""
+        def on_error(error):
+            if isinstance(error, TaskTimeoutError):
+                self.log(f"✗ 操作超时 ({key}): {str(error)}")
+                self.set_status("操作超时")
+            else:
+                self.log(f"✗ 操作失败 ({key}): {str(error)}")
+                self.set_status("操作失败")
+
+        try:
+            self.tasks.submit(func, key=key, device=device, timeout=timeout, replace=replace,
+                              on_error=on_error)
+            return True
+        except TaskRejectedError:
+            self.log(f"上一次操作尚未完成 ({key})，请稍候")
+            return False
+
     def check_dependencies(self):
         """检查必要的工具是否已安装"""
         self.log("正在检查依赖工具...")
@@ -1318,139 +1836,175 @@ class AndroidControlApp:
         """检查已连接的Android设备并启动摄像头系统"""
         if not self.adb_ready:
             self.log("错误: ADB工具未就绪")
-            self.status_var.set("ADB工具未就绪")
+            self.set_status("ADB工具未就绪")
             return
             
         self.log("正在检查设备连接状态...")
-        self.status_var.set("检查设备中...")
+        self.set_status("检查设备中...")
         
         def check_thread():
             try:
                 # 检查设备连接
-                adb_cmd = self.get_adb_command('devices')
-                result = subprocess.run(adb_cmd, 
-                                      capture_output=True, text=True, timeout=10)
+                try:
+                    devices = self.session.list_devices()
+                except AdbTimeoutError:
+                    raise
+                except AdbError as e:
+                    devices = None
+                    error_message = str(e)
                 
-                if result.returncode == 0:
-                    lines = result.stdout.strip().split('\n')[1:]  # 跳过标题行
-                    devices = [line for line in lines if line.strip() and 'device' in line]
-                    
+                if devices is not None:
                     if devices:
                         self.log(f"✓ 找到 {len(devices)} 个已连接设备:")
                         for device in devices:
                             self.log(f"  - {device}")
                         
+                        # 预先打开常驻shell会话，测量时无需再建立连接
+                        if self.session.device_trigger is None:
+                            if self.session.serial in devices:
+                                serial = self.session.serial
+                            elif len(devices) == 1:
+                                serial = devices[0]
+                            else:
+                                # 多台设备且没有选定设备时不能猜测，否则按键会发到任意一台
+                                self.log("✗ 连接了多台设备，请先通过'连接ADB设备'选择要使用的设备")
+                                self.set_status("请选择设备")
+                                self.ui(messagebox.showwarning, "设备检查",
+                                        f"找到 {len(devices)} 个设备，请先通过'连接ADB设备'选择要使用的设备。")
+                                return
+                            self.session.open_device(serial)
+                        
                         # 设备连接成功，启动摄像头
                         self.log("设备已连接，正在启动摄像头系统...")
                         if self.start_camera():
-                            self.status_var.set("摄像头系统就绪")
+                            self.set_status("摄像头系统就绪")
                             # 启用开始录制按钮
-                            self.start_button.config(state=tk.NORMAL)
-                            self.stop_button.config(state=tk.NORMAL)
-                            messagebox.showinfo("摄像头系统", f"找到 {len(devices)} 个设备，摄像头系统已启动！")
+                            self.set_button("start", True)
+                            self.set_button("stop", True)
+                            self.ui(messagebox.showinfo, "摄像头系统", f"找到 {len(devices)} 个设备，摄像头系统已启动！")
                         else:
-                            self.status_var.set("摄像头启动失败")
-                            messagebox.showerror("摄像头错误", "设备已连接，但摄像头启动失败")
+                            self.set_status("摄像头启动失败")
+                            self.ui(messagebox.showerror, "摄像头错误", "设备已连接，但摄像头启动失败")
                     else:
                         self.log("✗ 未找到已连接的设备")
+                        if self.device_tracker:
+                            for serial in self.device_tracker.devices(STATE_UNAUTHORIZED):
+                                self.log(f"  - {serial}: {describe_state(STATE_UNAUTHORIZED)}")
                         self.log("请先使用'连接ADB设备'功能连接您的Android设备，或确保:")
                         self.log("1. 设备已开启开发者选项和USB调试")
                         self.log("2. 设备与电脑在同一WiFi网络")
                         self.log("3. 设备已通过无线方式连接")
-                        self.status_var.set("未找到设备")
-                        messagebox.showinfo("设备检查", "未找到已连接的设备。\n\n请先使用'连接ADB设备'功能连接您的Android设备。")
+                        self.set_status("未找到设备")
+                        self.ui(messagebox.showinfo, "设备检查", "未找到已连接的设备。\n\n请先使用'连接ADB设备'功能连接您的Android设备。")
                 else:
-                    self.log(f"ADB 命令执行失败: {result.stderr}")
-                    self.status_var.set("检查失败")
+                    self.log(f"ADB 命令执行失败: {error_message}")
+                    self.set_status("检查失败")
                     
-            except subprocess.TimeoutExpired:
+            except AdbTimeoutError:
                 self.log("检查超时")
-                self.status_var.set("检查超时")
+                self.set_status("检查超时")
             except Exception as e:
                 self.log(f"检查设备连接时发生错误: {str(e)}")
-                self.status_var.set("检查错误")
+                self.set_status("检查错误")
                 
-        threading.Thread(target=check_thread, daemon=True).start()
+        self.run_task(check_thread, key="check", timeout=CHECK_TASK_TIMEOUT)
         
     def connect_device_by_ip(self):
         """通过IP地址连接Android设备 - 仅连接ADB，不启动摄像头"""
         if not self.adb_ready:
             self.log("错误: ADB工具未就绪")
-            self.status_var.set("ADB工具未就绪")
+            self.set_status("ADB工具未就绪")
             return
             
         device_ip = self.device_ip_var.get().strip()
         if not device_ip:
             self.log("错误: 请输入设备IP地址")
-            messagebox.showerror("错误", "请输入设备IP地址")
+            self.ui(messagebox.showerror, "错误", "请输入设备IP地址")
             return
             
         self.log(f"正在连接设备 {device_ip}:5555...")
-        self.status_var.set("连接设备中...")
+        self.set_status("连接设备中...")
         
         def connect_ip_thread():
             try:
-                # 执行 adb connect 命令
-                adb_cmd = self.get_adb_command('connect', f'{device_ip}:5555')
-                result = subprocess.run(adb_cmd, 
-                                      capture_output=True, text=True, timeout=15)
+                # 通过adb服务器执行 host:connect
+                try:
+                    output = self.get_adb_client().connect(f'{device_ip}:5555', timeout=15).strip()
+                    error_msg = None
+                except AdbTimeoutError:
+                    raise
+                except AdbError as e:
+                    error_msg = str(e).strip() or "未知错误"
                 
-                if result.returncode == 0:
-                    output = result.stdout.strip()
+                if error_msg is None:
                     self.log(f"连接结果: {output}")
                     
-                    if "connected" in output.lower() or "already connected" in output.lower():
+                    state = None
+                    if "connected" in output.lower():
+                        # 等待设备在跟踪列表中变为 device（未授权的设备会停在 unauthorized）
+                        state = self.session.wait_device(f'{device_ip}:5555')
+                        if state != STATE_DEVICE:
+                            self.log(f"✗ 设备 {device_ip}:5555 {describe_state(state)}")
+                            self.set_status(f"设备{describe_state(state)}")
+                            self.ui(messagebox.showerror, "连接失败",
+                                    f"设备 {device_ip}:5555 {describe_state(state)}")
+                            return
+                    
+                    if state == STATE_DEVICE:
                         self.log("✓ ADB设备连接成功！")
                         
+                        # 连接时即打开常驻shell会话，测量触发直接写入该会话
+                        self.session.open_device(f'{device_ip}:5555')
+                        
                         # ADB连接成功后，启动scrcpy
                         if self.scrcpy_ready:
                             self.log("正在启动scrcpy屏幕镜像...")
                             device_address = f'{device_ip}:5555'
                             if self.start_scrcpy(device_address):
-                                self.status_var.set("ADB设备已连接，scrcpy已启动")
+                                self.set_status("ADB设备已连接，scrcpy已启动")
                                 self.log("✓ scrcpy屏幕镜像启动成功")
                             else:
-                                self.status_var.set("ADB设备已连接，scrcpy启动失败")
+                                self.set_status("ADB设备已连接，scrcpy启动失败")
                                 self.log("⚠ scrcpy屏幕镜像启动失败，但ADB连接成功")
                         else:
-                            self.status_var.set("ADB设备已连接")
+                            self.set_status("ADB设备已连接")
                             self.log("⚠ scrcpy工具未就绪，无法启动屏幕镜像")
                             
                         self.log("提示: 请点击'启动摄像头'按钮启动录制功能")
                     else:
                         self.log(f"✗ 连接失败: {output}")
-                        self.status_var.set("连接失败")
-                        messagebox.showerror("连接失败", 
-                                           f"无法连接到设备 {device_ip}:5555\n\n错误信息: {output}\n\n请确保:\n1. 设备已开启开发者选项和USB调试\n2. 设备已开启无线调试\n3. 设备与电脑在同一WiFi网络\n4. IP地址正确")
+                        self.set_status("连接失败")
+                        self.ui(messagebox.showerror, "连接失败",
+                                f"无法连接到设备 {device_ip}:5555\n\n错误信息: {output}\n\n请确保:\n1. 设备已开启开发者选项和USB调试\n2. 设备已开启无线调试\n3. 设备与电脑在同一WiFi网络\n4. IP地址正确")
                 else:
-                    error_msg = result.stderr.strip() or "未知错误"
                     self.log(f"✗ ADB连接命令失败: {error_msg}")
-                    self.status_var.set("连接失败")
-                    messagebox.showerror("连接失败", f"ADB连接失败:\n{error_msg}")
+                    self.set_status("连接失败")
+                    self.ui(messagebox.showerror, "连接失败", f"ADB连接失败:\n{error_msg}")
                     
-            except subprocess.TimeoutExpired:
+            except AdbTimeoutError:
                 self.log("✗ 连接超时")
-                self.status_var.set("连接超时")
-                messagebox.showerror("连接超时", "连接设备超时，请检查网络连接和设备状态")
+                self.set_status("连接超时")
+                self.ui(messagebox.showerror, "连接超时", "连接设备超时，请检查网络连接和设备状态")
             except Exception as e:
                 self.log(f"✗ 连接时发生错误: {str(e)}")
-                self.status_var.set("连接错误")
-                messagebox.showerror("连接错误", f"连接过程中发生错误:\n{str(e)}")
+                self.set_status("连接错误")
+                self.ui(messagebox.showerror, "连接错误", f"连接过程中发生错误:\n{str(e)}")
         
-        threading.Thread(target=connect_ip_thread, daemon=True).start()
+        self.run_task(connect_ip_thread, key="connect", device=f'{device_ip}:5555', timeout=CONNECT_TASK_TIMEOUT)
         
     def verify_and_start_camera(self):
         """验证设备连接并启动摄像头"""
         try:
             # 检查设备连接状态
-            adb_cmd = self.get_adb_command('devices')
-            result = subprocess.run(adb_cmd, 
-                                  capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')[1:]  # 跳过标题行
-                devices = [line for line in lines if line.strip() and 'device' in line]
-                
+            try:
+                devices = self.session.list_devices()
+            except AdbTimeoutError:
+                raise
+            except AdbError as e:
+                devices = None
+                error_message = str(e)
+            
+            if devices is not None:
                 if devices:
                     self.log(f"验证成功：找到 {len(devices)} 个设备")
                     for device in devices:
@@ -1459,24 +2013,24 @@ class AndroidControlApp:
                     # 设备连接成功，启动摄像头
                     self.log("正在启动摄像头...")
                     if self.start_camera():
-                        self.status_var.set("设备已连接，摄像头就绪")
+                        self.set_status("设备已连接，摄像头就绪")
                         # 启用开始录制按钮
-                        self.start_button.config(state=tk.NORMAL)
-                        self.stop_button.config(state=tk.NORMAL)
+                        self.set_button("start", True)
+                        self.set_button("stop", True)
                         self.log("✓ 摄像头启动成功，可以开始录制")
                     else:
-                        self.status_var.set("摄像头启动失败")
-                        messagebox.showerror("摄像头错误", "设备连接成功，但摄像头启动失败")
+                        self.set_status("摄像头启动失败")
+                        self.ui(messagebox.showerror, "摄像头错误", "设备连接成功，但摄像头启动失败")
                 else:
                     self.log("设备连接后未在设备列表中找到")
-                    self.status_var.set("设备验证失败")
+                    self.set_status("设备验证失败")
             else:
-                self.log(f"验证设备连接失败: {result.stderr}")
-                self.status_var.set("设备验证失败")
+                self.log(f"验证设备连接失败: {error_message}")
+                self.set_status("设备验证失败")
                 
         except Exception as e:
             self.log(f"验证设备连接时发生错误: {str(e)}")
-            self.status_var.set("验证失败")
+            self.set_status("验证失败")
             
     def disconnect_device(self):
         """断开Android设备连接"""
@@ -1488,7 +2042,7 @@ class AndroidControlApp:
         if not device_ip:
             # 如果没有输入IP，断开所有设备
             self.log("正在断开所有设备连接...")
-            self.status_var.set("断开连接中...")
+            self.set_status("断开连接中...")
             
             def disconnect_all_thread():
                 try:
@@ -1496,33 +2050,33 @@ class AndroidControlApp:
                     self.stop_recording()
                     
                     # 停止scrcpy
-                    if self.scrcpy_process:
+                    if self.scrcpy_supervisor:
                         self.stop_scrcpy()
                     
-                    # 执行 adb disconnect 命令
-                    adb_cmd = self.get_adb_command('disconnect')
-                    result = subprocess.run(adb_cmd, 
-                                          capture_output=True, text=True, timeout=10)
+                    # 关闭常驻shell会话
+                    self.session.close_device()
                     
-                    if result.returncode == 0:
+                    # 通过adb服务器执行 host:disconnect
+                    try:
+                        self.get_adb_client().disconnect(timeout=10)
                         self.log("所有设备已断开连接")
-                        self.status_var.set("设备已断开")
+                        self.set_status("设备已断开")
                         # 禁用录制按钮
-                        self.start_button.config(state=tk.DISABLED)
-                        self.stop_button.config(state=tk.DISABLED)
-                    else:
-                        self.log(f"断开连接失败: {result.stderr}")
-                        self.status_var.set("断开失败")
+                        self.set_button("start", False)
+                        self.set_button("stop", False)
+                    except AdbError as e:
+                        self.log(f"断开连接失败: {str(e)}")
+                        self.set_status("断开失败")
                         
                 except Exception as e:
                     self.log(f"断开连接时发生错误: {str(e)}")
-                    self.status_var.set("断开错误")
+                    self.set_status("断开错误")
                     
-            threading.Thread(target=disconnect_all_thread, daemon=True).start()
+            self.run_task(disconnect_all_thread, key="disconnect", replace=True, timeout=DISCONNECT_TASK_TIMEOUT)
         else:
             # 断开指定IP设备
             self.log(f"正在断开设备 {device_ip}:5555...")
-            self.status_var.set("断开连接中...")
+            self.set_status("断开连接中...")
             
             def disconnect_ip_thread():
                 try:
@@ -1530,297 +2084,136 @@ class AndroidControlApp:
                     self.stop_recording()
                     
                     # 停止scrcpy
-                    if self.scrcpy_process:
+                    if self.scrcpy_supervisor:
                         self.stop_scrcpy()
                     
-                    # 执行 adb disconnect 命令
-                    adb_cmd = self.get_adb_command('disconnect', f'{device_ip}:5555')
-                    result = subprocess.run(adb_cmd, 
-                                          capture_output=True, text=True, timeout=10)
+                    # 关闭常驻shell会话
+                    self.session.close_device()
                     
-                    if result.returncode == 0:
+                    # 通过adb服务器执行 host:disconnect
+                    try:
+                        self.get_adb_client().disconnect(f'{device_ip}:5555', timeout=10)
                         self.log(f"设备 {device_ip}:5555 已断开连接")
-                        self.status_var.set("设备已断开")
+                        self.set_status("设备已断开")
                         # 禁用录制按钮
-                        self.start_button.config(state=tk.DISABLED)
-                        self.stop_button.config(state=tk.DISABLED)
-                    else:
-                        self.log(f"断开连接失败: {result.stderr}")
-                        self.status_var.set("断开失败")
+                        self.set_button("start", False)
+                        self.set_button("stop", False)
+                    except AdbError as e:
+                        self.log(f"断开连接失败: {str(e)}")
+                        self.set_status("断开失败")
                         
                 except Exception as e:
                     self.log(f"断开连接时发生错误: {str(e)}")
-                    self.status_var.set("断开错误")
+                    self.set_status("断开错误")
                     
-            threading.Thread(target=disconnect_ip_thread, daemon=True).start()
+            self.run_task(disconnect_ip_thread, key="disconnect", replace=True, device=f'{device_ip}:5555',
+                          timeout=DISCONNECT_TASK_TIMEOUT)
         
     def start_camera(self):
         """启动摄像头子进程（在连接设备后调用）"""
-        try:
-            record_script_path = "record_script.py"
-            if not os.path.exists(record_script_path):
-                self.log("错误: record_script.py 文件不存在")
-                return False
-                
-            self.log("正在启动摄像头...")
-            
-            # 检查是否有虚拟环境
-            venv_python = "venv/bin/python"
-            if os.path.exists(venv_python):
-                python_executable = venv_python
-                self.log("使用虚拟环境中的 Python")
-            else:
-                python_executable = sys.executable
-                self.log("使用系统 Python")
-            
-            # 获取当前选择的摄像头索引
-            camera_index = self.get_selected_camera_index()
-            self.log(f"使用摄像头索引: {camera_index}")
-            
-            # 使用合适的Python解释器启动子进程，传递摄像头索引，捕获输出
-            self.record_process = subprocess.Popen(
-                [python_executable, record_script_path, str(camera_index)],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,  # 将stderr重定向到stdout
-                text=True,
-                bufsize=1,  # 行缓冲
-                universal_newlines=True
-            )
-            
-            # 启动线程来读取子进程输出
-            self.start_output_reader()
-            
-            self.log("摄像头进程已启动，等待初始化...")
-            
-            # 等待摄像头初始化完成的信号
-            self.wait_for_camera_ready()
-            
-            return True
-            
-        except Exception as e:
-            self.log(f"启动摄像头失败: {str(e)}")
+        # 录制进程要独占摄像头：先停止直接打开摄像头的预览，就绪后改为预览录制画面
+        resume_preview = self.preview_active and self.preview_cap is not None
+        if resume_preview:
+            stopped = threading.Event()
+            self.ui(lambda: (self.stop_preview(), stopped.set()))
+            stopped.wait(2.0)
+        if not self.session.start_camera(self.get_selected_camera_index()):
             return False
-            
-    def wait_for_camera_ready(self):
-        """等待摄像头初始化完成"""
-        def wait_thread():
-            timeout = 10  # 10秒超时
-            start_time = time.time()
-            
-            while time.time() - start_time < timeout:
-                time.sleep(0.1)
-                if self.camera_ready:
-                    self.log("✓ 摄像头已就绪")
-                    return
-                    
-                # 检查进程是否还在运行
-                if self.record_process and self.record_process.poll() is not None:
-                    self.log("✗ 摄像头进程异常退出")
-                    return
-                    
-            self.log("✗ 摄像头初始化超时")
-            
-        threading.Thread(target=wait_thread, daemon=True).start()
-            
-    def start_output_reader(self):
-        """启动读取子进程输出的线程"""
-        def read_output():
-            process = self.record_process  # 保存进程引用，避免被外部修改影响
-            if process and process.stdout:
-                try:
-                    for line in iter(process.stdout.readline, ''):
-                        if line:
-                            # 移除换行符并添加前缀
-                            clean_line = line.rstrip('\n\r')
-                            if clean_line:
-                                self.log(f"[录制] {clean_line}")
-                                
-                                # 检查是否是摄像头就绪的信号
-                                if "等待从标准输入接收's'命令" in clean_line:
-                                    self.camera_ready = True
-                                    
-                                # 检查是否是文件保存完成的信号
-                                if "正在保存文件到:" in clean_line:
-                                    # 提取文件路径
-                                    file_path = clean_line.split("正在保存文件到:")[-1].strip()
-                                    self.last_recorded_video = file_path
-                                    
-                                # 检查是否是文件保存成功的信号
-                                if "文件保存成功。" in clean_line and self.last_recorded_video:
-                                    # 录制完成，复制文件
-                                    self.copy_recorded_video()
-                                    # 更新状态为录制完成
-                                    self.status_var.set("测量录制完成")
-                                    # 自动递增文件名编号
-                                    self.increment_filename_number()
-                        
-                        # 检查进程是否已结束（使用本地进程引用）
-                        if process and process.poll() is not None:
-                            break
-                except Exception as e:
-                    self.log(f"读取子进程输出时发生错误: {str(e)}")
-                    
-        threading.Thread(target=read_output, daemon=True).start()
         
-    def copy_recorded_video(self):
-        """复制录制的视频到payloads目录"""
-        if not self.last_recorded_video or not os.path.exists(self.last_recorded_video):
-            self.log("错误: 找不到录制的视频文件")
-            return
-            
-        try:
-            # 创建目标目录
-            target_dir = "payloads/MagicMirror"
-            if not os.path.exists(target_dir):
-                os.makedirs(target_dir)
-                self.log(f"创建目录: {target_dir}")
-            
-            # 构建新文件名
-            custom_filename = self.get_formatted_filename() + ".mp4"
-            target_path = os.path.join(target_dir, custom_filename)
-            
-            # 复制文件
-            shutil.copy2(self.last_recorded_video, target_path)
-            self.log(f"✓ 视频已复制到: {target_path}")
-            
-            # 显示文件信息
-            source_size = os.path.getsize(self.last_recorded_video)
-            target_size = os.path.getsize(target_path)
-            self.log(f"文件大小: {source_size:,} 字节 -> {target_size:,} 字节")
-            
-        except Exception as e:
-            self.log(f"✗ 复制视频文件失败: {str(e)}")
+        # 等待摄像头初始化完成的信号
+        self.wait_for_camera_ready(resume_preview)
+        return True
+            
+    def wait_for_camera_ready(self, resume_preview=False):
+        """在后台等待摄像头初始化完成"""
+        def wait():
+            if self.session.wait_camera_ready() and resume_preview:
+                self.ui(self.start_preview)
+        threading.Thread(target=wait, daemon=True).start()
+        
+    def on_take_saved(self, video_path, take):
+        """一次测量的视频已交接、元数据已写入（录制输出读取线程中调用）"""
+        trace = self.session.trace
+        self.set_status("测量录制完成")
+        # 录制结束，恢复平时的镜像配置
+        with trace.span("restore_scrcpy_profile"):
+            self.restore_scrcpy_profile()
+        # 自动递增文件名编号
+        with trace.span("increment_filename_number"):
+            self.increment_filename_number()
+            
+    def open_session_catalog(self):
+        """打开配置目录下的录制会话目录"""
+        self.session.catalog = open_catalog(os.path.dirname(self.config_file), self.log)
             
     def start_measure_and_record(self):
         """开始测量并录制（摄像头已预先启动）"""
-        if not self.camera_ready or not self.record_process:
+        if not self.session.camera_ready or not self.session.record_process:
             self.log("错误: 摄像头未就绪，请先连接设备")
             return
             
+        # 本次测量的延迟追踪从按钮回调开始，视频保存后写入 trace_<视频名>.json
+        trace = self.session.begin_trace()
+        clicked = trace_clock()
+        
         self.log("开始测量并录制...")
-        self.status_var.set("测量录制中...")
+        self.set_status("测量录制中...")
         
         # 禁用按钮防止重复点击
-        self.start_button.config(state=tk.DISABLED)
+        self.set_button("start", False)
         
         def measure_thread():
+            # 从提交到后台事件循环开始执行的排队时间
+            trace.add("task_queue_wait", submitted, trace_clock())
+            take = None
             try:
-                # 1. 向 Android 设备发送 's' 键
-                self.log("向 Android 设备发送 's' 键...")
-                adb_cmd = self.get_adb_command('shell', 'input', 'text', 's')
-                adb_result = subprocess.run(adb_cmd, 
-                                          capture_output=True, text=True, timeout=10)
-                
-                # 2. 同时向录制子进程发送 's' 命令
-                if self.record_process and self.record_process.stdin:
-                    self.log("向录制子进程发送 's' 命令...")
-                    try:
-                        # 发送's'加换行符，因为子进程使用readline()
-                        self.record_process.stdin.write('s\n')
-                        self.record_process.stdin.flush()
-                        self.log("✓ 录制命令已发送")
-                    except BrokenPipeError:
-                        self.log("✗ 子进程管道已断开")
-                        self.status_var.set("录制失败")
-                        return
-                    except Exception as e:
-                        self.log(f"✗ 发送录制命令失败: {str(e)}")
-                        self.status_var.set("录制失败")
-                        return
-                else:
-                    self.log("✗ 录制子进程未正常启动")
-                    self.status_var.set("录制失败")
-                    return
-                
-                # 3. 检查ADB命令结果
-                if adb_result.returncode == 0:
-                    self.log("✓ 成功向设备发送 's' 键")
-                else:
-                    self.log(f"✗ 发送按键失败: {adb_result.stderr}")
+                # 触发前先切换到最轻的镜像配置并等待scrcpy重启完成，采集期间不再重启scrcpy；
+                # 视频保存后恢复，录制失败时由超时兜底恢复
+                with trace.span("enter_capture_profile"):
+                    self.enter_capture_profile()
                 
-                # 4. 录制已开始，更新状态
-                self.log("录制已开始，等待完成...")
-                self.status_var.set("正在录制...")
+                # 同时向 Android 设备和录制子进程发送 's'，录制完成后由 on_take_saved 更新状态
+                take = self.session.measure(trace)
+                self.set_status("正在录制...")
+                self.ui(self.root.after, int(TAKE_TIMEOUT * 1000), self.restore_scrcpy_profile, take)
                 
                 # 不等待子进程退出，让它继续运行以便进行下一次录制
                 
-            except subprocess.TimeoutExpired:
+            except MeasurementError as e:
+                self.log(f"✗ {str(e)}")
+                self.set_status("录制失败")
+            except AdbTimeoutError:
                 self.log("操作超时")
-                self.status_var.set("操作超时")
+                self.set_status("操作超时")
             except Exception as e:
                 self.log(f"测量录制过程中发生错误: {str(e)}")
-                self.status_var.set("操作失败")
+                self.set_status("操作失败")
             finally:
+                if take is None:
+                    # 没有触发成功，立即恢复平时的镜像配置
+                    self.restore_scrcpy_profile()
                 # 重新启用按钮（如果摄像头仍然就绪）
-                if self.camera_ready and self.record_process and self.record_process.poll() is not None:
-                    # 录制完成，需要重新启动摄像头
-                    self.camera_ready = False
-                    self.record_process = None
-                    self.log("录制完成，摄像头已关闭")
-                    self.status_var.set("录制完成，可重新连接设备")
-                    self.start_button.config(state=tk.DISABLED)
-                    self.stop_button.config(state=tk.DISABLED)
-                elif self.camera_ready:
-                    self.start_button.config(state=tk.NORMAL)
+                if self.session.check_camera():
+                    self.set_button("start", True)
+                elif not self.session.record_process:
+                    # 录制子进程已退出，需要重新启动摄像头
+                    self.set_status("录制完成，可重新连接设备")
+                    self.set_button("start", False)
+                    self.set_button("stop", False)
                     
-        threading.Thread(target=measure_thread, daemon=True).start()
+        submitted = trace_clock()
+        if not self.run_task(measure_thread, key="measure", device=self.session.serial, timeout=MEASURE_TASK_TIMEOUT):
+            self.set_button("start", True)
+        trace.add("start_measure_and_record", clicked, trace_clock())
         
     def stop_recording(self):
         """停止录制并关闭摄像头"""
         self.log("正在停止录制...")
-        
-        if self.record_process:
-            try:
-                # 首先尝试发送退出命令
-                if self.record_process.stdin and not self.record_process.stdin.closed:
-                    try:
-                        self.log("发送退出命令到录制进程...")
-                        self.record_process.stdin.write('q\n')
-                        self.record_process.stdin.flush()
-                        # 等待进程正常退出
-                        try:
-                            self.record_process.wait(timeout=3)
-                            self.log("✓ 录制进程已正常退出")
-                        except subprocess.TimeoutExpired:
-                            self.log("进程未响应退出命令，尝试终止...")
-                            self.record_process.terminate()
-                            try:
-                                self.record_process.wait(timeout=2)
-                                self.log("✓ 录制进程已终止")
-                            except subprocess.TimeoutExpired:
-                                self.record_process.kill()
-                                self.log("✓ 录制进程已强制终止")
-                    except (BrokenPipeError, OSError):
-                        # 管道已断开，直接终止进程
-                        if self.record_process.poll() is None:
-                            self.record_process.terminate()
-                            try:
-                                self.record_process.wait(timeout=3)
-                                self.log("✓ 录制进程已终止")
-                            except subprocess.TimeoutExpired:
-                                self.record_process.kill()
-                                self.log("✓ 录制进程已强制终止")
-                else:
-                    # stdin已关闭，直接终止进程
-                    if self.record_process.poll() is None:
-                        self.record_process.terminate()
-                        try:
-                            self.record_process.wait(timeout=3)
-                            self.log("✓ 录制进程已终止")
-                        except subprocess.TimeoutExpired:
-                            self.record_process.kill()
-                            self.log("✓ 录制进程已强制终止")
-                            
-            except Exception as e:
-                self.log(f"停止录制时发生错误: {str(e)}")
-            finally:
-                self.record_process = None
-                self.camera_ready = False
-                
-        self.status_var.set("已停止录制")
-        self.start_button.config(state=tk.DISABLED)
-        self.stop_button.config(state=tk.DISABLED)
+        self.session.stop_camera()
+        self.restore_scrcpy_profile()
+        self.set_status("已停止录制")
+        self.set_button("start", False)
+        self.set_button("stop", False)
         self.log("录制已停止，可重新连接设备启动摄像头")
         
     def on_closing(self):
@@ -1832,30 +2225,28 @@ class AndroidControlApp:
             self.stop_preview()
         
         # 停止scrcpy
-        if self.scrcpy_process:
+        if self.scrcpy_supervisor:
             self.stop_scrcpy()
         
-        # 关闭录制进程
-        if self.record_process:
-            try:
-                if self.record_process.stdin and not self.record_process.stdin.closed:
-                    try:
-                        self.record_process.stdin.write('q\n')
-                        self.record_process.stdin.flush()
-                        self.record_process.wait(timeout=2)
-                    except:
-                        pass
-                if self.record_process.poll() is None:
-                    self.record_process.terminate()
-                    try:
-                        self.record_process.wait(timeout=2)
-                    except subprocess.TimeoutExpired:
-                        self.record_process.kill()
-            except:
-                pass
-                
+        # 关闭常驻shell会话、录制进程、链路监视、后台 payload 监视和时钟同步
+        try:
+            self.session.close()
+            self.log("程序退出，已清理录制进程")
+        except Exception as e:
+            self.log(f"✗ 关闭测量会话失败: {e}")
+        self.stop_device_tracker()
+        
+        # 关闭会话目录
+        if self.session.catalog:
+            self.session.catalog.close()
+            self.session.catalog = None
+        
         # 保存配置
         self.save_config()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.tasks.stop()
+        self.log_pipeline.stop()
         
         # 关闭窗口
         self.root.destroy()
@@ -1884,117 +2275,94 @@ class AndroidControlApp:
                 self.log(f"✓ 已打开文件夹: {payload_dir}")
             else:
                 self.log(f"✓ Payload文件夹路径: {payload_dir}")
-                messagebox.showinfo("文件夹路径", f"Payload文件夹路径:\n{payload_dir}")
+                self.ui(messagebox.showinfo, "文件夹路径", f"Payload文件夹路径:\n{payload_dir}")
                 
         except Exception as e:
             self.log(f"✗ 打开文件夹失败: {str(e)}")
             # 如果打开失败，至少显示路径
             payload_dir = os.path.join(os.getcwd(), "payloads", "MagicMirror")
-            messagebox.showinfo("文件夹路径", f"无法自动打开文件夹，请手动访问:\n{payload_dir}")
+            self.ui(messagebox.showinfo, "文件夹路径", f"无法自动打开文件夹，请手动访问:\n{payload_dir}")
         
     def get_payload(self):
         """获取 Payload 文件"""
         if not self.adb_ready:
             self.log("错误: ADB工具未就绪")
-            self.status_var.set("ADB工具未就绪")
+            self.set_status("ADB工具未就绪")
             return
             
         self.log("开始获取 Payload 文件...")
-        self.status_var.set("获取 Payload 中...")
+        self.set_status("获取 Payload 中...")
         
         def payload_thread():
             try:
-                # 创建本地下载目录
-                local_dir = "payloads"
-                if not os.path.exists(local_dir):
-                    os.makedirs(local_dir)
-                    
-                # 列出设备上的文件
+                # 列出设备上的文件，与本地清单比较后只下载新增或变化的文件
                 self.log("检查设备上的 Payload 文件...")
-                ls_cmd = self.get_adb_command('shell', 'ls', '-la', '/sdcard/Download/MagicMirror/')
-                ls_result = subprocess.run(ls_cmd, capture_output=True, text=True, timeout=15)
                 
-                if ls_result.returncode != 0:
-                    self.log("无法访问设备上的 MagicMirror 目录")
-                    self.log("请确保设备已连接且目录存在")
-                    self.status_var.set("获取失败")
-                    return
-                    
-                self.log("设备上的文件:")
-                self.log(ls_result.stdout)
+                def on_progress(done_bytes, total_bytes, done_files, total_files, throughput):
+                    percent = done_bytes * 100 // total_bytes if total_bytes else 100
+                    self.set_progress("payload", percent)
+                    self.set_status(f"获取 Payload 中... {percent}% "
+                                        f"({done_files}/{total_files}, {format_bytes(throughput)}/s)")
                 
-                # 获取最新的 payload 文件
-                # 这里假设我们需要获取所有 payload 文件
-                self.log("开始下载 Payload 文件...")
+                def on_busy():
+                    self.log("⚠ 后台同步正在进行，等待其完成后继续获取...")
+                    self.set_status("等待后台同步...")
                 
-                pull_cmd = self.get_adb_command('pull', '/sdcard/Download/MagicMirror/', local_dir)
-                pull_result = subprocess.run(pull_cmd, capture_output=True, text=True, timeout=30)
+                payload_sync, result = self.session.sync_payloads(progress=on_progress, on_busy=on_busy)
+                if result is None:
+                    self.log("设备上的 MagicMirror 目录为空")
+                    self.set_status("Payload 获取完成")
+                    return
                 
-                if pull_result.returncode == 0:
-                    self.log("✓ Payload 文件下载成功")
-                    self.log(f"文件已保存到: {os.path.abspath(local_dir)}")
-                    
-                    # 显示下载的文件
-                    if os.path.exists(local_dir):
-                        files = os.listdir(local_dir)
-                        if files:
-                            self.log("下载的文件:")
-                            for file in files:
-                                self.log(f"  - {file}")
-                        else:
-                            self.log("下载目录为空")
-               
-                    self.status_var.set("Payload 获取完成")
+                if not result.pulled and not result.failed:
+                    self.log(f"✓ Payload 已是最新 ({result.skipped} 个文件未变化)")
                 else:
-                    self.log(f"✗ 下载失败: {pull_result.stderr}")
-                    self.status_var.set("获取失败")
+                    self.log(f"✓ 下载 {len(result.pulled)} 个文件 ({format_bytes(result.bytes)}), "
+                             f"用时 {result.seconds:.1f}s, 平均 {format_bytes(result.throughput)}/s, "
+                             f"方式: {result.method}")
+                    for path in result.pulled[:20]:
+                        self.log(f"  - {path}")
+                    if len(result.pulled) > 20:
+                        self.log(f"  ... 另有 {len(result.pulled) - 20} 个文件")
+                self.log(f"文件已保存到: {os.path.abspath(payload_sync.local_dir)}")
+                
+                if result.failed:
+                    for path, error in result.failed:
+                        self.log(f"✗ 下载失败: {path}: {error}")
+                    self.set_status(f"获取完成，{len(result.failed)} 个文件失败")
+                else:
+                    self.set_status("Payload 获取完成")
                     
-            except subprocess.TimeoutExpired:
+            except AdbTimeoutError:
                 self.log("下载超时")
-                self.status_var.set("下载超时")
+                self.set_status("下载超时")
+            except LinkDownError as e:
+                self.log(f"✗ {str(e)}")
+                self.set_status("设备链路断开")
+            except AdbError as e:
+                self.log(f"无法访问设备上的 MagicMirror 目录: {str(e)}")
+                self.log("请确保设备已连接且目录存在")
+                self.set_status("获取失败")
             except Exception as e:
                 self.log(f"获取 Payload 时发生错误: {str(e)}")
-                self.status_var.set("获取失败")
+                self.set_status("获取失败")
+            finally:
+                self.set_progress("payload", None)
                 
-        threading.Thread(target=payload_thread, daemon=True).start()
+        # Payload 传输的超时随数据量增长（见 payload_sync），这里不设截止时间；
+        # 与后台监视之间由清单锁互斥，不占用设备锁，以免长时间传输推迟测量触发
+        self.run_task(payload_thread, key="payload")
 
 def main():
     """主函数"""
     root = tk.Tk()
     app = AndroidControlApp(root)
     
-    def on_closing():
-        """程序关闭时的清理工作"""
-        # 保存最新配置
-        app.save_config()
-        
-        # 停止scrcpy
-        if hasattr(app, 'scrcpy_process') and app.scrcpy_process:
-            try:
-                app.stop_scrcpy()
-            except:
-                pass
-        
-        if hasattr(app, 'record_process') and app.record_process:
-            try:
-                app.record_process.terminate()
-                app.log("程序退出，已清理录制进程")
-            except:
-                pass
-        
-        # 停止预览
-        if hasattr(app, 'preview_active') and app.preview_active:
-            app.stop_preview()
-            
-        root.destroy()
-    
-    root.protocol("WM_DELETE_WINDOW", on_closing)
-    
     try:
         root.mainloop()
     except KeyboardInterrupt:
         print("\n程序被用户中断")
-        on_closing()
+        app.on_closing()
 
 if __name__ == "__main__":
     main()
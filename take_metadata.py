@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""测量元数据文件
+
+每次测量在视频旁写入一个 `<视频名>.take.json`，按分节保存触发偏差、时钟偏移等信息，
+分析时可据此校正摄像头视频与设备数据之间的时间差。
+"""
+import json
+import os
+
+TAKE_METADATA_SUFFIX = ".take.json"
+FRAME_TIMES_SUFFIX = ".frames.csv"
+METRICS_SUFFIX = ".metrics.json"
+TRACE_PREFIX = "trace_"
+
+
+def take_metadata_path(video_path):
+    """视频对应的元数据文件路径"""
+    return os.path.splitext(video_path)[0] + TAKE_METADATA_SUFFIX
+
+
+def load_take_metadata(video_path):
+    """读取视频的元数据，不存在时返回空字典"""
+    try:
+        with open(take_metadata_path(video_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_take_metadata(video_path, section, data):
+    """写入（覆盖）元数据中的一个分节，返回元数据文件路径"""
+    metadata = load_take_metadata(video_path)
+    metadata['video'] = os.path.basename(video_path)
+    metadata[section] = data
+    path = take_metadata_path(video_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def metrics_snapshot_path(video_path):
+    """视频对应的指标快照文件路径（见 metrics）"""
+    return os.path.splitext(video_path)[0] + METRICS_SUFFIX
+
+
+def trace_path(video_path):
+    """视频对应的延迟追踪文件路径 trace_<视频名>.json（见 tracing）"""
+    directory, filename = os.path.split(video_path)
+    return os.path.join(directory, TRACE_PREFIX + os.path.splitext(filename)[0] + ".json")
+
+
+def frame_times_path(video_path):
+    """视频对应的逐帧时间戳文件路径"""
+    return os.path.splitext(video_path)[0] + FRAME_TIMES_SUFFIX
+
+
+def write_frame_times(video_path, frame_times):
+    """写入逐帧时间戳（共享单调时钟秒数），返回文件路径"""
+    path = frame_times_path(video_path)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("frame,time\n")
+        for index, frame_time in enumerate(frame_times):
+            f.write(f"{index},{frame_time:.6f}\n")
+    return path
+
+
+def load_frame_times(video_path):
+    """读取逐帧时间戳列表，不存在时返回空列表"""
+    try:
+        with open(frame_times_path(video_path), 'r', encoding='utf-8') as f:
+            next(f, None)
+            return [float(line.split(",")[1]) for line in f if line.strip()]
+    except (OSError, ValueError, IndexError):
+        return []
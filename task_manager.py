@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""设备任务管理（单个 asyncio 事件循环）
+
+界面上的每个操作原来都各自启动一个守护线程，线程里调用带固定超时的阻塞命令，既不能取消，
+也不限制并发，连续点击会叠加多个同时进行的 adb 调用。DeviceTaskManager 在一个后台线程中
+运行唯一的 asyncio 事件循环，所有设备操作都作为任务提交给它：
+
+- 同一 key 的任务（如“连接设备”）未完成时重复提交会被拒绝，或按 replace=True 取消旧任务；
+- 同一设备的任务按提交顺序串行执行（每台设备一把 asyncio.Lock）；
+- 全局并发数由信号量限制；
+- 每个任务可设截止时间，超时后立即报告 TaskTimeoutError；
+- 外部命令用 asyncio.create_subprocess_exec 执行（run_process），超时即结束子进程；
+- 结果和异常通过 dispatch 回调交回调用方，图形界面用它把回调放入同一个队列，在 Tk 主线程中执行。
+
+阻塞函数（adb 服务器协议调用等）在线程池中执行，超时或取消后底层调用仍会运行到结束，
+在此之前该设备的锁和并发名额不会释放，保证同一设备上不会出现重叠的调用。
+"""
+import concurrent.futures
+import subprocess
+import threading
+import time
+
+from lazy_import import lazy_module
+
+# asyncio 的导入耗时约占冷启动的一半，事件循环线程启动时才真正导入
+asyncio = lazy_module('asyncio')
+
+# 全局同时运行的任务数
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+class TaskRejectedError(RuntimeError):
+    """同一 key 的任务仍在进行"""
+
+
+class TaskTimeoutError(TimeoutError):
+    """任务超过截止时间"""
+
+
+class DeviceTaskManager:
+    """在后台事件循环中调度设备任务"""
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, dispatch=None, log=print):
+        self.max_concurrency = max_concurrency
+        self.dispatch = dispatch  # dispatch(callback, *args)：把回调交给调用方的线程执行
+        self.log = log
+        self.loop = None
+        self.thread = None
+        self._ready = threading.Event()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency + 2,
+                                                               thread_name_prefix="device-task")
+        self._semaphore = None
+        self._device_locks = {}
+        self._tasks = {}  # key -> concurrent.futures.Future
+
+    # --- 生命周期 ---
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run_loop, name="device-tasks", daemon=True)
+            self.thread.start()
+            self._ready.wait()
+        return self
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def stop(self, timeout=2.0):
+        """取消所有任务并停止事件循环"""
+        if self.loop is None:
+            return
+        self.cancel_all()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        self._executor.shutdown(wait=False)
+        self.thread = None
+
+    # --- 提交 ---
+
+    def submit(self, func, *args, key=None, device=None, timeout=None, replace=False,
+               on_done=None, on_error=None):
+        """提交任务，返回 concurrent.futures.Future
+
+        func 可以是普通函数（在线程池中执行）或协程函数。key 相同的任务不会同时存在：
+        replace=False 时抛出 TaskRejectedError，replace=True 时先取消旧任务。device 非空时与该设备
+        的其他任务串行执行。timeout 为从提交开始计算的截止时间（秒，包括排队时间）。
+        完成后通过 dispatch 调用 on_done(结果) 或 on_error(异常)；取消的任务不回调。
+        """
+        self.start()
+        if key is not None:
+            previous = self._tasks.get(key)
+            if previous is not None and not previous.done():
+                if not replace:
+                    raise TaskRejectedError(f"{key} 正在进行")
+                previous.cancel()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        future = asyncio.run_coroutine_threadsafe(
+            self._run_task(func, args, device, deadline), self.loop)
+        if key is not None:
+            self._tasks[key] = future
+            future.add_done_callback(lambda f, key=key: self._forget(key, f))
+        if on_done or on_error:
+            future.add_done_callback(lambda f: self._report(f, on_done, on_error))
+        return future
+
+    def call(self, func, *args, timeout=None, device=None):
+        """同步提交并等待结果（供非界面线程使用）"""
+        return self.submit(func, *args, device=device, timeout=timeout).result()
+
+    def running(self, key):
+        future = self._tasks.get(key)
+        return future is not None and not future.done()
+
+    def cancel(self, key):
+        future = self._tasks.get(key)
+        if future is not None:
+            future.cancel()
+
+    def cancel_all(self):
+        for future in list(self._tasks.values()):
+            future.cancel()
+
+    def _forget(self, key, future):
+        if self._tasks.get(key) is future:
+            del self._tasks[key]
+
+    def _report(self, future, on_done, on_error):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            callback, argument = on_done, future.result()
+        else:
+            callback, argument = on_error, error
+        if callback is None:
+            if error is not None:
+                self.log(f"✗ 后台任务失败: {error}")
+            return
+        if self.dispatch:
+            self.dispatch(callback, argument)
+        else:
+            callback(argument)
+
+    # --- 执行 ---
+
+    def _device_lock(self, device):
+        lock = self._device_locks.get(device)
+        if lock is None:
+            lock = self._device_locks[device] = asyncio.Lock()
+        return lock
+
+    def _remaining(self, deadline):
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TaskTimeoutError("任务超时")
+        return remaining
+
+    async def _acquire(self, primitive, deadline):
+        try:
+            await asyncio.wait_for(primitive.acquire(), self._remaining(deadline))
+        except asyncio.TimeoutError:
+            raise TaskTimeoutError("排队等待超时")
+
+    async def _run_task(self, func, args, device, deadline):
+        held = []
+        pending = None
+        try:
+            if device is not None:
+                lock = self._device_lock(device)
+                await self._acquire(lock, deadline)
+                held.append(lock)
+            await self._acquire(self._semaphore, deadline)
+            held.append(self._semaphore)
+
+            if asyncio.iscoroutinefunction(func):
+                pending = asyncio.ensure_future(func(*args))
+            else:
+                pending = self.loop.run_in_executor(self._executor, func, *args)
+            try:
+                return await asyncio.wait_for(asyncio.shield(pending), self._remaining(deadline))
+            except asyncio.TimeoutError:
+                raise TaskTimeoutError("任务超时")
+        finally:
+            if pending is not None and not pending.done():
+                if asyncio.isfuture(pending) and not isinstance(pending, asyncio.Task):
+                    # 线程池中的调用无法中断：等它结束后再释放设备锁和并发名额
+                    def release(_, held=held):
+                        for primitive in reversed(held):
+                            primitive.release()
+                    pending.add_done_callback(release)
+                    held = []
+                else:
+                    pending.cancel()
+            for primitive in reversed(held):
+                primitive.release()
+
+    # --- 外部命令 ---
+
+    async def run_process(self, args, timeout=None, input=None):
+        """用 create_subprocess_exec 执行命令，返回 subprocess.CompletedProcess（文本输出）
+
+        超时后结束子进程并抛出 TaskTimeoutError；任务被取消时同样结束子进程。
+        """
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(input.encode() if input is not None else None), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise TaskTimeoutError(f"命令超时: {' '.join(str(a) for a in args)}")
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        return subprocess.CompletedProcess(args, process.returncode,
+                                           stdout.decode(errors="replace"), stderr.decode(errors="replace"))
+
+    def run_process_sync(self, args, timeout=None, input=None):
+        """在事件循环中执行外部命令并等待结果（供启动流程等同步代码使用）"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.run_process(args, timeout, input), self.loop).result()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""测试公共夹具：在后台线程中运行 adb 服务器替身（adb_standin_server），不需要真实设备"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adb_client import AdbClient
+from adb_standin_server import StandinAdbServer, StandinDevice
+
+SERIAL = "standin-0001"
+
+
+@pytest.fixture
+def device_root(tmp_path):
+    """映射为设备文件系统的本地目录"""
+    root = tmp_path / "device"
+    root.mkdir()
+    return root
+
+
+@pytest.fixture
+def standin(device_root):
+    """监听随机端口的 adb 服务器替身，带一台设备"""
+    server = StandinAdbServer(("127.0.0.1", 0))
+    server.add_device(StandinDevice(SERIAL, str(device_root)))
+    server.start_background()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(standin):
+    """连接到替身的 AdbClient（不自动启动服务器）"""
+    client = AdbClient(port=standin.server_address[1], timeout=5)
+    yield client
+    client.close()
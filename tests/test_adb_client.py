@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""AdbClient 与 adb 服务器替身之间的协议测试"""
+import os
+import socket
+import stat
+
+import pytest
+
+from adb_client import AdbClient, AdbConnectionError, AdbError, AdbTimeoutError
+from conftest import SERIAL
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_devices(client):
+    assert client.devices() == [(SERIAL, "device")]
+
+
+def test_features(client):
+    assert "shell_v2" in client.features(SERIAL)
+
+
+def test_shell_v2_exit_codes(client):
+    result = client.shell(SERIAL, "echo out; echo err >&2; exit 3")
+    assert result.returncode == 3
+    assert result.stdout == "out\n"
+    assert result.stderr == "err\n"
+    assert client.shell(SERIAL, "true").returncode == 0
+
+
+def test_shell_reuses_transport(client):
+    # 连续命令复用备用连接，结果不能串到下一条命令
+    outputs = [client.shell(SERIAL, f"echo {i}").stdout for i in range(5)]
+    assert outputs == [f"{i}\n" for i in range(5)]
+
+
+def test_exec_out_binary_stream(client, device_root):
+    data = bytes(range(256)) * 64
+    (device_root / "blob.bin").write_bytes(data)
+    conn = client.exec_out(SERIAL, "cat /blob.bin")
+    try:
+        assert conn.read_all() == data
+    finally:
+        conn.close()
+
+
+def test_sync_stat_list_pull(client, device_root, tmp_path):
+    remote = device_root / "sdcard" / "Download"
+    remote.mkdir(parents=True)
+    data = os.urandom(300 * 1024)
+    (remote / "a.bin").write_bytes(data)
+    (remote / "sub").mkdir()
+
+    mode, size, _ = client.stat(SERIAL, "/sdcard/Download/a.bin")
+    assert stat.S_ISREG(mode) and size == len(data)
+    assert client.stat(SERIAL, "/sdcard/Download/missing")[0] == 0
+
+    entries = {name: mode for name, mode, _, _ in client.list_dir(SERIAL, "/sdcard/Download")}
+    assert set(entries) == {"a.bin", "sub"}
+    assert stat.S_ISDIR(entries["sub"])
+
+    chunks = []
+    local = tmp_path / "a.bin"
+    assert client.pull(SERIAL, "/sdcard/Download/a.bin", str(local), chunks.append) == len(data)
+    assert local.read_bytes() == data
+    assert sum(chunks) == len(data)
+    assert not os.path.exists(str(local) + ".part")
+
+
+def test_pull_missing_file_raises_and_keeps_pool_usable(client, tmp_path):
+    local = tmp_path / "missing.bin"
+    with pytest.raises(AdbError):
+        client.pull(SERIAL, "/no/such/file", str(local))
+    assert not local.exists()
+    assert not os.path.exists(str(local) + ".part")
+    # 出错的 sync 连接被丢弃，之后的命令不受影响
+    assert client.shell(SERIAL, "echo ok").stdout == "ok\n"
+
+
+def test_unknown_serial_raises_adb_error(client):
+    with pytest.raises(AdbError) as excinfo:
+        client.shell("no-such-device", "true")
+    assert not isinstance(excinfo.value, AdbConnectionError)
+
+
+def test_connection_refused_raises_connection_error():
+    client = AdbClient(port=free_port(), timeout=1)
+    with pytest.raises(AdbConnectionError):
+        client.devices()
+
+
+def test_start_server_failure_raises_connection_error(tmp_path):
+    # adb 可执行文件不存在：start-server 失败也按连接失败报告
+    client = AdbClient(port=free_port(), adb_path=str(tmp_path / "adb"), timeout=1)
+    with pytest.raises(AdbConnectionError):
+        client.devices()
+
+
+def test_read_timeout_raises_timeout_error(client):
+    conn = client.exec_out(SERIAL, "sleep 2", timeout=0.2)
+    try:
+        with pytest.raises(AdbTimeoutError):
+            conn.recv()
+    finally:
+        conn.close()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""设备/主机时钟偏移估计测试
+
+替身设备的 shell 在本机执行，设备 realtime 时钟就是本机的 time.time()，
+因此估计出的偏移应接近 time.time() - time.perf_counter()。
+"""
+import time
+
+import pytest
+
+from clock_sync import ClockEstimate, ClockOffsetEstimator, ClockSample, parse_device_time
+from conftest import SERIAL
+
+
+def test_parse_device_time():
+    assert parse_device_time('realtime', "1700000000123456789\n") == pytest.approx(1700000000.123456789)
+    # 不支持 %N 的 date 原样输出
+    assert parse_device_time('realtime', "1700000000%N\n") is None
+    assert parse_device_time('uptime', "12345.67 54321.00\n") == pytest.approx(12345.67)
+    assert parse_device_time('uptime', "") is None
+
+
+def test_sample_offset_uses_round_trip_midpoint():
+    sample = ClockSample(10.0, 10.2, 110.15)
+    assert sample.rtt == pytest.approx(0.2)
+    assert sample.host_time == pytest.approx(10.1)
+    assert sample.offset == pytest.approx(100.05)
+
+
+def test_estimate_mapping_round_trip():
+    estimate = ClockEstimate(offset=50.0, drift=20e-6, reference=100.0, uncertainty=0.001,
+                             source='realtime', samples=16)
+    for host_time in (90.0, 100.0, 250.0):
+        assert estimate.device_to_host(estimate.host_to_device(host_time)) == pytest.approx(host_time)
+    frame_times = [100.0, 100.1, 100.2, 100.3]
+    device_time = estimate.host_to_device(100.15)
+    assert estimate.device_to_frame(device_time, frame_times) == pytest.approx(1.5)
+    assert estimate.device_to_frame(device_time, []) is None
+    assert estimate.to_dict()['drift_ppm'] == pytest.approx(20.0)
+
+
+def test_estimator_against_standin(client):
+    estimator = ClockOffsetEstimator(client, SERIAL).open()
+    try:
+        estimator.burst(count=8, interval=0.0)
+        estimator.burst(count=8, interval=0.0)
+        estimate = estimator.estimate()
+    finally:
+        estimator.close()
+    assert estimate.source == 'realtime'
+    assert estimate.samples == 16
+    expected = time.time() - time.perf_counter()
+    assert estimate.offset == pytest.approx(expected, abs=0.05)
+    assert estimate.uncertainty < 0.05
+
+
+def test_estimator_without_bursts(client):
+    estimator = ClockOffsetEstimator(client, SERIAL)
+    assert estimator.estimate() is None
+
+
+def test_drift_fit():
+    estimator = ClockOffsetEstimator.__new__(ClockOffsetEstimator)
+    estimator.source = 'uptime'
+    estimator.total_samples = 40
+    # 偏移以 100 ppm 线性变化
+    estimator.bursts = [(t, 5.0 + 100e-6 * t, 0.002) for t in (0.0, 10.0, 20.0, 30.0)]
+    estimate = estimator.estimate()
+    assert estimate.drift == pytest.approx(100e-6)
+    assert estimate.reference == 30.0
+    assert estimate.offset == pytest.approx(5.0 + 100e-6 * 30.0)
+    assert estimate.uncertainty == pytest.approx(0.001)
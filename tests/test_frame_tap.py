@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""FrameTapWriter / FrameTapReader 共享内存环形缓冲区测试（seqlock 式的槽位序号校验）"""
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from frame_tap import LATEST, LATEST_OFFSET, SLOT_HEADER, SLOTS_OFFSET, FrameTapReader, FrameTapWriter
+
+
+def retrack(shm):
+    """读写两端实际位于不同进程；Python 3.13 之前读取端附加时会从 resource_tracker 注销该名称，
+    在同一进程中会抵消写入端的登记，这里重新登记，避免写入端 unlink 时 resource_tracker 报错"""
+    if sys.version_info < (3, 13) and os.name == "posix":
+        from multiprocessing import resource_tracker
+        resource_tracker.register(shm._name, "shared_memory")
+
+
+def attach(name):
+    reader = FrameTapReader(name)
+    retrack(reader.shm)
+    return reader
+
+
+@pytest.fixture
+def tap():
+    # 画面不超过最大尺寸时直接复制，不需要 cv2
+    writer = FrameTapWriter(name=None, max_size=(8, 6), slots=3, decimation=1)
+    reader = attach(writer.name)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def frame(value, width=8, height=6):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+def test_read_latest_frame(tap):
+    writer, reader = tap
+    assert reader.read() is None
+    writer.write(frame(7), 1.25, 42)
+    result = reader.read()
+    assert result.shape == (6, 8, 3)
+    assert (result == 7).all()
+    assert reader.frame_time == 1.25 and reader.frame_index == 42
+    # 同一帧只返回一次
+    assert reader.read() is None
+
+
+def test_read_returns_copy(tap):
+    writer, reader = tap
+    writer.write(frame(1), 0.0, 0)
+    result = reader.read()
+    for index in range(1, 4):
+        writer.write(frame(100 + index), float(index), index)
+    assert (result == 1).all()
+
+
+def test_reader_skips_to_newest_after_wraparound(tap):
+    writer, reader = tap
+    for index in range(7):
+        writer.write(frame(index), float(index), index)
+    result = reader.read()
+    assert (result == 6).all()
+    assert reader.frame_index == 6
+    assert reader.last_sequence == 7
+
+
+def test_slot_being_written_is_discarded(tap):
+    writer, reader = tap
+    writer.write(frame(5), 0.0, 0)
+    # 模拟写入端正在覆盖最新槽位：写入期间槽位序号为 0
+    SLOT_HEADER.pack_into(writer.shm.buf, SLOTS_OFFSET, 0, 0.0, 0, 0, 0)
+    assert reader.read() is None
+    # 写完后序号恢复，读取方才接受该帧
+    SLOT_HEADER.pack_into(writer.shm.buf, SLOTS_OFFSET, 1, 0.5, 3, 8, 6)
+    assert reader.read() is not None
+    assert reader.frame_index == 3
+
+
+def test_stale_latest_sequence_is_discarded(tap):
+    writer, reader = tap
+    for index in range(4):
+        writer.write(frame(index), float(index), index)
+    # 最新序号指向已被下一轮覆盖的槽位（槽位序号不一致）
+    LATEST.pack_into(writer.shm.buf, LATEST_OFFSET, 1)
+    assert reader.read() is None
+
+
+def test_offer_decimates_and_writes_in_background():
+    writer = FrameTapWriter(max_size=(8, 6), slots=2, decimation=3)
+    reader = attach(writer.name)
+    try:
+        writer.offer(frame(1), 0.0, 0)
+        writer.offer(frame(2), 0.1, 1)
+        assert writer._pending is None
+        writer.offer(frame(3), 0.2, 2)
+        for _ in range(200):
+            result = reader.read()
+            if result is not None:
+                break
+            writer._thread.join(0.01)
+        assert (result == 3).all()
+        assert reader.frame_index == 2
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_rejects_foreign_memory():
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(create=True, size=256)
+    try:
+        with pytest.raises(ValueError):
+            FrameTapReader(shm.name)
+        retrack(shm)
+    finally:
+        shm.close()
+        shm.unlink()
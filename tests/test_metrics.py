@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""指标注册表测试：Prometheus 文本输出与跨进程快照并入"""
+import json
+
+import pytest
+
+from metrics import MetricsRegistry
+
+
+def make_registry():
+    registry = MetricsRegistry()
+    counter = registry.counter("frames_total", "帧数")
+    commands = registry.counter("commands_total", "命令数", ("verb",))
+    gauge = registry.gauge("fps", "帧率")
+    histogram = registry.histogram("save_seconds", "保存时间", ("codec",), buckets=(0.1, 1.0))
+    counter.inc(5)
+    commands.inc(verb="shell")
+    commands.inc(2, verb='pull "a"')
+    gauge.set(239.5)
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, codec="mjpg")
+    return registry
+
+
+def test_expose_text_format():
+    text = make_registry().expose()
+    lines = text.splitlines()
+    assert "# TYPE frames_total counter" in lines
+    assert "frames_total 5" in lines
+    assert 'commands_total{verb="shell"} 1' in lines
+    assert 'commands_total{verb="pull \\"a\\""} 2' in lines
+    assert "fps 239.5" in lines
+    assert 'save_seconds_bucket{codec="mjpg",le="0.1"} 1' in lines
+    assert 'save_seconds_bucket{codec="mjpg",le="1"} 3' in lines
+    assert 'save_seconds_bucket{codec="mjpg",le="+Inf"} 4' in lines
+    assert 'save_seconds_count{codec="mjpg"} 4' in lines
+    assert text.endswith("\n")
+
+
+def test_snapshot_absorb_round_trip():
+    source = make_registry()
+    # 快照经 JSON 传给主进程（录制子进程通过标准输出）
+    snapshot = json.loads(json.dumps(source.snapshot(), ensure_ascii=False))
+    target = MetricsRegistry()
+    target.absorb(snapshot)
+    assert target.expose() == source.expose()
+    assert target.histogram("save_seconds", "", ("codec",)).buckets == (0.1, 1.0)
+
+
+def test_absorb_replaces_cumulative_values():
+    source = make_registry()
+    target = MetricsRegistry()
+    target.absorb(source.snapshot())
+    source.counter("frames_total", "帧数").inc(3)
+    target.absorb(source.snapshot())
+    # 计数器是子进程的累计值，再次并入时替换而不是相加
+    assert target.counter("frames_total", "帧数").get() == 8
+
+
+def test_register_conflicting_kind():
+    registry = make_registry()
+    assert registry.counter("frames_total", "帧数") is registry.counter("frames_total", "其他说明")
+    with pytest.raises(ValueError):
+        registry.gauge("frames_total", "帧数")
+
+
+def test_write_snapshot(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    make_registry().write_snapshot(path, extra={'take': "video_001"})
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data['take'] == "video_001"
+    assert data['metrics']['frames_total']['type'] == "counter"
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""PayloadSync 增量同步测试（tar 流与 sync 协议）"""
+import os
+import threading
+
+import pytest
+
+from payload_sync import PayloadSync, REMOTE_PAYLOAD_DIR, SyncInterrupted, manifest_lock
+from conftest import SERIAL
+
+
+@pytest.fixture
+def remote_dir(device_root):
+    path = device_root / REMOTE_PAYLOAD_DIR.lstrip("/")
+    path.mkdir(parents=True)
+    return path
+
+
+def write_payloads(remote_dir, count, size=4096, prefix="p"):
+    files = {}
+    for index in range(count):
+        relative = f"{prefix}{index // 5}/{prefix}{index}.bin"
+        path = remote_dir / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = os.urandom(size)
+        path.write_bytes(data)
+        files[relative] = data
+    return files
+
+
+def make_sync(client, tmp_path, method="tar"):
+    return PayloadSync(client, SERIAL, local_root=str(tmp_path / "local"), log=lambda message: None,
+                       method=method)
+
+
+def assert_local(payload_sync, files):
+    for relative, data in files.items():
+        with open(payload_sync.local_path(relative), "rb") as f:
+            assert f.read() == data
+
+
+@pytest.mark.parametrize("method", ["tar", "pull"])
+def test_full_sync(client, tmp_path, remote_dir, method):
+    files = write_payloads(remote_dir, 12)
+    payload_sync = make_sync(client, tmp_path, method)
+    result = payload_sync.sync()
+    assert result.method == method
+    assert sorted(result.pulled) == sorted(files)
+    assert result.bytes == sum(len(data) for data in files.values())
+    assert result.failed == []
+    assert_local(payload_sync, files)
+    assert set(payload_sync.load_manifest()) == set(files)
+
+
+def test_noop_sync(client, tmp_path, remote_dir):
+    files = write_payloads(remote_dir, 10)
+    payload_sync = make_sync(client, tmp_path)
+    payload_sync.sync()
+    result = payload_sync.sync()
+    assert result.pulled == []
+    assert result.skipped == len(files)
+    assert result.method is None
+
+
+def test_incremental_tar_sync(client, tmp_path, remote_dir):
+    files = write_payloads(remote_dir, 10)
+    payload_sync = make_sync(client, tmp_path)
+    payload_sync.sync()
+
+    added = write_payloads(remote_dir, 8, prefix="q")
+    changed = "p0/p0.bin"
+    files[changed] = os.urandom(8192)
+    (remote_dir / changed).write_bytes(files[changed])
+    files.update(added)
+    # 本地被删除的文件也要重新下载
+    os.remove(payload_sync.local_path("p1/p5.bin"))
+
+    result = payload_sync.sync()
+    assert result.method == "tar"
+    assert sorted(result.pulled) == sorted(list(added) + [changed, "p1/p5.bin"])
+    assert result.skipped == 8
+    assert_local(payload_sync, files)
+
+
+def test_interrupted_sync_keeps_finished_files(client, tmp_path, remote_dir):
+    files = write_payloads(remote_dir, 3, size=300 * 1024)
+    payload_sync = make_sync(client, tmp_path, method="pull")
+    state = {'bytes': 0}
+
+    def throttle(length):
+        state['bytes'] += length
+        if state['bytes'] > 400 * 1024:
+            raise SyncInterrupted("暂停")
+
+    with pytest.raises(SyncInterrupted):
+        payload_sync.sync(throttle=throttle)
+    lock = manifest_lock(payload_sync.manifest_path)
+    assert lock.acquire(blocking=False)
+    lock.release()
+    assert len(payload_sync.load_manifest()) == 1
+
+    result = payload_sync.sync()
+    assert len(result.pulled) == 2 and result.skipped == 1
+    assert_local(payload_sync, files)
+
+
+def test_busy_sync_reports_and_waits(client, tmp_path, remote_dir):
+    write_payloads(remote_dir, 2)
+    payload_sync = make_sync(client, tmp_path, method="pull")
+    lock = manifest_lock(payload_sync.manifest_path)
+    lock.acquire()
+    timer = threading.Timer(0.2, lock.release)
+    timer.start()
+    busy = []
+    result = payload_sync.sync(on_busy=lambda: busy.append(True))
+    timer.join()
+    assert busy == [True]
+    assert len(result.pulled) == 2
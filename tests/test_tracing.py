@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Tracer（Chrome 追踪格式）测试"""
+import json
+import threading
+
+import pytest
+
+from tracing import Tracer, clock
+
+
+def spans(events):
+    return [event for event in events if event['ph'] == "X"]
+
+
+def test_add_and_instant():
+    tracer = Tracer("gui")
+    tracer.add("trigger", 1.0, 1.0025, track="main", method="sendevent")
+    tracer.instant("first_frame", at=1.5, track="recorder")
+    tracer.add("ignored", None, 2.0)
+    events = tracer.events()
+
+    span = spans(events)[0]
+    assert span['name'] == "trigger"
+    assert span['ts'] == pytest.approx(1e6)
+    assert span['dur'] == pytest.approx(2500.0)
+    assert span['args'] == {'method': "sendevent"}
+    instant = [event for event in events if event['ph'] == "i"][0]
+    assert instant['ts'] == pytest.approx(1.5e6)
+    assert instant['tid'] != span['tid']
+    assert len(spans(events)) == 1
+
+    metadata = {(event['name'], event['args']['name']) for event in events if event['ph'] == "M"}
+    assert metadata == {("process_name", "gui"), ("thread_name", "main"), ("thread_name", "recorder")}
+
+
+def test_negative_duration_is_clamped():
+    tracer = Tracer()
+    tracer.add("backwards", 2.0, 1.0)
+    assert spans(tracer.events())[0]['dur'] == 0.0
+
+
+def test_span_records_error():
+    tracer = Tracer()
+    with tracer.span("ok", track="t") as args:
+        args['bytes'] = 10
+    with pytest.raises(RuntimeError):
+        with tracer.span("fails", track="t"):
+            raise RuntimeError("设备断开")
+    ok, fails = spans(tracer.events())
+    assert ok['args'] == {'bytes': 10}
+    assert fails['args'] == {'error': "设备断开"}
+    assert ok['ts'] <= fails['ts']
+
+
+def test_default_track_is_thread_name():
+    tracer = Tracer()
+    thread = threading.Thread(target=lambda: tracer.instant("worker_event"), name="worker")
+    thread.start()
+    thread.join()
+    names = [event['args']['name'] for event in tracer.events() if event['name'] == "thread_name"]
+    assert names == ["worker"]
+
+
+def test_events_sorted_and_drain():
+    tracer = Tracer()
+    tracer.add("late", 3.0, 4.0)
+    tracer.add("early", 1.0, 2.0)
+    assert [event['name'] for event in spans(tracer.events())] == ["early", "late"]
+    drained = tracer.drain()
+    assert len(spans(drained)) == 2
+    assert spans(tracer.events()) == []
+
+
+def test_absorb_recorder_events_round_trip(tmp_path):
+    recorder = Tracer("recorder")
+    recorder.pid = 4242  # 模拟录制子进程
+    start = clock()
+    recorder.add("encode", start, start + 0.01, track="writer")
+    # 录制子进程把事件以 JSON 输出到标准输出
+    payload = json.loads(json.dumps(recorder.drain(), ensure_ascii=False))
+
+    tracer = Tracer("gui")
+    tracer.add("trigger", start - 0.001, start)
+    tracer.absorb(payload)
+    path = tracer.write(str(tmp_path / "trace_take.json"), metadata={'take': "take"})
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data['otherData'] == {'take': "take", 'clock': "perf_counter"}
+    pids = {event['pid'] for event in spans(data['traceEvents'])}
+    assert pids == {4242, tracer.pid}
+    assert any(event['name'] == "process_name" and event['args']['name'] == "recorder"
+               for event in data['traceEvents'])
+    assert not (tmp_path / "trace_take.json.tmp").exists()
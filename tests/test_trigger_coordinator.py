@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""TriggerCoordinator 双路触发测试"""
+import time
+
+from trigger_coordinator import TakeTrigger, TriggerCoordinator, clock
+
+
+def test_fire_runs_both_actions_near_target():
+    coordinator = TriggerCoordinator()
+    calls = {}
+
+    def device_action():
+        calls['device'] = clock()
+        return ("sendevent", 1.5)
+
+    def camera_action():
+        calls['camera'] = clock()
+
+    take = coordinator.fire(device_action, camera_action)
+    assert take.device_result == ("sendevent", 1.5)
+    assert take.device_error is None and take.camera_error is None
+    assert calls['device'] >= take.target_time
+    assert calls['camera'] >= take.target_time
+    # 两路几乎同时开始（共享单调时钟）
+    assert abs(take.device_start - take.camera_start) < 0.02
+    assert take.device_start <= take.device_end and take.camera_start <= take.camera_end
+
+
+def test_on_take_called_before_actions():
+    coordinator = TriggerCoordinator()
+    order = []
+    take = coordinator.fire(lambda: order.append("device"), lambda: order.append("camera"),
+                            on_take=lambda t: order.append(t))
+    assert order[0] is take
+    assert sorted(order[1:]) == ["camera", "device"]
+
+
+def test_errors_are_recorded_without_stopping_other_side():
+    coordinator = TriggerCoordinator()
+    camera_called = []
+
+    def device_action():
+        raise RuntimeError("adb 断开")
+
+    take = coordinator.fire(device_action, lambda: camera_called.append(True))
+    assert take.device_error == "adb 断开"
+    assert camera_called == [True]
+    # 失败的触发不参与延迟学习
+    assert coordinator.device_latency is None
+
+    take = coordinator.fire(lambda: None, lambda: (_ for _ in ()).throw(OSError("管道已关闭")))
+    assert take.camera_error == "管道已关闭"
+    assert take.device_error is None
+
+
+def test_compensation_delays_faster_side():
+    coordinator = TriggerCoordinator(compensate=True, smoothing=1.0)
+    assert coordinator.planned_delays() == (0.0, 0.0)
+    coordinator.device_latency = 0.030
+    coordinator.camera_latency = 0.010
+    device_delay, camera_delay = coordinator.planned_delays()
+    assert device_delay == 0.0
+    assert abs(camera_delay - 0.020) < 1e-9
+
+    take = coordinator.fire(lambda: None, lambda: None)
+    assert take.camera_start - take.target_time >= 0.020
+    assert take.camera_start - take.device_start > 0.015
+
+
+def test_complete_learns_camera_latency_and_skew():
+    coordinator = TriggerCoordinator(smoothing=0.5)
+    take = coordinator.fire(lambda: time.sleep(0.002), lambda: None)
+    coordinator.complete(take, camera_received=take.camera_start + 0.001,
+                         camera_first_frame=take.camera_start + 0.010)
+    assert abs(coordinator.camera_latency - 0.010) < 1e-9
+    assert take.skew_ms is not None
+    expected = (take.camera_first_frame - take.device_effect_time) * 1000.0
+    assert abs(take.skew_ms - expected) < 1e-9
+
+    data = take.to_dict()
+    assert data['clock'] == "perf_counter"
+    assert abs(data['camera_first_frame_ms'] - (take.camera_first_frame - take.target_time) * 1000.0) < 0.001
+
+    # 平滑：新样本只移动一半
+    take = coordinator.fire(lambda: None, lambda: None)
+    coordinator.complete(take, camera_first_frame=take.camera_start + 0.030)
+    assert abs(coordinator.camera_latency - 0.020) < 1e-6
+
+
+def test_take_without_device_times():
+    take = TakeTrigger(clock(), 0.0, 0.0)
+    assert take.device_effect_time is None
+    assert take.skew_ms is None
+    assert take.to_dict()['device_effect_ms'] is None
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""单次测量的端到端延迟追踪
+
+点击"开始测量并录制"之后，时间花在按钮回调、adb 按键注入、写入录制子进程标准输入、子进程唤醒、
+首帧/末帧、编码、视频交接还是编号递增上，原来只能从日志时间戳中拼凑。Tracer 按"区间"（span）
+记录各环节的起止时间，每次测量在视频旁写入一个 Chrome 追踪格式的 `trace_<视频名>.json`，
+可直接在 chrome://tracing 或 https://ui.perfetto.dev 中打开。
+
+- 两个进程都使用共享单调时钟 time.perf_counter()（见 trigger_coordinator），时间戳可直接比较；
+- 录制子进程用自己的 Tracer 记录，保存视频后把事件输出到标准输出（TRACE_SIGNAL），
+  主进程用 absorb() 并入本次测量的追踪；
+- 每个区间属于一条轨道（track，默认为当前线程名），轨道在追踪中显示为一行。
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+# 与 record_script / trigger_coordinator 一致的共享单调时钟
+clock = time.perf_counter
+
+# 录制子进程输出中追踪事件的信号
+TRACE_SIGNAL = "追踪事件:"
+
+# 默认事件分类
+DEFAULT_CATEGORY = "take"
+
+
+def _micros(seconds):
+    return round(seconds * 1e6, 3)
+
+
+class Tracer:
+    """收集一个进程内的追踪事件（Chrome 追踪格式，时间单位为微秒）"""
+
+    def __init__(self, process_name=None):
+        self.pid = os.getpid()
+        self.process_name = process_name
+        self._events = []
+        self._tracks = {}  # 轨道名 -> tid
+        self._lock = threading.Lock()
+
+    def _tid(self, track):
+        if track is None:
+            track = threading.current_thread().name
+        tid = self._tracks.get(track)
+        if tid is None:
+            tid = self._tracks[track] = len(self._tracks) + 1
+        return tid
+
+    def add(self, name, start, end, track=None, category=DEFAULT_CATEGORY, **args):
+        """记录一个已经测得起止时间（共享时钟秒数）的区间"""
+        if start is None or end is None:
+            return
+        with self._lock:
+            event = {'name': name, 'cat': category, 'ph': "X", 'ts': _micros(start),
+                     'dur': _micros(max(0.0, end - start)), 'pid': self.pid, 'tid': self._tid(track)}
+            if args:
+                event['args'] = args
+            self._events.append(event)
+
+    def instant(self, name, at=None, track=None, category=DEFAULT_CATEGORY, **args):
+        """记录一个时刻（如首帧）"""
+        at = clock() if at is None else at
+        with self._lock:
+            event = {'name': name, 'cat': category, 'ph': "i", 's': "t", 'ts': _micros(at),
+                     'pid': self.pid, 'tid': self._tid(track)}
+            if args:
+                event['args'] = args
+            self._events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name, track=None, category=DEFAULT_CATEGORY, **args):
+        """上下文管理器：记录代码块的起止时间，代码块抛出异常时在参数中记录错误"""
+        start = clock()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = str(e) or type(e).__name__
+            raise
+        finally:
+            self.add(name, start, clock(), track, category, **args)
+
+    def _metadata(self):
+        events = []
+        if self.process_name:
+            events.append({'name': "process_name", 'ph': "M", 'pid': self.pid, 'tid': 0,
+                           'args': {'name': self.process_name}})
+        for track, tid in self._tracks.items():
+            events.append({'name': "thread_name", 'ph': "M", 'pid': self.pid, 'tid': tid,
+                           'args': {'name': track}})
+        return events
+
+    def events(self):
+        """全部事件（含进程名、轨道名元数据），按时间排序"""
+        with self._lock:
+            metadata = self._metadata()
+            events = sorted(self._events, key=lambda event: event.get('ts', 0))
+        return metadata + events
+
+    def drain(self):
+        """取出全部事件并清空（录制子进程每次测量后输出给主进程）"""
+        events = self.events()
+        with self._lock:
+            self._events = []
+        return events
+
+    def absorb(self, events):
+        """并入另一个进程（录制子进程）的事件，保留其 pid 和轨道"""
+        with self._lock:
+            self._events.extend(events)
+
+    def write(self, path, metadata=None):
+        """写入 Chrome 追踪格式的 JSON 文件（先写临时文件再替换），返回文件路径"""
+        data = {
+            'traceEvents': self.events(),
+            'displayTimeUnit': "ms",
+            'otherData': dict(metadata or {}, clock="perf_counter"),
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""设备/摄像头双路触发协调
+
+原流程先同步执行 adb 按键命令，返回后才向录制子进程写入 's'，摄像头总是晚一个
+adb 往返才开始录制，而且每次的延迟都不同。TriggerCoordinator 让两路动作在共享的
+单调时钟上同时触发，学习两侧的典型延迟，可选地推迟较快的一侧，并记录每次的实测偏差。
+
+时间基准统一使用 time.perf_counter()：在 Windows(QPC)、macOS(mach_absolute_time)
+和 Linux(CLOCK_MONOTONIC) 上都是系统范围的单调时钟，录制子进程打印的时间戳可以直接比较。
+"""
+import threading
+import time
+
+# 共享单调时钟（与 record_script 中的时间戳一致）
+clock = time.perf_counter
+
+# 两个触发线程就绪所需的提前量（秒）
+DEFAULT_LEAD_TIME = 0.005
+
+
+def sleep_until(target):
+    """睡眠到指定的时钟时刻，最后 2ms 自旋以减少唤醒误差"""
+    while True:
+        remaining = target - clock()
+        if remaining <= 0:
+            return
+        if remaining > 0.002:
+            time.sleep(remaining - 0.002)
+
+
+class TakeTrigger:
+    """一次测量的触发记录（时间均为共享时钟秒数）"""
+
+    def __init__(self, target_time, device_delay, camera_delay):
+        self.target_time = target_time
+        self.device_delay = device_delay
+        self.camera_delay = camera_delay
+        self.device_start = None
+        self.device_end = None
+        self.device_result = None
+        self.device_error = None
+        self.camera_start = None
+        self.camera_end = None
+        self.camera_error = None
+        # 以下由录制子进程的输出补充
+        self.camera_received = None
+        self.camera_first_frame = None
+
+    @property
+    def device_effect_time(self):
+        """设备端按键生效时刻的估计值：请求发出与确认返回的中点"""
+        if self.device_start is None or self.device_end is None:
+            return None
+        return (self.device_start + self.device_end) / 2.0
+
+    @property
+    def device_uncertainty_ms(self):
+        """设备端生效时刻估计的不确定度（半个往返）"""
+        if self.device_start is None or self.device_end is None:
+            return None
+        return (self.device_end - self.device_start) * 500.0
+
+    @property
+    def skew_ms(self):
+        """摄像头首帧相对设备按键生效时刻的偏差（毫秒，正数表示摄像头较晚）"""
+        effect = self.device_effect_time
+        camera = self.camera_first_frame if self.camera_first_frame is not None else self.camera_end
+        if effect is None or camera is None:
+            return None
+        return (camera - effect) * 1000.0
+
+    def to_dict(self):
+        def ms(value):
+            return None if value is None else round((value - self.target_time) * 1000.0, 3)
+
+        method, latency = self.device_result if self.device_result else (None, None)
+        return {
+            'clock': 'perf_counter',
+            'target_time': self.target_time,
+            'device_delay_ms': round(self.device_delay * 1000.0, 3),
+            'camera_delay_ms': round(self.camera_delay * 1000.0, 3),
+            'device_method': method,
+            'device_latency_ms': None if latency is None else round(latency, 3),
+            'device_start_ms': ms(self.device_start),
+            'device_ack_ms': ms(self.device_end),
+            'device_effect_ms': ms(self.device_effect_time),
+            'device_uncertainty_ms': (None if self.device_uncertainty_ms is None
+                                      else round(self.device_uncertainty_ms, 3)),
+            'device_error': self.device_error,
+            'camera_write_ms': ms(self.camera_start),
+            'camera_received_ms': ms(self.camera_received),
+            'camera_first_frame_ms': ms(self.camera_first_frame),
+            'camera_error': self.camera_error,
+            'skew_ms': None if self.skew_ms is None else round(self.skew_ms, 3),
+        }
+
+
+class TriggerCoordinator:
+    """在共享单调时钟上并发触发设备按键和摄像头录制"""
+
+    def __init__(self, compensate=False, smoothing=0.3, lead_time=DEFAULT_LEAD_TIME):
+        self.compensate = compensate  # 是否推迟较快的一侧以对齐两路
+        self.smoothing = smoothing  # 延迟学习的指数平滑系数
+        self.lead_time = lead_time
+        self.device_latency = None  # 设备按键从发出到生效的典型耗时（秒）
+        self.camera_latency = None  # 写入 's' 到录制首帧的典型耗时（秒）
+
+    def _learn(self, current, sample):
+        if sample is None or sample < 0:
+            return current
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    def planned_delays(self):
+        """根据学习到的延迟计算 (设备推迟, 摄像头推迟)，单位秒"""
+        if not self.compensate or self.device_latency is None or self.camera_latency is None:
+            return 0.0, 0.0
+        difference = self.device_latency - self.camera_latency
+        if difference > 0:
+            return 0.0, difference
+        return -difference, 0.0
+
+    def fire(self, device_action, camera_action, on_take=None):
+        """并发执行两路动作，返回 TakeTrigger
+
+        device_action() 的返回值记为 device_result（DeviceTrigger.fire 返回 (方式, 延迟ms)），
+        camera_action() 负责向录制子进程写入命令；任一侧的异常都会被记录而不会中断另一侧。
+        on_take(TakeTrigger) 在任何动作执行之前调用：录制子进程读到命令后立即上报接收时间，
+        早于设备一侧的 adb 往返结束，调用方需要在此之前登记本次触发。
+        """
+        device_delay, camera_delay = self.planned_delays()
+        take = TakeTrigger(clock() + self.lead_time, device_delay, camera_delay)
+        if on_take is not None:
+            on_take(take)
+
+        def run_device():
+            sleep_until(take.target_time + device_delay)
+            take.device_start = clock()
+            try:
+                take.device_result = device_action()
+            except Exception as e:
+                take.device_error = str(e)
+            take.device_end = clock()
+
+        def run_camera():
+            sleep_until(take.target_time + camera_delay)
+            take.camera_start = clock()
+            try:
+                camera_action()
+            except Exception as e:
+                take.camera_error = str(e)
+            take.camera_end = clock()
+
+        device_thread = threading.Thread(target=run_device, daemon=True)
+        device_thread.start()
+        run_camera()  # 摄像头写入很快，直接在当前线程执行
+        device_thread.join()
+
+        if take.device_error is None:
+            self.device_latency = self._learn(self.device_latency,
+                                              take.device_effect_time - take.device_start)
+        return take
+
+    def complete(self, take, camera_received=None, camera_first_frame=None):
+        """补充录制子进程上报的时间戳并学习摄像头侧延迟"""
+        if camera_received is not None:
+            take.camera_received = camera_received
+        if camera_first_frame is not None:
+            take.camera_first_frame = camera_first_frame
+            if take.camera_error is None and take.camera_start is not None:
+                self.camera_latency = self._learn(self.camera_latency,
+                                                  camera_first_frame - take.camera_start)
+        return take
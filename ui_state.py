@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""界面状态总线
+
+后台线程原来逐个把 status_var.set、按钮 config 等操作放入界面队列，Payload 下载进度这类
+高频更新会在 Tk 主线程中堆积成大量重复的重绘。UiStateBus 把界面状态按键保存：
+
+- 后台线程调用 publish()（或 status() / button() / camera_list() / progress()）只记录每个键的
+  最新值，不直接操作控件；
+- Tk 主线程每个刷新周期调用一次 apply_pending()，对每个键只应用最新值，一连串更新合并为一次重绘。
+
+一次性的事件（消息框、启动预览等）仍然通过界面队列按顺序执行，不经过状态总线。
+"""
+import threading
+
+# Tk 主线程应用界面状态的间隔（毫秒）
+UI_TICK_MS = 16
+
+# 状态类型
+STATUS = "status"  # 状态栏文字
+BUTTON = "button"  # 按钮是否可用，name 为按钮名称
+CAMERA_LIST = "camera_list"  # 检测到的摄像头列表
+PROGRESS = "progress"  # 进度（0–100，None 表示结束），name 为任务名称
+
+
+class UiStateBus:
+    """后台线程发布界面状态，Tk 主线程按键合并后应用"""
+
+    def __init__(self, log=print):
+        self.log = log
+        self._lock = threading.Lock()
+        self._pending = {}  # (类型, 名称) -> 最新值，按首次发布的顺序应用
+        self._appliers = {}  # 类型 -> apply(名称, 值)
+        self.published = 0
+        self.applied = 0
+
+    def register(self, kind, apply):
+        """注册某类状态的应用函数（在 Tk 主线程中调用）"""
+        self._appliers[kind] = apply
+
+    def publish(self, kind, value, name=None):
+        """记录状态的最新值（任意线程）"""
+        with self._lock:
+            self._pending[(kind, name)] = value
+            self.published += 1
+
+    def status(self, text):
+        self.publish(STATUS, text)
+
+    def button(self, name, enabled):
+        self.publish(BUTTON, bool(enabled), name)
+
+    def camera_list(self, cameras):
+        self.publish(CAMERA_LIST, list(cameras))
+
+    def progress(self, name, percent):
+        self.publish(PROGRESS, percent, name)
+
+    def apply_pending(self):
+        """应用每个键的最新值（只能在 Tk 主线程中调用），返回应用的状态数"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending = self._pending
+            self._pending = {}
+        for (kind, name), value in pending.items():
+            apply = self._appliers.get(kind)
+            if apply is None:
+                continue
+            try:
+                apply(name, value)
+            except Exception as e:
+                self.log(f"界面更新失败 ({kind}): {str(e)}")
+        self.applied += len(pending)
+        return len(pending)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""录制视频交接到 payloads 目录
+
+原来 copy_recorded_video 用 shutil.copy2 把每个几百 MB 的视频完整复制一份，磁盘写入翻倍，
+录制结束后要等复制完成。handoff_file 按配置选择交接方式：
+
+- rename:   原子重命名（同一文件系统，原文件不再保留在 videos/）
+- hardlink: 硬链接（同一文件系统，零复制，两处共享同一份数据）
+- reflink:  写时复制克隆（Linux FICLONE，btrfs/XFS 等支持，得到独立文件且零复制）
+- copy:     后台线程复制（copy_file_range/sendfile，内核内完成），完成后校验 CRC32 再原子替换
+
+auto 依次尝试 reflink、hardlink、copy（保留原文件），并按 (源设备, 目标设备) 缓存可用的方式。
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+import zlib
+
+HANDOFF_METHODS = ("auto", "rename", "hardlink", "reflink", "copy")
+
+# auto 模式的尝试顺序（都会保留 videos/ 中的原文件）
+AUTO_ORDER = ("reflink", "hardlink", "copy")
+
+# linux/fs.h: FICLONE = _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+COPY_CHUNK = 8 * 1024 * 1024
+
+# (源设备, 目标设备) -> 上次成功的方式
+_method_cache = {}
+
+
+class HandoffResult:
+    """一次交接的结果；copy 方式在后台完成，done 为 False 时可 wait()"""
+
+    def __init__(self, method, target):
+        self.method = method
+        self.target = target
+        self.seconds = 0.0
+        self.bytes = 0
+        self.detail = None  # copy 方式实际使用的内核接口
+        self.error = None
+        self.thread = None
+
+    @property
+    def done(self):
+        return self.thread is None or not self.thread.is_alive()
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self.done
+
+
+def file_crc32(path, chunk_size=COPY_CHUNK):
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def reflink(source, target):
+    """用 FICLONE 克隆文件，文件系统不支持时抛出 OSError"""
+    if not sys.platform.startswith("linux"):
+        raise OSError("reflink 仅支持 Linux")
+    import fcntl
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(target)
+            raise
+    shutil.copystat(source, target)
+
+
+def kernel_copy(source, target):
+    """在内核内复制文件内容，返回使用的接口名"""
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        copy_file_range = getattr(os, "copy_file_range", None)
+        if copy_file_range is not None:
+            try:
+                offset = 0
+                while offset < size:
+                    copied = copy_file_range(src.fileno(), dst.fileno(), COPY_CHUNK)
+                    if copied == 0:
+                        break
+                    offset += copied
+                return "copy_file_range"
+            except OSError:
+                # 跨文件系统在旧内核上返回 EXDEV，从头改用 sendfile
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+        if sys.platform.startswith("linux"):
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(dst.fileno(), src.fileno(), offset, COPY_CHUNK)
+                if sent == 0:
+                    break
+                offset += sent
+            return "sendfile"
+    # 其他平台：shutil.copyfile 在 macOS 上使用 fcopyfile，在 Windows 上使用 CopyFile 快速路径
+    shutil.copyfile(source, target)
+    return "copyfile"
+
+
+def _background_copy(source, target, result, on_done):
+    start = time.perf_counter()
+    tmp_path = target + ".part"
+    try:
+        result.detail = kernel_copy(source, tmp_path)
+        shutil.copystat(source, tmp_path)
+        if os.path.getsize(tmp_path) != os.path.getsize(source) or file_crc32(tmp_path) != file_crc32(source):
+            raise OSError("复制后校验失败（CRC32 不一致）")
+        os.replace(tmp_path, target)
+        result.bytes = os.path.getsize(target)
+    except Exception as e:
+        result.error = str(e)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    result.seconds = time.perf_counter() - start
+    if on_done:
+        on_done(result)
+
+
+def _try_method(method, source, target):
+    """用指定方式交接；成功之前不动 target，同名文件（重复编号）在成功后才被原子替换"""
+    if method == "rename":
+        os.replace(source, target)
+        return
+    tmp_path = target + ".handoff"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        if method == "hardlink":
+            os.link(source, tmp_path)
+        elif method == "reflink":
+            reflink(source, tmp_path)
+        os.replace(tmp_path, target)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def handoff_file(source, target, method="auto", on_done=None):
+    """把 source 交接到 target，返回 HandoffResult
+
+    除 copy 外的方式都同步完成；copy 在后台线程中进行，完成（或失败）后调用 on_done(result)。
+    同步方式全部失败时抛出 OSError。
+    """
+    if method not in HANDOFF_METHODS:
+        method = "auto"
+    source_device = os.stat(source).st_dev
+    target_dir = os.path.dirname(os.path.abspath(target))
+    os.makedirs(target_dir, exist_ok=True)
+    # 同名文件（重复编号）在交接成功后才被覆盖，全部方式失败时保留原有文件
+
+    cache_key = (source_device, os.stat(target_dir).st_dev)
+    if method == "auto":
+        cached = _method_cache.get(cache_key)
+        candidates = [cached] + [m for m in AUTO_ORDER if m != cached] if cached else list(AUTO_ORDER)
+    else:
+        candidates = [method]
+
+    errors = []
+    for candidate in candidates:
+        if candidate == "copy":
+            result = HandoffResult("copy", target)
+            result.thread = threading.Thread(target=_background_copy,
+                                             args=(source, target, result, on_done), daemon=True)
+            result.thread.start()
+            if method == "auto":
+                _method_cache[cache_key] = "copy"
+            return result
+        start = time.perf_counter()
+        try:
+            _try_method(candidate, source, target)
+        except OSError as e:
+            errors.append(f"{candidate}: {e}")
+            continue
+        result = HandoffResult(candidate, target)
+        result.seconds = time.perf_counter() - start
+        result.bytes = os.path.getsize(target)
+        if method == "auto":
+            _method_cache[cache_key] = candidate
+        if on_done:
+            on_done(result)
+        return result
+    raise OSError("; ".join(errors) or "没有可用的交接方式")